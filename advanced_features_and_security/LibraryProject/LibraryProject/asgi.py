@@ -11,6 +11,11 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from relationship_app.template_warmup import warm_templates_on_startup
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'LibraryProject.settings')
+# Serve relationship_app's async views (see ASYNC_VIEWS in settings)
+os.environ.setdefault('DJANGO_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
+warm_templates_on_startup()
@@ -75,11 +75,31 @@ WSGI_APPLICATION = 'LibraryProject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# 'default' takes every write. 'read' is a second connection to the same file,
+# which DATABASE_ROUTERS sends reads to outside transactions; under WAL it reads
+# while 'default' writes. Both are kept open for CONN_MAX_AGE seconds instead
+# of being reopened by every request. Pragmas: SQLITE_PRAGMAS.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Take the write lock at BEGIN: a transaction that reads before it
+            # writes then waits out busy_timeout instead of failing at once
+            # with "database is locked" when another writer got there first
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+    'read': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        # Tests read through 'default', which holds their transaction
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
 
@@ -173,7 +193,10 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # AuthenticationMiddleware, with recently loaded users kept in memory
+    'relationship_app.sessions.CachedUserAuthenticationMiddleware',
+    # Reads the catalog from the primary for a while after a client writes to it
+    'relationship_app.database.PrimaryPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -184,7 +207,6 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -192,21 +214,56 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Each template is parsed once per process and kept compiled; the
+            # autoreloader clears the cache when a template changes under DEBUG
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
 
+# Compile the project's templates when the WSGI/ASGI application loads instead
+# of on each page's first request (see relationship_app/template_warmup.py)
+TEMPLATE_WARMUP = not DEBUG
+
 WSGI_APPLICATION = 'advanced_features_and_security.wsgi.application'
 
+# Runs the tests against private in-memory caches
+TEST_RUNNER = 'LibraryProject.test_runner.IsolatedCachesRunner'
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# 'default' takes every write. 'read' is a second connection to the same file,
+# which DATABASE_ROUTERS sends reads to outside transactions; under WAL it reads
+# while 'default' writes. Both are kept open for CONN_MAX_AGE seconds instead
+# of being reopened by every request. Pragmas: SQLITE_PRAGMAS.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Take the write lock at BEGIN: a transaction that reads before it
+            # writes then waits out busy_timeout instead of failing at once
+            # with "database is locked" when another writer got there first
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+    'read': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        # Tests read through 'default', which holds their transaction
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
 
@@ -254,6 +311,30 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Who streams media files: 'python' (FileResponse, sendfile-capable servers),
+# 'x-accel-redirect' (nginx internal location at MEDIA_ACCEL_REDIRECT_PREFIX
+# aliased to MEDIA_ROOT) or 'x-sendfile' (Apache mod_xsendfile, lighttpd)
+MEDIA_SERVE_MODE = 'python'
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+# Profile photos are stored once per distinct content under MEDIA_ROOT
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    # Outside DEBUG, collectstatic writes content-hashed copies ({% static %}
+    # links to them) that are served with a year-long immutable Cache-Control
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'
+        ),
+    },
+    'profile_photos': {
+        'BACKEND': 'relationship_app.storage.ContentAddressedStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -290,6 +371,195 @@ LOGIN_URL = '/admin/login/'
 LOGIN_REDIRECT_URL = '/admin/'
 LOGOUT_REDIRECT_URL = '/admin/'
 
+# ============================================================================
+# CACHING
+# ============================================================================
+
+# 'template_fragments' holds the rendered catalog and library book lists
+# and 'shared' the user roles and admin changelist counts, both seen by every
+# worker; 'default' is per-process. Set CACHE_REDIS_URL to use a
+# Redis-compatible server (Redis, Valkey, KeyDB) for all of them; without it
+# the local stand-ins below are used, which only workers on the same host
+# share. Their files are unpickled when read, so they live in a directory
+# only the project's user may write to: CACHE_DIR (default <BASE_DIR>/.cache).
+# Tests replace every cache with a private in-memory one (see test_runner).
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+CACHE_DIR = Path(os.environ.get('CACHE_DIR', BASE_DIR / '.cache'))
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        alias: {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+            'KEY_PREFIX': alias,
+        }
+        for alias in ('default', 'template_fragments', 'shared', 'sessions')
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'template_fragments': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_DIR / 'template_fragments',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_DIR / 'shared',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_DIR / 'sessions',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        },
+    }
+
+# Seconds a rendered book list is kept; edits retire it sooner
+PAGE_CACHE_TIMEOUT = 600
+
+# Seconds the admin dashboard statistics are kept; writes retire them sooner
+DASHBOARD_CACHE_TIMEOUT = 300
+
+# Libraries listed in the dashboard's books-per-library table
+DASHBOARD_TOP_LIBRARIES = 10
+
+# ============================================================================
+# AUTHENTICATION BACKENDS AND ROLE CACHING
+# ============================================================================
+
+# Load the user's UserProfile in the same query as the user on every request
+AUTHENTICATION_BACKENDS = [
+    'relationship_app.backends.RoleAwareModelBackend',
+]
+
+# Seconds to keep resolved user roles in the 'shared' cache (0 disables it).
+# Profile changes evict them for every worker sharing that cache.
+ROLE_CACHE_TIMEOUT = 300
+
+# ============================================================================
+# DATABASE TUNING
+# ============================================================================
+
+# Reads go to DATABASE_READ_ALIASES unless a transaction is open on 'default'
+# (see relationship_app/database.py)
+DATABASE_ROUTERS = ['relationship_app.database.ReadWriteRouter']
+DATABASE_READ_ALIASES = ['read']
+
+# Applied to every new SQLite connection; 'read' connections are also query_only
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # milliseconds a writer waits for the lock
+    'cache_size': -64000,  # 64 MB page cache per connection
+    'mmap_size': 256 * 2 ** 20,
+    'temp_store': 'MEMORY',
+}
+
+# ============================================================================
+# READ REPLICAS
+# ============================================================================
+
+# Catalog reads (DATABASE_REPLICATED_MODELS) are spread over DATABASE_REPLICAS.
+# Set SQLITE_REPLICAS=<n> to add n replica files next to the primary; a cron
+# job or `manage.py sync_replicas --interval <seconds>` keeps them current.
+SQLITE_REPLICAS = int(os.environ.get('SQLITE_REPLICAS', '0'))
+DATABASE_REPLICAS = [f'replica{i}' for i in range(1, SQLITE_REPLICAS + 1)]
+DATABASES.update({
+    alias: {**DATABASES['read'], 'NAME': BASE_DIR / f'db.{alias}.sqlite3'}
+    for alias in DATABASE_REPLICAS
+})
+
+DATABASE_REPLICATED_MODELS = [
+    'relationship_app.author',
+    'relationship_app.book',
+    'relationship_app.library',
+    'relationship_app.library_books',
+    'relationship_app.librarian',
+]
+
+# Seconds a client reads the catalog from the primary after writing to it;
+# keep above the replicas' lag (the sync_replicas interval)
+REPLICA_PIN_SECONDS = 5
+
+# ============================================================================
+# SESSIONS
+# ============================================================================
+
+# Database sessions written through to the 'sessions' cache, which must be
+# shared by every worker (see relationship_app/sessions.py). A session is only
+# saved when its data changed, never just because a request read it.
+SESSION_ENGINE = 'relationship_app.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_SAVE_EVERY_REQUEST = False
+
+# Users loaded by CachedUserAuthenticationMiddleware, kept per process
+SESSION_USER_CACHE_SIZE = 1000
+SESSION_USER_CACHE_TTL = 10  # seconds
+
+# Expired sessions deleted per transaction by `manage.py clearsessions`
+SESSION_CLEANUP_BATCH_SIZE = 1000
+
+# ============================================================================
+# ASGI
+# ============================================================================
+
+# Serve the catalog, library and role pages from relationship_app.async_views.
+# LibraryProject/asgi.py sets DJANGO_ASYNC_VIEWS=1 unless it is already set;
+# under WSGI the sync views are cheaper. `manage.py runasgi` serves the ASGI
+# application with uvicorn workers.
+ASYNC_VIEWS = os.environ.get('DJANGO_ASYNC_VIEWS') == '1'
+
+# ============================================================================
+# PASSWORD HASHING
+# ============================================================================
+
+# The first hasher hashes new passwords; hashes made by the others are upgraded
+# to it on the owner's next login. Set PASSWORD_HASHER=argon2 to prefer Argon2id
+# (requires `pip install argon2-cffi`); the default scrypt needs nothing extra.
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'scrypt')
+
+PASSWORD_HASHERS = [
+    'relationship_app.hashers.TunedScryptPasswordHasher',
+    'relationship_app.hashers.TunedArgon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+if PASSWORD_HASHER == 'argon2':
+    PASSWORD_HASHERS[:2] = reversed(PASSWORD_HASHERS[:2])
+
+# scrypt cost: 128 * N * r bytes of memory per hash (16 MiB with these)
+PASSWORD_SCRYPT_WORK_FACTOR = 2 ** 14
+PASSWORD_SCRYPT_BLOCK_SIZE = 8
+PASSWORD_SCRYPT_PARALLELISM = 1
+
+# Argon2id cost, memory in KiB (OWASP's 19 MiB, 2 passes, 1 lane)
+PASSWORD_ARGON2_TIME_COST = 2
+PASSWORD_ARGON2_MEMORY_COST = 19456
+PASSWORD_ARGON2_PARALLELISM = 1
+
+# Under ASGI, run the login and register views in a bounded thread pool so
+# hashing does not hold up the thread every other sync view runs on
+PASSWORD_HASHING_OFFLOAD = False
+PASSWORD_HASHING_WORKERS = 4
+
+# ============================================================================
+# ADMIN CHANGELIST COUNTS
+# ============================================================================
+
+# Seconds a changelist result count stays in the 'shared' cache (writes
+# invalidate it sooner, in every worker)
+ADMIN_COUNT_CACHE_TIMEOUT = 60
+
+# Unfiltered tables above this many rows use the planner's estimate, not COUNT(*)
+ADMIN_EXACT_COUNT_THRESHOLD = 100000
+
+# Seconds a table's last counted size is remembered; while it is below the
+# threshold, count misses go straight to COUNT(*) without reading statistics
+ADMIN_TABLE_SIZE_CACHE_TIMEOUT = 3600
+
 # ============================================================================
 # FILE UPLOAD SETTINGS
 # ============================================================================
@@ -300,6 +570,28 @@ FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 # Allowed file types for profile photos
 ALLOWED_IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
 
+# Seconds a saved profile photo survives being released, since a row naming
+# it may not be committed yet; cleanup_profile_photos sweeps what is left
+PROFILE_PHOTO_RELEASE_GRACE_SECONDS = 300
+
+# Square thumbnails rendered for every uploaded profile photo (pixels)
+PROFILE_PHOTO_THUMBNAIL_SIZES = (64, 256)
+
+# Background threads rendering thumbnails; set ASYNC to False to render inline
+PROFILE_PHOTO_THUMBNAIL_WORKERS = 2
+PROFILE_PHOTO_THUMBNAILS_ASYNC = True
+
+# Profile photos are validated and spooled to disk as they stream in;
+# everything else keeps Django's default handlers
+FILE_UPLOAD_HANDLERS = [
+    'relationship_app.uploads.ProfilePhotoUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+PROFILE_PHOTO_UPLOAD_FIELDS = ('profile_photo',)
+PROFILE_PHOTO_MAX_UPLOAD_SIZE = 5242880  # 5MB
+PROFILE_PHOTO_MAX_DIMENSION = 6000  # pixels per side
+
 # ============================================================================
 # SECURITY SETTINGS (for production)
 # ============================================================================
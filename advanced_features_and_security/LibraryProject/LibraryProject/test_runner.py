@@ -0,0 +1,37 @@
+# LibraryProject/test_runner.py
+"""
+Test runner keeping tests away from the project's real caches.
+
+The file-based caches in CACHES are shared with any server running from the
+same checkout, so a test clearing or filling them would disturb it (and
+read what it left behind). For the length of the run every alias is
+replaced by its own in-memory cache.
+"""
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def isolated_caches():
+    """Return a CACHES setting with a private LocMemCache per configured alias"""
+    return {
+        alias: {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'test-{alias}',
+        }
+        for alias in settings.CACHES
+    }
+
+
+class IsolatedCachesRunner(DiscoverRunner):
+    """DiscoverRunner running the tests against in-memory caches"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.caches_override = override_settings(CACHES=isolated_caches())
+        self.caches_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.caches_override.disable()
+        super().teardown_test_environment(**kwargs)
@@ -11,6 +11,9 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from relationship_app.template_warmup import warm_templates_on_startup
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'LibraryProject.settings')
 
 application = get_wsgi_application()
+warm_templates_on_startup()
@@ -0,0 +1,86 @@
+# bookshelf/benchmarks.py
+"""
+Performance benchmarks for bookshelf
+Run from the Django shell:
+    python manage.py shell -c "from bookshelf.benchmarks import run_all_benchmarks; run_all_benchmarks()"
+
+Data is seeded inside a transaction that is rolled back afterwards.
+"""
+
+import random
+import statistics
+import time
+
+from bookshelf.models import Book
+from bookshelf.search import LikeSearchBackend, SQLiteFTSBackend
+from relationship_app.benchmarks import SEED_BATCH_SIZE, rolled_back
+
+# Timed searches per query and backend
+SEARCHES_PER_QUERY = 20
+
+WORDS = (
+    'shadow', 'river', 'garden', 'empire', 'winter', 'secret', 'silent', 'stone',
+    'glass', 'ocean', 'crown', 'letters', 'forest', 'night', 'fire', 'island',
+    'harbour', 'mirror', 'orchard', 'thunder', 'lantern', 'meadow', 'compass', 'ember',
+)
+
+
+def seed_books(total, seed=0):
+    """Bulk insert `total` books with random multi-word titles and authors"""
+    rng = random.Random(seed)
+    for start in range(0, total, SEED_BATCH_SIZE):
+        Book.objects.bulk_create([  # type: ignore
+            Book(
+                title=f"The {' '.join(rng.sample(WORDS, 3)).title()} {i}",
+                author=f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}son",
+                publication_year=rng.randint(1800, 2024),
+            )
+            for i in range(start, min(start + SEED_BATCH_SIZE, total))
+        ])
+
+
+def time_search(backend, query, searches=SEARCHES_PER_QUERY):
+    """Return p50/p99 milliseconds for filtering and counting matches of `query`"""
+    timings = []
+    for _ in range(searches):
+        started = time.perf_counter()
+        matches = backend.filter(Book.objects.all(), query).count()  # type: ignore
+        timings.append((time.perf_counter() - started) * 1000)
+    percentiles = statistics.quantiles(timings, n=100)
+    return {'matches': matches, 'p50_ms': round(percentiles[49], 2), 'p99_ms': round(percentiles[98], 2)}
+
+
+def benchmark_search(sizes=(100_000, 1_000_000), queries=('ember', 'silent orchard', 'thunderson')):
+    """Compare FTS5 and LIKE search latency as the table grows"""
+    print("\n=== BENCHMARK: bookshelf search, FTS5 vs LIKE ===")
+    print(f"{'books':>10} {'query':>16} {'backend':>8} {'matches':>8} {'p50 ms':>8} {'p99 ms':>8}")
+
+    results = []
+    backends = (('fts5', SQLiteFTSBackend()), ('like', LikeSearchBackend()))
+    for size in sizes:
+        with rolled_back():
+            seed_books(size)
+            for query in queries:
+                for name, backend in backends:
+                    stats = time_search(backend, query)
+                    results.append({'books': size, 'query': query, 'backend': name, **stats})
+                    print(
+                        f"{size:>10} {query:>16} {name:>8} {stats['matches']:>8} "
+                        f"{stats['p50_ms']:>8} {stats['p99_ms']:>8}"
+                    )
+    return results
+
+
+def run_all_benchmarks():
+    """Run all benchmarks"""
+    print("bookshelf benchmarks")
+    print("=" * 50)
+
+    benchmark_search()
+
+    print("\n" + "=" * 50)
+    print("All benchmarks completed!")
+
+# Run all benchmarks when script is executed
+if __name__ == "__main__":
+    run_all_benchmarks()
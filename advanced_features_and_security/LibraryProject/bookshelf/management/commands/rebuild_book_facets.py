@@ -0,0 +1,18 @@
+# bookshelf/management/commands/rebuild_book_facets.py
+from django.core.management.base import BaseCommand
+
+from bookshelf.models import BookFacet
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the author and publication_year facet counts from the books table. "
+        "Run after bulk imports or queryset.update() calls, which bypass the signals "
+        "that keep the counts current."
+    )
+
+    def handle(self, *args, **options):
+        BookFacet.objects.rebuild()  # type: ignore
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {BookFacet.objects.count()} facet values"  # type: ignore
+        ))
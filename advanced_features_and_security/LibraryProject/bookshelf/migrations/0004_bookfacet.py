@@ -0,0 +1,40 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:12
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_facets(apps, schema_editor):
+    """Count the books that already exist per author and publication year"""
+    Book = apps.get_model('bookshelf', 'Book')
+    BookFacet = apps.get_model('bookshelf', 'BookFacet')
+    for field in ('author', 'publication_year'):
+        rows = Book.objects.values(field).annotate(total=Count('id')).order_by()
+        BookFacet.objects.bulk_create(
+            [BookFacet(field=field, value=str(row[field]), count=row['total']) for row in rows.iterator()],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookshelf', '0003_book_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=32)),
+                ('value', models.CharField(max_length=100)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['field', '-count'], name='bookfacet_field_count_idx')],
+                'constraints': [models.UniqueConstraint(fields=('field', 'value'), name='bookfacet_field_value_uniq')],
+            },
+        ),
+        migrations.RunPython(populate_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookshelf', '0004_bookfacet'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['author', 'publication_year', 'title'], name='book_author_year_title_idx'),
+        ),
+    ]
@@ -1,5 +1,8 @@
 # bookshelf/models.py
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 class Book(models.Model):
     title = models.CharField(max_length=200)
@@ -9,5 +12,110 @@ class Book(models.Model):
     def __str__(self):
         return f"{self.title} by {self.author} ({self.publication_year})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored facet values so saves can move counts between them
+        instance._stored_facets = instance.facet_values()
+        return instance
+
+    def facet_values(self):
+        """Return this book's loaded (non-deferred) value for every faceted field"""
+        return {field: str(self.__dict__[field]) for field in BookFacet.FIELDS if field in self.__dict__}
+
     class Meta:
         ordering = ['title']
+        # Matched to BookAdmin: its (title, pk) ordering, and the
+        # publication_year / author filters, alone or together, combined with
+        # that ordering. Every index ends with the rowid, which supplies the pk.
+        indexes = [
+            models.Index(fields=['title'], name='book_title_idx'),
+            models.Index(fields=['publication_year', 'title'], name='book_year_title_idx'),
+            models.Index(fields=['author', 'title'], name='book_author_title_idx'),
+            models.Index(fields=['author', 'publication_year', 'title'], name='book_author_year_title_idx'),
+        ]
+
+class BookFacetManager(models.Manager):
+    """Manager maintaining the precomputed facet counts"""
+
+    def adjust(self, field, value, delta):
+        """Add `delta` to the count of `value` in `field`"""
+        facets = self.filter(field=field, value=value)
+        if facets.update(count=F('count') + delta) or delta <= 0:
+            return
+        try:
+            with transaction.atomic():
+                self.create(field=field, value=value, count=delta)
+        except IntegrityError:
+            # Another writer created the row first
+            facets.update(count=F('count') + delta)
+
+    def top(self, field, limit):
+        """Return the `limit` most frequent values of `field` with their counts"""
+        return list(
+            self.filter(field=field, count__gt=0)
+            .order_by('-count', 'value')
+            .values_list('value', 'count')[:limit]
+        )
+
+    def rebuild(self):
+        """Recompute every facet count from the books table"""
+        with transaction.atomic():
+            self.all().delete()
+            for field in self.model.FIELDS:
+                rows = Book.objects.values(field).annotate(total=Count('id')).order_by()  # type: ignore
+                self.bulk_create(
+                    [self.model(field=field, value=str(row[field]), count=row['total']) for row in rows.iterator()],
+                    batch_size=1000,
+                )
+
+class BookFacet(models.Model):
+    """
+    Number of books per author and per publication year, kept up to date on
+    every Book save and delete so the admin sidebar never aggregates the
+    books table.
+    """
+    FIELDS = ('author', 'publication_year')
+
+    field = models.CharField(max_length=32)
+    value = models.CharField(max_length=100)
+    count = models.PositiveIntegerField(default=0)
+
+    objects = BookFacetManager()
+
+    def __str__(self):
+        return f"{self.field}={self.value} ({self.count})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['field', 'value'], name='bookfacet_field_value_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['field', '-count'], name='bookfacet_field_count_idx'),
+        ]
+
+# Signals keeping BookFacet in step with Book. bulk_create() and
+# queryset.update() bypass them; run `manage.py rebuild_book_facets` after those.
+@receiver(post_save, sender=Book)
+def update_book_facets(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Move facet counts from the book's previous values to its new ones"""
+    if raw:
+        return
+    stored = {} if created else getattr(instance, '_stored_facets', {})
+    current = {}
+    for field, value in instance.facet_values().items():
+        # Fields that were not loaded or not written cannot have changed
+        if (not created and field not in stored) or (update_fields is not None and field not in update_fields):
+            continue
+        current[field] = value
+        if stored.get(field) != value:
+            if field in stored:
+                BookFacet.objects.adjust(field, stored[field], -1)  # type: ignore
+            BookFacet.objects.adjust(field, value, 1)  # type: ignore
+    instance._stored_facets = {**stored, **current}
+
+@receiver(post_delete, sender=Book)
+def remove_book_facets(sender, instance, **kwargs):
+    """Drop a deleted book from its facet counts"""
+    for field, value in {**instance.facet_values(), **getattr(instance, '_stored_facets', {})}.items():
+        BookFacet.objects.adjust(field, value, -1)  # type: ignore
@@ -0,0 +1,96 @@
+# bookshelf/search.py
+"""
+Full-text search for bookshelf.Book.
+
+On SQLite, titles and authors are indexed in an FTS5 table kept in sync by
+triggers (see migration 0003). Other databases fall back to the LIKE-based
+search the admin used before. Set BOOKSHELF_SEARCH_BACKEND to a dotted path
+to plug in a different backend.
+"""
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Book
+
+FTS_TABLE = 'bookshelf_book_fts'
+
+
+def to_terms(query):
+    """Split a user query into non-empty search terms"""
+    return query.split()
+
+
+class LikeSearchBackend:
+    """Substring search with icontains; works everywhere but cannot use an index"""
+
+    def filter(self, queryset, query):
+        """Restrict `queryset` to books matching every term of `query`"""
+        for term in to_terms(query):
+            queryset = queryset.filter(Q(title__icontains=term) | Q(author__icontains=term))
+        return queryset
+
+    def search(self, query, limit=20):
+        """Return up to `limit` matching books ordered by title"""
+        if not to_terms(query):
+            return []
+        return list(self.filter(Book.objects.all(), query)[:limit])  # type: ignore
+
+
+class SQLiteFTSBackend:
+    """Ranked prefix search over the FTS5 index"""
+
+    def match_expression(self, query):
+        """
+        Build an FTS5 MATCH expression requiring every term as a word prefix.
+        Terms are quoted so user input cannot inject FTS5 query syntax.
+        """
+        return ' '.join('"{}"*'.format(term.replace('"', '""')) for term in to_terms(query))
+
+    def filter(self, queryset, query):
+        """Restrict `queryset` to books matching every term of `query`"""
+        match = self.match_expression(query)
+        if not match:
+            return queryset
+        return queryset.filter(
+            pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        )
+
+    def search(self, query, limit=20):
+        """Return up to `limit` matching books, best bm25 rank first"""
+        match = self.match_expression(query)
+        if not match:
+            return []
+        with connections[Book.objects.db].cursor() as cursor:  # type: ignore
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY rank LIMIT %s",
+                [match, limit],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        books = Book.objects.in_bulk(ids)  # type: ignore
+        return [books[pk] for pk in ids if pk in books]
+
+
+_backends = {}
+
+
+def get_search_backend(using='default'):
+    """Return the search backend for the database alias `using`"""
+    if using not in _backends:
+        path = getattr(settings, 'BOOKSHELF_SEARCH_BACKEND', None)
+        if path:
+            backend = import_string(path)()
+        elif connections[using].vendor == 'sqlite' and FTS_TABLE in connections[using].introspection.table_names():
+            backend = SQLiteFTSBackend()
+        else:
+            backend = LikeSearchBackend()
+        _backends[using] = backend
+    return _backends[using]
+
+
+def search_books(query, limit=20):
+    """Public search API: return up to `limit` books matching `query`, best match first"""
+    return get_search_backend().search(query, limit)
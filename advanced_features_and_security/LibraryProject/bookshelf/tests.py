@@ -1,3 +1,200 @@
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Book, BookFacet
+from .search import LikeSearchBackend, SQLiteFTSBackend, get_search_backend, search_books
+
+
+@skipUnless(connection.vendor == 'sqlite', "Query plans are checked on SQLite")
+class BookAdminQueryPlanTests(TestCase):
+    """Every changelist query against bookshelf_book is answered from an index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin-pass')
+        Book.objects.bulk_create([  # type: ignore
+            Book(title=f"Book {i}", author=f"Author {i % 7}", publication_year=1950 + i % 40)
+            for i in range(200)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist_book_queries(self, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:bookshelf_book_changelist'), params)
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in queries if q['sql'].startswith('SELECT') and 'FROM "bookshelf_book"' in q['sql']]
+
+    def query_plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return ' | '.join(row[-1] for row in cursor.fetchall())
+
+    def assertUsesIndexes(self, params):
+        queries = self.changelist_book_queries(params)
+        self.assertTrue(queries)
+        for sql in queries:
+            plan = self.query_plan(sql)
+            with self.subTest(params=params, sql=sql):
+                self.assertIn('INDEX', plan)
+                self.assertNotRegex(plan, r'SCAN bookshelf_book(?! USING)')
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_default_ordering_uses_title_index(self):
+        self.assertUsesIndexes({})
+
+    def test_publication_year_filter_uses_index(self):
+        self.assertUsesIndexes({'publication_year': 1960})
+
+    def test_author_filter_uses_index(self):
+        self.assertUsesIndexes({'author': 'Author 3'})
+
+    def test_combined_filters_use_index(self):
+        self.assertUsesIndexes({'author': 'Author 3', 'publication_year': 1953})
+
+
+@skipUnless(connection.vendor == 'sqlite', "FTS5 is only set up on SQLite")
+class BookSearchTests(TestCase):
+    """Full-text search over titles and authors"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Book.objects.bulk_create([  # type: ignore
+            Book(title='Nineteen Eighty-Four', author='George Orwell', publication_year=1949),
+            Book(title='Animal Farm', author='George Orwell', publication_year=1945),
+            Book(title='Farmer Giles of Ham', author='J. R. R. Tolkien', publication_year=1949),
+            Book(title='To Kill a Mockingbird', author='Harper Lee', publication_year=1960),
+        ])
+
+    def titles(self, query):
+        return sorted(book.title for book in search_books(query))
+
+    def test_sqlite_uses_fts_backend(self):
+        self.assertIsInstance(get_search_backend(), SQLiteFTSBackend)
+
+    def test_prefix_terms_match_title_and_author(self):
+        self.assertEqual(self.titles('farm'), ['Animal Farm', 'Farmer Giles of Ham'])
+        self.assertEqual(self.titles('orwell farm'), ['Animal Farm'])
+        self.assertEqual(self.titles('mock'), ['To Kill a Mockingbird'])
+
+    def test_best_match_ranks_first(self):
+        Book.objects.create(title='Orwell on Orwell', author='George Orwell', publication_year=2000)  # type: ignore
+        self.assertEqual(search_books('orwell')[0].title, 'Orwell on Orwell')
+
+    def test_index_follows_updates_and_deletes(self):
+        book = Book.objects.get(title='Animal Farm')  # type: ignore
+        book.title = 'Homage to Catalonia'
+        book.save()
+        self.assertEqual(self.titles('catalonia'), ['Homage to Catalonia'])
+        self.assertEqual(self.titles('animal'), [])
+
+        book.delete()
+        self.assertEqual(self.titles('catalonia'), [])
+
+    def test_fts_syntax_in_queries_is_treated_as_text(self):
+        self.assertEqual(self.titles('"farm OR NOT* ('), [])
+        self.assertEqual(search_books('   '), [])
+
+    def test_fts_and_like_backends_agree_on_whole_words(self):
+        fts, like = SQLiteFTSBackend(), LikeSearchBackend()
+        for query in ('george', 'harper lee', 'farm'):
+            with self.subTest(query=query):
+                self.assertEqual(
+                    set(fts.filter(Book.objects.all(), query)),  # type: ignore
+                    set(like.filter(Book.objects.all(), query)),  # type: ignore
+                )
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin-pass')
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:bookshelf_book_changelist'), {'q': 'orwell'})
+        self.assertEqual(response.context['cl'].result_count, 2)
+        self.assertFalse([q for q in queries if 'LIKE' in q['sql']])
+
+
+class BookFacetTests(TestCase):
+    """Precomputed author and publication_year counts"""
+
+    def counts(self, field):
+        return dict(BookFacet.objects.filter(field=field, count__gt=0).values_list('value', 'count'))  # type: ignore
+
+    def test_counts_follow_creates_updates_and_deletes(self):
+        emma = Book.objects.create(title='Emma', author='Jane Austen', publication_year=1815)  # type: ignore
+        Book.objects.create(title='Persuasion', author='Jane Austen', publication_year=1817)  # type: ignore
+        self.assertEqual(self.counts('author'), {'Jane Austen': 2})
+
+        emma = Book.objects.get(pk=emma.pk)  # type: ignore
+        emma.author = 'J. Austen'
+        emma.save()
+        self.assertEqual(self.counts('author'), {'Jane Austen': 1, 'J. Austen': 1})
+        self.assertEqual(self.counts('publication_year'), {'1815': 1, '1817': 1})
+
+        Book.objects.filter(author='Jane Austen').delete()  # type: ignore
+        self.assertEqual(self.counts('author'), {'J. Austen': 1})
+        self.assertEqual(self.counts('publication_year'), {'1815': 1})
+
+    def test_saving_unchanged_or_unloaded_fields_does_not_touch_facets(self):
+        book = Book.objects.create(title='Emma', author='Jane Austen', publication_year=1815)  # type: ignore
+        with self.assertNumQueries(2):  # select, update
+            Book.objects.get(pk=book.pk).save(update_fields=['title'])  # type: ignore
+        with self.assertNumQueries(2):
+            Book.objects.only('title').get(pk=book.pk).save()  # type: ignore
+        self.assertEqual(self.counts('author'), {'Jane Austen': 1})
+
+    def test_rebuild_matches_incremental_counts(self):
+        for i in range(12):
+            Book.objects.create(title=f"Book {i}", author=f"Author {i % 4}", publication_year=2000 + i % 3)  # type: ignore
+        incremental = (self.counts('author'), self.counts('publication_year'))
+        BookFacet.objects.rebuild()  # type: ignore
+        self.assertEqual((self.counts('author'), self.counts('publication_year')), incremental)
+
+
+class BookFacetAdminTests(TestCase):
+    """The changelist sidebar reads facets, never the books table"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin-pass')
+        Book.objects.bulk_create([  # type: ignore
+            Book(title=f"Book {i}", author=f"Author {i % 30:02d}", publication_year=1990 + i % 5)
+            for i in range(300)
+        ])
+        BookFacet.objects.rebuild()  # type: ignore
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_sidebar_lists_top_values_without_distinct_scan(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:bookshelf_book_changelist'))
+        self.assertFalse([q for q in queries if 'DISTINCT' in q['sql']])
+        author_filter = next(spec for spec in response.context['cl'].filter_specs if spec.parameter_name == 'author')
+        self.assertEqual(len(author_filter.lookup_choices), author_filter.facet_limit)
+        self.assertEqual(author_filter.lookup_choices[0], ('Author 00', 'Author 00 (10)'))
+
+    def test_tail_value_can_be_filtered_and_is_shown_selected(self):
+        response = self.client.get(reverse('admin:bookshelf_book_changelist'), {'author': 'Author 29'})
+        self.assertEqual(response.context['cl'].result_count, 10)
+        self.assertContains(response, 'Author 29')
+
+    def test_invalid_year_is_rejected(self):
+        response = self.client.get(reverse('admin:bookshelf_book_changelist'), {'publication_year': 'abc'})
+        self.assertEqual(response.status_code, 302)  # admin redirects with ?e=1
+
+    def test_autocomplete_returns_matching_values(self):
+        response = self.client.get(reverse('admin:bookshelf_book_facets', args=['author']), {'term': 'author 2'})
+        values = [facet['value'] for facet in response.json()['results']]
+        self.assertEqual(values, [f"Author {i}" for i in range(20, 30)])
 
-# Create your tests here.
+    def test_autocomplete_rejects_unknown_fields(self):
+        response = self.client.get(reverse('admin:bookshelf_book_facets', args=['title']))
+        self.assertEqual(response.status_code, 404)
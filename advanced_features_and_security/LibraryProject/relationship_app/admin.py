@@ -1,10 +1,13 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.db.models.signals import post_delete, post_save
 from django.utils.html import format_html
-from .models import CustomUser# type: ignore
+from .admin_counts import CachedCountAdminMixin, invalidate_counts
+from .models import Author, CustomUser, Library# type: ignore
+from .thumbnails import thumbnail_url
 
 
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(CachedCountAdminMixin, UserAdmin):
     """
     Custom admin interface for the CustomUser model.
     Extends Django's built-in UserAdmin to handle additional fields.
@@ -106,12 +109,12 @@ class CustomUserAdmin(UserAdmin):
 
     def profile_photo_display(self, obj):
         """
-        Display a small version of the profile photo in the admin list view.
+        Display the 64px thumbnail of the profile photo in the admin list view.
         """
         if obj.profile_photo:
             return format_html(
-                '<img src="{}" width="50" height="50" style="border-radius: 50%; object-fit: cover;" />',
-                obj.profile_photo.url
+                '<img src="{}" width="50" height="50" loading="lazy" style="border-radius: 50%; object-fit: cover;" />',
+                thumbnail_url(obj.profile_photo, 64)
             )
         return "No photo"
     profile_photo_display.short_description = "Profile Photo"# type: ignore
@@ -129,6 +132,18 @@ class CustomUserAdmin(UserAdmin):
         if 'profile_photo' in form.base_fields:# type: ignore
             form.base_fields['profile_photo'].help_text = "Upload an image file (JPG, PNG, etc.)"# type: ignore
 
+        # Photos refused while streaming never reach the form; report why
+        upload_errors = getattr(request, 'upload_errors', None)
+        if upload_errors:
+            class UploadCheckedForm(form):# type: ignore
+                def clean(self):
+                    cleaned_data = super().clean()
+                    for field, message in upload_errors.items():
+                        if field in self.fields:
+                            self.add_error(field, message)
+                    return cleaned_data
+            return UploadCheckedForm
+
         return form
 
     def save_model(self, request, obj, form, change):
@@ -147,6 +162,34 @@ class CustomUserAdmin(UserAdmin):
 # Register the CustomUser model with the custom admin
 admin.site.register(CustomUser, CustomUserAdmin)
 
+# Drop cached changelist counts whenever users change
+post_save.connect(invalidate_counts, sender=CustomUser, dispatch_uid='custom_user_counts_save')
+post_delete.connect(invalidate_counts, sender=CustomUser, dispatch_uid='custom_user_counts_delete')
+
+
+class BookCountAdmin(CachedCountAdminMixin, admin.ModelAdmin):
+    """
+    Admin for models with a maintained book_count, listed and sorted by it
+    without counting books.
+    """
+    list_display = ('name', 'book_count')
+    readonly_fields = ('book_count',)
+    search_fields = ('name',)
+    ordering = ('name',)
+
+
+class LibraryAdmin(BookCountAdmin):
+    # A select listing every book does not scale with the catalog
+    raw_id_fields = ('books',)
+
+
+admin.site.register(Author, BookCountAdmin)
+admin.site.register(Library, LibraryAdmin)
+
+for model in (Author, Library):
+    post_save.connect(invalidate_counts, sender=model, dispatch_uid=f'{model._meta.model_name}_counts_save')
+    post_delete.connect(invalidate_counts, sender=model, dispatch_uid=f'{model._meta.model_name}_counts_delete')
+
 # Optional: Customize admin site headers
 admin.site.site_header = "Advanced Features Admin"
 admin.site.site_title = "Advanced Features Admin Portal"
@@ -0,0 +1,144 @@
+# relationship_app/admin_counts.py
+"""
+Cheap result counts for admin changelists on large tables.
+
+Counts are cached per queryset SQL for ADMIN_COUNT_CACHE_TIMEOUT seconds and
+invalidated when the model is written through the ORM. Counts and the
+per-model generation counters retiring them live in the 'shared' cache
+alias when configured, so a write in one worker retires the counts every
+worker shows; an evicted counter restarts from the current time, never at a
+generation already used. Unfiltered tables larger than
+ADMIN_EXACT_COUNT_THRESHOLD rows are not counted at all; their size is read
+from the database's planner statistics instead. Each table's last known size
+is kept for ADMIN_TABLE_SIZE_CACHE_TIMEOUT seconds, so small tables skip the
+statistics lookup and are counted directly.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Max, QuerySet
+from django.utils.functional import cached_property
+
+DEFAULT_COUNT_CACHE_TIMEOUT = 60
+DEFAULT_EXACT_COUNT_THRESHOLD = 100_000
+DEFAULT_TABLE_SIZE_CACHE_TIMEOUT = 3600
+COUNT_CACHE_ALIAS = 'shared'
+
+
+def count_cache():
+    """Return the cache counts and their generation counters are kept in"""
+    alias = COUNT_CACHE_ALIAS if COUNT_CACHE_ALIAS in settings.CACHES else 'default'
+    return caches[alias]
+
+
+def generation_key(model):
+    return f"admin_counts:{model._meta.label_lower}:generation"
+
+
+def size_key(model):
+    return f"admin_counts:{model._meta.label_lower}:size"
+
+
+def current_generation(cache, model):
+    """Return the generation of `model`'s counts, starting a missing counter"""
+    key = generation_key(model)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def invalidate_counts(sender, **kwargs):
+    """Signal receiver discarding every cached count for `sender`"""
+    cache = count_cache()
+    key = generation_key(sender)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
+
+
+def estimate_count(queryset):
+    """
+    Return the planner's row estimate for an unfiltered queryset, or None
+    when the database keeps no usable statistics.
+    """
+    if queryset.query.where:
+        return None
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+            elif connection.vendor == 'sqlite':
+                # Populated by ANALYZE; the first number is the table's row count
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+            else:
+                return None
+            row = cursor.fetchone()
+    except DatabaseError:
+        row = None
+
+    if row and row[0] is not None:
+        estimate = int(str(row[0]).split()[0])
+        if estimate > 0:
+            return estimate
+    if connection.vendor == 'sqlite':
+        # Without statistics the highest rowid bounds the table size
+        return queryset.model._default_manager.using(queryset.db).aggregate(top=Max('pk'))['top'] or 0
+    return None
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator whose count comes from the cache or the planner when possible"""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+
+        try:
+            sql = str(queryset.query)
+        except EmptyResultSet:
+            # .none(), pk__in=[] and the like match nothing without a query
+            return 0
+
+        cache = count_cache()
+        generation = current_generation(cache, queryset.model)
+        digest = hashlib.md5(sql.encode(), usedforsecurity=False).hexdigest()
+        key = f"admin_counts:{queryset.model._meta.label_lower}:{generation}:{digest}"
+
+        unfiltered = not queryset.query.where
+        cached = cache.get_many([key, size_key(queryset.model)] if unfiltered else [key])
+        count = cached.get(key)
+        if count is None:
+            threshold = getattr(settings, 'ADMIN_EXACT_COUNT_THRESHOLD', DEFAULT_EXACT_COUNT_THRESHOLD)
+            known_size = cached.get(size_key(queryset.model))
+            # A table last seen below the threshold is cheaper to count than to estimate
+            estimate = None if known_size is not None and known_size <= threshold else estimate_count(queryset)
+            count = estimate if estimate is not None and estimate > threshold else queryset.count()
+            cache.set(key, count, getattr(settings, 'ADMIN_COUNT_CACHE_TIMEOUT', DEFAULT_COUNT_CACHE_TIMEOUT))
+            if unfiltered:
+                cache.set(
+                    size_key(queryset.model), count,
+                    getattr(settings, 'ADMIN_TABLE_SIZE_CACHE_TIMEOUT', DEFAULT_TABLE_SIZE_CACHE_TIMEOUT),
+                )
+        return count
+
+
+class CachedCountAdminMixin:
+    """
+    ModelAdmin mixin using CachedCountPaginator and skipping the second,
+    unfiltered COUNT(*) the changelist runs whenever a filter is active.
+    """
+    paginator = CachedCountPaginator
+    show_full_result_count = False
@@ -1,9 +1,13 @@
-from django.apps import AppConfig
-
-
 # relationship_app/apps.py
 from django.apps import AppConfig
 
 class RelationshipAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'  # type: ignore
     name = 'relationship_app'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .database import configure_sqlite
+
+        connection_created.connect(configure_sqlite, dispatch_uid='relationship_app.configure_sqlite')
@@ -0,0 +1,170 @@
+# relationship_app/async_views.py
+"""
+Async-native versions of the catalog, library and role dashboard views.
+
+Served instead of their counterparts in views.py when ASYNC_VIEWS is on,
+which LibraryProject/asgi.py turns on by default. Under ASGI a sync view
+costs a hop to the one thread every sync view shares; these run on the event
+loop, read the database with the async ORM and resolve the user and role
+before rendering, so templates never query. They build the same querysets
+as views.py and render the same templates.
+"""
+
+import functools
+import time
+
+from django.contrib.auth.decorators import user_passes_test
+from django.http import HttpResponseBadRequest
+from django.shortcuts import aget_object_or_404, render
+from django.views import View
+
+from . import page_cache
+from .dashboard import adashboard_stats
+from .models import Library
+from .roles import aget_user_role
+from .views import (
+    BOOKS_PER_PAGE, LIBRARIES_PER_PAGE, RECENT_BOOKS_PER_LIBRARY, USERS_PER_PAGE, BookPage,
+    attach_recent_books, catalog_books, dashboard_cursors, parse_cursor, record_page_cache,
+    recent_memberships, split_page, summary_libraries, user_profiles,
+)
+
+
+# Role checks; coroutine test functions keep user_passes_test on the event loop
+async def is_authenticated(user):
+    """Check if user is logged in"""
+    return user.is_authenticated
+
+async def is_admin(user):
+    """Check if user has Admin role"""
+    return await aget_user_role(user) == 'Admin'
+
+async def is_librarian(user):
+    """Check if user has Librarian role"""
+    return await aget_user_role(user) == 'Librarian'
+
+async def is_member(user):
+    """Check if user has Member role"""
+    return await aget_user_role(user) == 'Member'
+
+def with_user(view):
+    """
+    Load request.user with the async ORM before `view` runs. The lazy user
+    AuthenticationMiddleware leaves would query when a template reads it.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request.user = await request.auser()
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+# Django's login_required would check is_authenticated in a thread
+login_required = user_passes_test(is_authenticated)
+
+async def library_summaries(after=None, limit=LIBRARIES_PER_PAGE, recent=RECENT_BOOKS_PER_LIBRARY):
+    """Async views.library_summaries"""
+    libraries, next_cursor = split_page(
+        [library async for library in summary_libraries(after, recent)[:limit + 1]], limit,
+    )
+    memberships = [membership async for membership in recent_memberships(libraries)] if libraries else []
+    attach_recent_books(libraries, memberships)
+    return libraries, next_cursor
+
+async def render_role_dashboard(request, template_name):
+    """Async views.render_role_dashboard"""
+    try:
+        after, libraries_after, library_id = dashboard_cursors(request)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid cursor")
+
+    books = catalog_books(after)
+    selected = None
+    if library_id is not None:
+        selected = await aget_object_or_404(Library.objects.only('id', 'name'), pk=library_id)  # type: ignore
+        books = books.filter(library=selected)
+    books, next_cursor = split_page([book async for book in books[:BOOKS_PER_PAGE + 1]])
+    libraries, next_libraries_cursor = await library_summaries(libraries_after)
+
+    context = {
+        'books': books,
+        'next_cursor': next_cursor,
+        'is_first_page': after is None,
+        'selected_library': selected,
+        'libraries': libraries,
+        'next_libraries_cursor': next_libraries_cursor,
+        'user_role': await aget_user_role(request.user),
+    }
+    return render(request, template_name, context)
+
+@login_required
+@with_user
+async def list_books(request):
+    """Function-based view to list books, one cursor page at a time"""
+    started = time.perf_counter()
+    try:
+        after = parse_cursor(request)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid 'after' cursor")
+
+    page = BookPage(catalog_books(after), after, [page_cache.CATALOG_SCOPE])
+    await page.aprepare('catalog_books')
+    response = render(request, 'relationship_app/list_books.html', {'page': page})
+    return record_page_cache(response, page, started)
+
+class LibraryDetailView(View):
+    """Async views.LibraryDetailView; route it through library_detail, which checks the login"""
+    template_name = 'relationship_app/library_detail.html'
+    books_per_page = BOOKS_PER_PAGE
+
+    async def get(self, request, pk):
+        started = time.perf_counter()
+        try:
+            after = parse_cursor(request)
+        except ValueError:
+            return HttpResponseBadRequest("Invalid 'after' cursor")
+
+        library = await aget_object_or_404(Library.objects.only('id', 'name', 'book_count'), pk=pk)  # type: ignore
+        page = BookPage(
+            catalog_books(after).filter(library=library),
+            after,
+            [page_cache.library_scope(library.pk)],
+            self.books_per_page,
+        )
+        await page.aprepare('library_books', library.pk)
+        context = {'object': library, 'library': library, 'page': page, 'view': self}
+        response = render(request, self.template_name, context)
+        return record_page_cache(response, page, started)
+
+library_detail = login_required(with_user(LibraryDetailView.as_view()))
+
+@user_passes_test(is_admin)
+@with_user
+async def admin_view(request):
+    """Admin-only view"""
+    try:
+        after = parse_cursor(request)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid 'after' cursor")
+
+    users, next_cursor = split_page(
+        [profile async for profile in user_profiles(after)[:USERS_PER_PAGE + 1]], USERS_PER_PAGE,
+    )
+    context = {
+        'stats': await adashboard_stats(),
+        'users': users,
+        'next_cursor': next_cursor,
+        'is_first_page': after is None,
+        'user_role': await aget_user_role(request.user),
+    }
+    return render(request, 'relationship_app/admin_view.html', context)
+
+@user_passes_test(is_librarian)
+@with_user
+async def librarian_view(request):
+    """Librarian-only view"""
+    return await render_role_dashboard(request, 'relationship_app/librarian_view.html')
+
+@user_passes_test(is_member)
+@with_user
+async def member_view(request):
+    """Member-only view"""
+    return await render_role_dashboard(request, 'relationship_app/member_view.html')
@@ -0,0 +1,18 @@
+# relationship_app/backends.py
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+class RoleAwareModelBackend(ModelBackend):
+    """
+    ModelBackend that loads the user's UserProfile in the same query as the
+    user, so role checks on each request do not trigger a second lookup.
+    """
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related('userprofile').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
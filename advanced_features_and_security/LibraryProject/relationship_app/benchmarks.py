@@ -0,0 +1,1272 @@
+# relationship_app/benchmarks.py
+"""
+Performance benchmarks for the relationship_app views
+Run from the Django shell:
+    python manage.py shell -c "from relationship_app.benchmarks import run_all_benchmarks; run_all_benchmarks()"
+
+Every benchmark seeds its own data inside a transaction that is rolled back
+at the end, so the development database is left untouched.
+"""
+
+import asyncio
+import copy
+import http.client
+import importlib.util
+import json
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from io import BytesIO
+from pathlib import Path
+
+from asgiref.sync import async_to_sync
+from django.contrib import admin
+from django.contrib.auth import views as auth_views
+from django.contrib.auth.hashers import make_password
+from django.contrib.staticfiles import finders
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.paginator import Paginator
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import OperationalError, close_old_connections, connection, reset_queries, transaction
+# benchmark_wsgi_vs_asgi has a `connections` argument
+from django.db import connections as db_connections
+from django.db.models import Count
+from django.template import engines
+from django.test import AsyncClient, Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.text import compress_sequence
+from PIL import Image
+
+from bookshelf.models import Book as ShelfBook
+from relationship_app.admin_counts import CachedCountPaginator, count_cache
+from relationship_app import page_cache, views
+from relationship_app.dashboard import compute_stats
+from relationship_app.exports import CatalogExport
+from relationship_app.hashers import offload_hashing
+from relationship_app.models import Author, Book, CustomUser, Library, UserProfile
+from relationship_app.storage import ContentAddressedStorage
+from relationship_app.template_warmup import warm_templates
+from relationship_app.thumbnails import delete_thumbnails, generate_thumbnails
+from relationship_app.views import BOOKS_PER_PAGE, catalog_books
+
+# Number of timed requests issued per measurement
+REQUESTS_PER_SAMPLE = 50
+
+# Rows inserted per bulk_create call while seeding
+SEED_BATCH_SIZE = 5000
+
+
+class _Rollback(Exception):
+    """Raised to discard everything a benchmark wrote"""
+
+
+@contextmanager
+def rolled_back():
+    """Run the enclosed block in a transaction that is always rolled back"""
+    try:
+        with transaction.atomic():
+            yield
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+def logged_in_client(username='benchmark', role=None, backend=None):
+    """Return a test client authenticated as a freshly created user"""
+    user = User.objects.create_user(username=username, password='benchmark-pass')
+    if role is not None:
+        user.userprofile.role = role
+        user.userprofile.save()
+    client = Client(SERVER_NAME='localhost')
+    client.force_login(user, backend=backend)
+    return client
+
+
+def seed_books(total, authors=1000):
+    """Bulk insert `total` books spread across `authors` authors"""
+    Author.objects.bulk_create(  # type: ignore
+        [Author(name=f"Author {i}") for i in range(authors)],
+        batch_size=SEED_BATCH_SIZE,
+    )
+    author_ids = list(Author.objects.values_list('id', flat=True))  # type: ignore
+    for start in range(0, total, SEED_BATCH_SIZE):
+        stop = min(start + SEED_BATCH_SIZE, total)
+        Book.objects.bulk_create(  # type: ignore
+            [Book(title=f"Book {i}", author_id=author_ids[i % len(author_ids)]) for i in range(start, stop)],
+            batch_size=SEED_BATCH_SIZE,
+        )
+    # bulk_create bypasses the book count receivers
+    Author.objects.recount_books()  # type: ignore
+
+
+def measure(client, url, requests=REQUESTS_PER_SAMPLE, method='get', data=None, status=200):
+    """
+    Issue `requests` requests against `url` and return latency percentiles
+    in milliseconds, throughput and the number of SQL queries a single
+    request runs.
+    """
+    send = getattr(client, method)
+
+    # Requests clear the query log when they start, so begin from an empty one
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+        response = send(url, data)
+    assert response.status_code == status, f"{url} returned {response.status_code}"
+    # Read the count now: the captured slice is taken lazily from a log later requests reset
+    query_count = len(queries)
+
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        send(url, data)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    percentiles = statistics.quantiles(timings, n=100)
+    return {
+        'queries': query_count,
+        'p50_ms': round(percentiles[49], 2),
+        'p90_ms': round(percentiles[89], 2),
+        'p99_ms': round(percentiles[98], 2),
+        'requests_per_sec': round(1000 * len(timings) / sum(timings), 1),
+    }
+
+
+def benchmark_list_books(sizes=(1_000, 10_000, 100_000, 1_000_000)):
+    """Show /books/ query count and latency staying flat as the catalog grows"""
+    print("\n=== BENCHMARK: /books/ keyset pagination ===")
+    print(f"{'books':>10} {'page':>6} {'queries':>8} {'p50 ms':>8} {'p99 ms':>8}")
+
+    results = []
+    for size in sizes:
+        with rolled_back():
+            seed_books(size)
+            client = logged_in_client()
+            url = reverse('list_books')
+            last_pk = Book.objects.order_by('-pk').values_list('pk', flat=True).first()  # type: ignore
+
+            for page, query in (('first', ''), ('deep', f"?after={last_pk - 100}")):
+                # Measure the query path, not the fragment cache
+                with override_settings(PAGE_CACHE_TIMEOUT=0):
+                    stats = measure(client, url + query)
+                results.append({'books': size, 'page': page, **stats})
+                print(f"{size:>10} {page:>6} {stats['queries']:>8} {stats['p50_ms']:>8} {stats['p99_ms']:>8}")
+    return results
+
+
+def benchmark_role_views():
+    """Compare queries per request on the role views with and without the role-aware backend"""
+    print("\n=== BENCHMARK: role-gated views ===")
+    print(f"{'backend':>22} {'view':>16} {'queries':>8} {'p50 ms':>8} {'p99 ms':>8}")
+
+    backends = (
+        'django.contrib.auth.backends.ModelBackend',
+        'relationship_app.backends.RoleAwareModelBackend',
+    )
+    views = (('admin_view', 'Admin'), ('librarian_view', 'Librarian'), ('member_view', 'Member'))
+
+    results = []
+    for backend in backends:
+        with override_settings(AUTHENTICATION_BACKENDS=[backend], ROLE_CACHE_TIMEOUT=0), rolled_back():
+            for view, role in views:
+                client = logged_in_client(username=f"benchmark-{role}", role=role, backend=backend)
+                stats = measure(client, reverse(view))
+                name = backend.rsplit('.', 1)[-1]
+                results.append({'backend': name, 'view': view, **stats})
+                print(f"{name:>22} {view:>16} {stats['queries']:>8} {stats['p50_ms']:>8} {stats['p99_ms']:>8}")
+    return results
+
+
+def benchmark_role_dashboards(sizes=(10, 10_000, 1_000_000), libraries=20):
+    """Show librarian_view and member_view query counts and latency staying flat as the catalog grows"""
+    print("\n=== BENCHMARK: librarian and member dashboards ===")
+    print(f"{'books':>10} {'view':>16} {'queries':>8} {'p50 ms':>8} {'p99 ms':>8}")
+
+    results = []
+    for size in sizes:
+        with rolled_back():
+            seed_books(size, authors=min(size, 1000))
+            Library.objects.bulk_create([Library(name=f"Library {i}") for i in range(libraries)])  # type: ignore
+            Membership = Library.books.through
+            book_ids = list(Book.objects.values_list('id', flat=True))  # type: ignore
+            for offset, library_id in enumerate(Library.objects.values_list('id', flat=True)):  # type: ignore
+                Membership.objects.bulk_create(
+                    [Membership(library_id=library_id, book_id=pk) for pk in book_ids[offset::libraries]],
+                    batch_size=SEED_BATCH_SIZE,
+                )
+            Library.objects.recount_books()  # type: ignore
+
+            for view, role in (('librarian_view', 'Librarian'), ('member_view', 'Member')):
+                client = logged_in_client(f"benchmark-{role}", role=role)
+                stats = measure(client, reverse(view))
+                results.append({'books': size, 'view': view, **stats})
+                print(f"{size:>10} {view:>16} {stats['queries']:>8} {stats['p50_ms']:>8} {stats['p99_ms']:>8}")
+    return results
+
+
+# Hasher policies compared by benchmark_login, preferred hasher first
+HASHER_POLICIES = (
+    ('md5 (no cost)', ['django.contrib.auth.hashers.MD5PasswordHasher']),
+    ('pbkdf2 default', ['django.contrib.auth.hashers.PBKDF2PasswordHasher']),
+    ('scrypt tuned', ['relationship_app.hashers.TunedScryptPasswordHasher']),
+    ('argon2id tuned', ['relationship_app.hashers.TunedArgon2PasswordHasher']),
+)
+
+
+def benchmark_login(logins=50):
+    """
+    Measure login throughput under each hasher policy, the SQL statements a
+    single login issues, and the one extra UPDATE a legacy hash costs the
+    first time it is upgraded.
+    """
+    print("\n=== BENCHMARK: login throughput ===")
+    credentials = {'username': 'benchmark', 'password': 'benchmark-pass'}
+    url = reverse('login')
+
+    results = {'policies': [], 'queries': None, 'rehash_queries': None}
+    print(f"{'hasher':>16} {'hash ms':>8} {'logins/s':>9}")
+    for label, hashers in HASHER_POLICIES:
+        with override_settings(PASSWORD_HASHERS=hashers), rolled_back():
+            try:
+                started = time.perf_counter()
+                User.objects.create_user(**credentials)
+            except ValueError as exc:
+                # Argon2 without argon2-cffi installed
+                print(f"{label:>16} skipped: {exc}")
+                continue
+            hash_ms = (time.perf_counter() - started) * 1000
+
+            reset_queries()
+            with CaptureQueriesContext(connection) as queries:
+                Client(SERVER_NAME='localhost').post(url, credentials)
+            results['queries'] = len(queries)
+            results['profile_queries'] = sum('relationship_app_userprofile' in q['sql'] for q in queries)
+
+            started = time.perf_counter()
+            for _ in range(logins):
+                response = Client(SERVER_NAME='localhost').post(url, credentials)
+                assert response.status_code == 302, f"login returned {response.status_code}"
+            elapsed = time.perf_counter() - started
+
+        results['policies'].append({
+            'hasher': label, 'hash_ms': round(hash_ms, 1), 'logins_per_sec': round(logins / elapsed, 1),
+        })
+        print(f"{label:>16} {hash_ms:>8.1f} {logins / elapsed:>9.1f}")
+
+    # A PBKDF2 hash is upgraded to the preferred hasher by the first login
+    policy = ['relationship_app.hashers.TunedScryptPasswordHasher', 'django.contrib.auth.hashers.PBKDF2PasswordHasher']
+    with override_settings(PASSWORD_HASHERS=policy), rolled_back():
+        user = User.objects.create_user(username='legacy')
+        user.password = make_password(credentials['password'], hasher='pbkdf2_sha256')
+        user.save()
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            Client(SERVER_NAME='localhost').post(url, {**credentials, 'username': 'legacy'})
+        results['rehash_queries'] = len(queries)
+        upgraded = User.objects.get(pk=user.pk).password.split('$', 1)[0]
+
+    print(f"\nqueries per login: {results['queries']} (profile: {results['profile_queries']})")
+    print(f"first login with a pbkdf2 hash: {results['rehash_queries']} queries, stored as {upgraded}")
+    return results
+
+
+def benchmark_login_offload(logins=16, pages=64):
+    """
+    Serve concurrent scrypt logins and cheap page views through the ASGI
+    handler, with the login view on the shared sync thread and then in the
+    hashing pool, and report how long the page views wait.
+    """
+    print(f"\n=== BENCHMARK: ASGI logins, {logins} logins alongside {pages} page views ===")
+    credentials = {'username': 'benchmark-asgi', 'password': 'benchmark-pass'}
+    hashers = ['relationship_app.hashers.TunedScryptPasswordHasher']
+
+    async def login():
+        response = await AsyncClient().post('/login/', credentials)
+        assert response.status_code == 302, f"login returned {response.status_code}"
+
+    async def page(timings):
+        started = time.perf_counter()
+        await AsyncClient().get('/books/')
+        timings.append((time.perf_counter() - started) * 1000)
+
+    async def mixed():
+        timings = []
+        started = time.perf_counter()
+        await asyncio.gather(*[login() for _ in range(logins)], *[page(timings) for _ in range(pages)])
+        return time.perf_counter() - started, timings
+
+    results = []
+    # The pool threads use their own connections, so the user is committed and removed afterwards
+    with override_settings(PASSWORD_HASHERS=hashers, ALLOWED_HOSTS=['testserver']):
+        user = User.objects.create_user(**credentials)
+        try:
+            print(f"{'login view':>12} {'wall s':>7} {'page p50 ms':>12} {'page p99 ms':>12}")
+            for label, offload in (('sync thread', False), ('hash pool', True)):
+                urlconf = types.ModuleType('benchmark_login_urls')
+                with override_settings(PASSWORD_HASHING_OFFLOAD=offload):
+                    urlconf.urlpatterns = [
+                        path('login/', offload_hashing(auth_views.LoginView.as_view(
+                            template_name='relationship_app/login.html',
+                        )), name='login'),
+                        path('books/', views.list_books, name='list_books'),
+                    ]
+                with override_settings(ROOT_URLCONF=urlconf):
+                    elapsed, timings = async_to_sync(mixed)()
+                percentiles = statistics.quantiles(timings, n=100)
+                stats = {'p50_ms': round(percentiles[49], 2), 'p99_ms': round(percentiles[98], 2)}
+                results.append({'login_view': label, 'seconds': round(elapsed, 2), **stats})
+                print(f"{label:>12} {elapsed:>7.2f} {stats['p50_ms']:>12} {stats['p99_ms']:>12}")
+        finally:
+            user.delete()
+    return results
+
+
+def seed_admin_tables(total):
+    """Bulk insert `total` bookshelf books and `total` custom users"""
+    for start in range(0, total, SEED_BATCH_SIZE):
+        stop = min(start + SEED_BATCH_SIZE, total)
+        ShelfBook.objects.bulk_create([  # type: ignore
+            ShelfBook(title=f"Book {i}", author=f"Author {i % 500}", publication_year=1900 + i % 120)
+            for i in range(start, stop)
+        ])
+        CustomUser.objects.bulk_create([  # type: ignore
+            CustomUser(username=f"user{i}", email=f"user{i}@example.com", is_staff=i % 50 == 0)
+            for i in range(start, stop)
+        ])
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def benchmark_admin_counts(sizes=(100_000, 1_000_000)):
+    """Compare changelist latency with Django's exact counts and with CachedCountPaginator"""
+    print("\n=== BENCHMARK: admin changelist counts ===")
+    print(f"{'rows':>10} {'changelist':>28} {'paginator':>8} {'queries':>8} {'p50 ms':>8} {'p99 ms':>8}")
+
+    changelists = (
+        (ShelfBook, 'admin:bookshelf_book_changelist', ''),
+        (ShelfBook, 'admin:bookshelf_book_changelist', '?publication_year=1950'),
+        (CustomUser, 'admin:relationship_app_customuser_changelist', ''),
+        (CustomUser, 'admin:relationship_app_customuser_changelist', '?is_staff__exact=1'),
+    )
+    results = []
+    for size in sizes:
+        with rolled_back():
+            seed_admin_tables(size)
+            superuser = User.objects.create_superuser('benchmark-admin', 'admin@example.com', 'benchmark-pass')
+            client = Client(SERVER_NAME='localhost')
+            client.force_login(superuser)
+
+            for model, name, query in changelists:
+                model_admin = admin.site._registry[model]
+                for label, paginator, full_count in (('exact', Paginator, True), ('cached', CachedCountPaginator, False)):
+                    model_admin.paginator, model_admin.show_full_result_count = paginator, full_count
+                    count_cache().clear()
+                    stats = measure(client, reverse(name) + query)
+                    target = f"{model._meta.model_name}{query}"
+                    results.append({'rows': size, 'changelist': target, 'paginator': label, **stats})
+                    print(
+                        f"{size:>10} {target:>28} {label:>8} {stats['queries']:>8} "
+                        f"{stats['p50_ms']:>8} {stats['p99_ms']:>8}"
+                    )
+                del model_admin.paginator, model_admin.show_full_result_count
+    return results
+
+
+def seed_users(total, roles=('Member', 'Member', 'Member', 'Librarian')):
+    """Bulk insert `total` users with profiles cycling through `roles`"""
+    for start in range(0, total, SEED_BATCH_SIZE):
+        users = User.objects.bulk_create(
+            [User(username=f"member{i}", password='!') for i in range(start, min(start + SEED_BATCH_SIZE, total))]
+        )
+        UserProfile.objects.bulk_create(  # type: ignore
+            [UserProfile(user_id=user.pk, role=roles[user.pk % len(roles)]) for user in users]
+        )
+
+
+def benchmark_admin_dashboard(sizes=(1_000, 100_000, 1_000_000)):
+    """Show admin_view latency staying flat as users grow, and the cost of a statistics refresh"""
+    print("\n=== BENCHMARK: admin dashboard ===")
+    print(f"{'users':>10} {'queries':>8} {'p50 ms':>8} {'p99 ms':>8} {'refresh ms':>11}")
+
+    results = []
+    for size in sizes:
+        with rolled_back():
+            seed_users(size)
+            client = logged_in_client('benchmark-admin', role='Admin')
+            page_cache.fragment_cache().clear()
+            stats = measure(client, reverse('admin_view'))
+
+            started = time.perf_counter()
+            compute_stats()
+            refresh_ms = round((time.perf_counter() - started) * 1000, 1)
+            results.append({'users': size, 'refresh_ms': refresh_ms, **stats})
+            print(f"{size:>10} {stats['queries']:>8} {stats['p50_ms']:>8} {stats['p99_ms']:>8} {refresh_ms:>11}")
+    return results
+
+
+def page_image_bytes(html):
+    """Sum the size of every media file referenced by an <img> in `html`"""
+    total = 0
+    for url in re.findall(r'<img src="([^"]+)"', html):
+        if url.startswith(settings.MEDIA_URL):
+            total += (Path(settings.MEDIA_ROOT) / url[len(settings.MEDIA_URL):]).stat().st_size
+    return total
+
+
+def benchmark_profile_photo_thumbnails(users=100, photo_size=(1600, 1200)):
+    """Compare CustomUser changelist image weight and render time with originals and thumbnails"""
+    print("\n=== BENCHMARK: profile photo thumbnails in the user changelist ===")
+    media_root = tempfile.mkdtemp()
+    try:
+        with override_settings(MEDIA_ROOT=media_root), rolled_back():
+            buffer = BytesIO()
+            Image.effect_noise(photo_size, 40).convert('RGB').save(buffer, 'JPEG', quality=90)
+            for i in range(users):
+                user = CustomUser(username=f"photo{i}", email=f"photo{i}@example.com")
+                user.profile_photo.save(f"avatar{i}.jpg", ContentFile(buffer.getvalue()), save=False)
+                CustomUser.objects.bulk_create([user])  # type: ignore
+                generate_thumbnails(user.profile_photo.storage, user.profile_photo.name)
+
+            superuser = User.objects.create_superuser('benchmark-admin', 'admin@example.com', 'benchmark-pass')
+            client = Client(SERVER_NAME='localhost')
+            client.force_login(superuser)
+            url = reverse('admin:relationship_app_customuser_changelist')
+
+            results = {}
+            results['thumbnails'] = {**measure(client, url), 'image_bytes': page_image_bytes(client.get(url).content.decode())}
+            for user in CustomUser.objects.exclude(profile_photo=''):  # type: ignore
+                delete_thumbnails(user.profile_photo.storage, user.profile_photo.name)
+            results['originals'] = {**measure(client, url), 'image_bytes': page_image_bytes(client.get(url).content.decode())}
+    finally:
+        shutil.rmtree(media_root)
+
+    print(f"{'images':>12} {'image KB':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for label in ('originals', 'thumbnails'):
+        stats = results[label]
+        print(f"{label:>12} {stats['image_bytes'] // 1024:>10} {stats['p50_ms']:>8} {stats['p99_ms']:>8}")
+    return results
+
+
+def parse_uploads_in_parallel(bodies):
+    """Parse every upload request concurrently; return (peak traced MB, seconds)"""
+    requests = [RequestFactory().post('/', {'profile_photo': ContentFile(body, name='photo.jpg')}) for body in bodies]
+    tracemalloc.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(requests)) as pool:
+        files = list(pool.map(lambda request: request.FILES['profile_photo'], requests))
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    for request in requests:
+        request.close()
+    assert len(files) == len(requests)
+    return peak / 1024 / 1024, elapsed
+
+
+def benchmark_profile_photo_uploads(uploads=50, photo_size=(2000, 1500)):
+    """Compare peak memory of parallel photo uploads with Django's default and the streaming handler"""
+    print(f"\n=== BENCHMARK: {uploads} parallel profile photo uploads ===")
+    buffer = BytesIO()
+    Image.effect_noise(photo_size, 40).convert('RGB').save(buffer, 'JPEG', quality=95)
+    bodies = [buffer.getvalue()] * uploads
+    print(f"photo size: {len(bodies[0]) / 1024 / 1024:.1f} MB")
+    print(f"{'handler':>12} {'peak MB':>9} {'MB/upload':>10} {'seconds':>8}")
+
+    default_handlers = [
+        'django.core.files.uploadhandler.MemoryFileUploadHandler',
+        'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+    ]
+    configurations = (
+        ('default', default_handlers),
+        ('streaming', ['relationship_app.uploads.ProfilePhotoUploadHandler'] + default_handlers),
+    )
+    results = []
+    for name, handlers in configurations:
+        with override_settings(FILE_UPLOAD_HANDLERS=handlers):
+            peak, elapsed = parse_uploads_in_parallel(bodies)
+        results.append({'handler': name, 'peak_mb': round(peak, 1), 'seconds': round(elapsed, 2)})
+        print(f"{name:>12} {peak:>9.1f} {peak / uploads:>10.2f} {elapsed:>8.2f}")
+    return results
+
+
+def disk_usage(root):
+    """Return (files, bytes allocated on disk) below `root`"""
+    files = allocated = 0
+    for directory, _, names in os.walk(root):
+        for name in names:
+            files += 1
+            allocated += os.stat(os.path.join(directory, name)).st_blocks * 512
+    return files, allocated
+
+
+def io_counters():
+    """Return this process's I/O counters from /proc/self/io (Linux only)"""
+    with open('/proc/self/io') as handle:
+        return {key: int(value) for key, value in (line.split(': ') for line in handle)}
+
+
+def benchmark_profile_photo_storage(users=100_000, avatars=500, seed=0):
+    """Bulk import users with repeated avatars into plain and content-addressed storage"""
+    print(f"\n=== BENCHMARK: importing {users} users sharing {avatars} avatars ===")
+    rng = random.Random(seed)
+    photos = []
+    for _ in range(avatars):
+        buffer = BytesIO()
+        Image.effect_noise((256, 256), 40).convert('RGB').save(buffer, 'JPEG', quality=85)
+        photos.append(buffer.getvalue())
+    # Popular avatars are reused far more often than the rest
+    weights = [1 / rank for rank in range(1, avatars + 1)]
+    assignments = rng.choices(range(avatars), weights=weights, k=users)
+
+    print(f"{'storage':>18} {'files':>8} {'disk MB':>9} {'write calls':>12} {'written MB':>11} {'writes/s':>9} {'seconds':>8}")
+    results = []
+    for label, storage_class in (('filesystem', FileSystemStorage), ('content-addressed', ContentAddressedStorage)):
+        root = tempfile.mkdtemp()
+        try:
+            storage = storage_class(location=root)
+            write_calls = written = elapsed = 0
+            with rolled_back():
+                for start in range(0, users, SEED_BATCH_SIZE):
+                    # Only the storage writes are counted, not the row inserts
+                    before, started = io_counters(), time.perf_counter()
+                    names = [
+                        storage.save(f"profile_photos/avatar{i}.jpg", ContentFile(photos[assignments[i]]))
+                        for i in range(start, min(start + SEED_BATCH_SIZE, users))
+                    ]
+                    elapsed += time.perf_counter() - started
+                    after = io_counters()
+                    write_calls += after['syscw'] - before['syscw']
+                    written += (after['wchar'] - before['wchar']) / 1024 / 1024
+                    CustomUser.objects.bulk_create([  # type: ignore
+                        CustomUser(username=f"import{i}", email=f"import{i}@example.com", profile_photo=name)
+                        for i, name in enumerate(names, start)
+                    ])
+            files, allocated = disk_usage(root)
+        finally:
+            shutil.rmtree(root)
+
+        results.append({
+            'storage': label, 'files': files, 'disk_mb': round(allocated / 1024 / 1024, 1),
+            'write_calls': write_calls, 'written_mb': round(written, 1),
+            'writes_per_sec': round(write_calls / elapsed), 'seconds': round(elapsed, 1),
+        })
+        print(
+            f"{label:>18} {files:>8} {allocated / 1024 / 1024:>9.1f} {write_calls:>12} "
+            f"{written:>11.1f} {write_calls / elapsed:>9.0f} {elapsed:>8.1f}"
+        )
+    return results
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class OccupancyMeter:
+    """WSGI middleware adding up the time workers spend on each request, body included"""
+
+    def __init__(self, application):
+        self.application = application
+        self.busy = 0.0
+        self.lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        started = time.perf_counter()
+        result = self.application(environ, start_response)
+        try:
+            yield from result
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+            with self.lock:
+                self.busy += time.perf_counter() - started
+
+
+def fetch(port, path, headers, requests):
+    """Issue `requests` GETs on fresh connections; return (bytes received, statuses)"""
+    received, statuses = 0, set()
+    for _ in range(requests):
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        connection.request('GET', path, headers=headers)
+        response = connection.getresponse()
+        received += len(response.read())
+        statuses.add(response.status)
+        connection.close()
+    return received, statuses
+
+
+def benchmark_media_serving(clients=16, requests_per_client=50, photo_size=(1024, 768)):
+    """Photo throughput and worker occupancy per MEDIA_SERVE_MODE under concurrent load"""
+    print(f"\n=== BENCHMARK: media serving, {clients} concurrent clients ===")
+    media_root = tempfile.mkdtemp()
+    buffer = BytesIO()
+    Image.effect_noise(photo_size, 40).convert('RGB').save(buffer, 'JPEG', quality=90)
+    Path(media_root, 'photo.jpg').write_bytes(buffer.getvalue())
+    print(f"photo size: {len(buffer.getvalue()) / 1024:.0f} KB")
+    print(f"{'mode':>26} {'status':>7} {'req/s':>8} {'MB/s':>7} {'worker ms/req':>14}")
+
+    etag = None
+    results = []
+    scenarios = (
+        ('python', 'full', {}),
+        ('python', 'revalidate', None),
+        ('x-accel-redirect', 'full', {}),
+        ('x-sendfile', 'full', {}),
+    )
+    try:
+        for mode, kind, headers in scenarios:
+            with override_settings(MEDIA_ROOT=media_root, MEDIA_SERVE_MODE=mode, ALLOWED_HOSTS=['*']):
+                meter = OccupancyMeter(get_wsgi_application())
+                server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+                server.set_app(meter)
+                thread = threading.Thread(target=server.serve_forever, daemon=True)
+                thread.start()
+                port = server.server_address[1]
+                try:
+                    if headers is None:
+                        connection = http.client.HTTPConnection('127.0.0.1', port)
+                        connection.request('GET', '/media/photo.jpg')
+                        etag = connection.getresponse().getheader('ETag')
+                        connection.close()
+                        headers = {'If-None-Match': etag}
+                    meter.busy = 0.0
+                    started = time.perf_counter()
+                    with ThreadPoolExecutor(max_workers=clients) as pool:
+                        outcomes = list(pool.map(
+                            lambda _: fetch(port, '/media/photo.jpg', headers, requests_per_client), range(clients)
+                        ))
+                    elapsed = time.perf_counter() - started
+                finally:
+                    server.shutdown()
+                    server.server_close()
+
+            total = clients * requests_per_client
+            received = sum(outcome[0] for outcome in outcomes)
+            statuses = '/'.join(str(status) for status in sorted(set().union(*(outcome[1] for outcome in outcomes))))
+            label = f"{mode} ({kind})"
+            results.append({
+                'mode': mode, 'kind': kind, 'status': statuses,
+                'requests_per_sec': round(total / elapsed), 'mb_per_sec': round(received / elapsed / 1024 / 1024, 1),
+                'worker_ms': round(meter.busy / total * 1000, 2),
+            })
+            print(
+                f"{label:>26} {statuses:>7} {total / elapsed:>8.0f} {received / elapsed / 1024 / 1024:>7.1f} "
+                f"{meter.busy / total * 1000:>14.2f}"
+            )
+    finally:
+        shutil.rmtree(media_root)
+    return results
+
+
+def benchmark_page_cache(books=100_000, libraries=20, reads=1000, writes_every=50, seed=0):
+    """Cold vs cached latency of the book pages, and hit rate under a read-mostly mix"""
+    print(f"\n=== BENCHMARK: catalog and library page cache ({books} books) ===")
+    results = {'latency': [], 'mixed': None}
+    with rolled_back():
+        seed_books(books)
+        book_ids = list(Book.objects.values_list('id', flat=True))  # type: ignore
+        Library.objects.bulk_create([Library(name=f"Library {i}") for i in range(libraries)])  # type: ignore
+        Membership = Library.books.through
+        library_ids = list(Library.objects.values_list('id', flat=True))  # type: ignore
+        for offset, library_id in enumerate(library_ids):
+            Membership.objects.bulk_create(
+                [Membership(library_id=library_id, book_id=pk) for pk in book_ids[offset::libraries]],
+                batch_size=SEED_BATCH_SIZE,
+            )
+        Library.objects.recount_books()  # type: ignore
+
+        client = logged_in_client()
+        urls = {
+            'catalog first': reverse('list_books'),
+            'catalog deep': f"{reverse('list_books')}?after={book_ids[len(book_ids) // 2]}",
+            'library': reverse('library_detail', args=[library_ids[0]]),
+        }
+        print(f"{'page':>14} {'cache':>6} {'queries':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        for name, url in urls.items():
+            page_cache.fragment_cache().clear()
+            for label, timeout in (('off', 0), ('warm', page_cache.DEFAULT_PAGE_CACHE_TIMEOUT)):
+                with override_settings(PAGE_CACHE_TIMEOUT=timeout):
+                    client.get(url)  # fill the cache before the counted request
+                    stats = measure(client, url)
+                results['latency'].append({'page': name, 'cache': label, **stats})
+                print(f"{name:>14} {label:>6} {stats['queries']:>8} {stats['p50_ms']:>8} {stats['p99_ms']:>8}")
+
+        # Readers walk the first pages of the catalog and libraries while an editor
+        # renames a random book every `writes_every` reads
+        rng = random.Random(seed)
+        pages = [reverse('list_books')] + [reverse('library_detail', args=[pk]) for pk in library_ids]
+        page_cache.fragment_cache().clear()
+        page_cache.stats.reset()
+        for i in range(reads):
+            if i and i % writes_every == 0:
+                book = Book.objects.get(pk=rng.choice(book_ids[:BOOKS_PER_PAGE * libraries]))  # type: ignore
+                book.title += '!'
+                book.save()
+            client.get(rng.choice(pages))
+        results['mixed'] = page_cache.stats.snapshot()
+        print(
+            f"\nmixed workload: {reads} reads, 1 edit per {writes_every}: "
+            f"hit rate {results['mixed']['hit_rate']:.1%}, "
+            f"hit {results['mixed']['hit_ms']} ms, miss {results['mixed']['miss_ms']} ms"
+        )
+    return results
+
+
+def benchmark_book_counts(books=1_000_000, authors=10_000, libraries=200, top=20):
+    """Largest authors and libraries by a COUNT over the books vs by the maintained book_count"""
+    print(f"\n=== BENCHMARK: book counts ({books} books) ===")
+    results = []
+    with rolled_back():
+        seed_books(books, authors=authors)
+        Library.objects.bulk_create([Library(name=f"Library {i}") for i in range(libraries)])  # type: ignore
+        Membership = Library.books.through
+        book_ids = list(Book.objects.values_list('id', flat=True))  # type: ignore
+        for offset, library_id in enumerate(Library.objects.values_list('id', flat=True)):  # type: ignore
+            Membership.objects.bulk_create(
+                [Membership(library_id=library_id, book_id=pk) for pk in book_ids[offset::libraries]],
+                batch_size=SEED_BATCH_SIZE,
+            )
+        Library.objects.recount_books()  # type: ignore
+
+        listings = (
+            ('authors', 'counted', lambda: Author.objects.annotate(total=Count('book')).order_by('-total')),  # type: ignore
+            ('authors', 'column', lambda: Author.objects.order_by('-book_count')),  # type: ignore
+            ('libraries', 'counted', lambda: Library.objects.annotate(total=Count('books')).order_by('-total')),  # type: ignore
+            ('libraries', 'column', lambda: Library.objects.order_by('-book_count')),  # type: ignore
+        )
+        print(f"{'listing':>10} {'source':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        for listing, source, queryset in listings:
+            timings = []
+            for _ in range(REQUESTS_PER_SAMPLE // 5):
+                start = time.perf_counter()
+                list(queryset()[:top])
+                timings.append((time.perf_counter() - start) * 1000)
+            percentiles = statistics.quantiles(timings, n=100)
+            stats = {'p50_ms': round(percentiles[49], 2), 'p99_ms': round(percentiles[98], 2)}
+            results.append({'listing': listing, 'source': source, **stats})
+            print(f"{listing:>10} {source:>8} {stats['p50_ms']:>8} {stats['p99_ms']:>8}")
+
+        # What the counters cost each write
+        author = Author.objects.first()  # type: ignore
+        library = Library.objects.first()  # type: ignore
+        start = time.perf_counter()
+        for i in range(REQUESTS_PER_SAMPLE):
+            library.books.add(Book.objects.create(title=f"Counted {i}", author=author))  # type: ignore
+        per_write = (time.perf_counter() - start) * 1000 / REQUESTS_PER_SAMPLE
+        print(f"\ncreate + add to library: {per_write:.2f} ms per book, counters included")
+        start = time.perf_counter()
+        fixed = Author.objects.recount_books() + Library.objects.recount_books()  # type: ignore
+        print(f"full recount: {(time.perf_counter() - start) * 1000:.0f} ms, {fixed} rows corrected")
+    return results
+
+
+# Local servers compared by benchmark_wsgi_vs_asgi, one process each so the
+# numbers compare request paths rather than core counts: (label, required
+# module, command, environment)
+LOCAL_SERVERS = (
+    ('wsgi gthread', 'gunicorn', [
+        '-m', 'gunicorn', 'LibraryProject.wsgi:application', '--workers', '1',
+        '--worker-class', 'gthread', '--threads', '32', '--backlog', '2048',
+    ], {'DJANGO_ASYNC_VIEWS': '0'}),
+    ('asgi sync views', 'uvicorn', ['manage.py', 'runasgi', '--workers', '1', '--sync-views'], {}),
+    ('asgi async views', 'uvicorn', ['manage.py', 'runasgi', '--workers', '1'], {}),
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def local_server(arguments, environment, port, timeout=30):
+    """Run a server process listening on `port` for the enclosed block"""
+    process = subprocess.Popen(
+        [sys.executable, *arguments],
+        cwd=settings.BASE_DIR,
+        env={**os.environ, **environment},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError(f"{' '.join(arguments)} did not start")
+                time.sleep(0.1)
+        yield
+    finally:
+        process.terminate()
+        process.wait(timeout)
+
+
+async def drive(port, path, cookie, connections, requests_per_connection):
+    """
+    Keep `connections` requests for `path` in flight, each on its own
+    connection, and return the latencies of the 200 responses in
+    milliseconds, the number of failures and the elapsed seconds.
+    """
+    request = (
+        f"GET {path} HTTP/1.1\r\nHost: localhost\r\nCookie: {cookie}\r\nConnection: close\r\n\r\n"
+    ).encode()
+    timings, failures = [], 0
+
+    async def connection():
+        nonlocal failures
+        for _ in range(requests_per_connection):
+            started = time.perf_counter()
+            try:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                writer.write(request)
+                response = await reader.read()
+                writer.close()
+            except OSError:
+                failures += 1
+                continue
+            if response.startswith(b'HTTP/1.1 200'):
+                timings.append((time.perf_counter() - started) * 1000)
+            else:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[connection() for _ in range(connections)])
+    return timings, failures, time.perf_counter() - started
+
+
+def benchmark_wsgi_vs_asgi(connections=500, requests_per_connection=2, books=5_000, libraries=20):
+    """
+    Throughput and tail latency of the catalog, library and member pages at
+    `connections` concurrent connections, served by gunicorn (WSGI) and by
+    uvicorn (ASGI) with the sync and the async views.
+    """
+    print(f"\n=== BENCHMARK: WSGI vs ASGI, {connections} concurrent connections ===")
+    # The servers are separate processes, so the data is committed and removed afterwards
+    seed_books(books, authors=100)
+    Library.objects.bulk_create([Library(name=f"Library {i}") for i in range(libraries)])  # type: ignore
+    Membership = Library.books.through
+    book_ids = list(Book.objects.values_list('id', flat=True))  # type: ignore
+    library_ids = list(Library.objects.values_list('id', flat=True))  # type: ignore
+    for offset, library_id in enumerate(library_ids):
+        Membership.objects.bulk_create(
+            [Membership(library_id=library_id, book_id=pk) for pk in book_ids[offset::libraries]],
+            batch_size=SEED_BATCH_SIZE,
+        )
+    Library.objects.recount_books()  # type: ignore
+    client = logged_in_client('benchmark-asgi', role='Member')
+    cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+    pages = {
+        'catalog': reverse('list_books'),
+        'library': reverse('library_detail', args=[library_ids[0]]),
+        'member': reverse('member_view'),
+    }
+
+    results = []
+    try:
+        print(f"{'server':>17} {'page':>8} {'req/s':>7} {'p50 ms':>8} {'p99 ms':>8} {'failed':>7}")
+        for label, module, arguments, environment in LOCAL_SERVERS:
+            if importlib.util.find_spec(module) is None:
+                print(f"{label:>17} skipped: pip install {module}")
+                continue
+            port = free_port()
+            if module == 'gunicorn':
+                arguments = [*arguments, '--bind', f'127.0.0.1:{port}']
+            else:
+                arguments = [*arguments, '--port', str(port)]
+            with local_server(arguments, environment, port):
+                for page, url in pages.items():
+                    # Warm the server and the page cache first
+                    async_to_sync(drive)(port, url, cookie, 10, 2)
+                    timings, failures, elapsed = async_to_sync(drive)(
+                        port, url, cookie, connections, requests_per_connection,
+                    )
+                    percentiles = statistics.quantiles(timings, n=100)
+                    stats = {
+                        'requests_per_sec': round(len(timings) / elapsed, 1),
+                        'p50_ms': round(percentiles[49], 1),
+                        'p99_ms': round(percentiles[98], 1),
+                        'failed': failures,
+                    }
+                    results.append({'server': label, 'page': page, **stats})
+                    print(
+                        f"{label:>17} {page:>8} {stats['requests_per_sec']:>7} "
+                        f"{stats['p50_ms']:>8} {stats['p99_ms']:>8} {failures:>7}"
+                    )
+    finally:
+        Membership.objects.filter(library_id__in=library_ids).delete()
+        Library.objects.filter(pk__in=library_ids).delete()  # type: ignore
+        Book.objects.filter(pk__in=book_ids).delete()  # type: ignore
+        Author.objects.filter(book__isnull=True).delete()  # type: ignore
+        User.objects.filter(username='benchmark-asgi').delete()
+    return results
+
+
+# label, pragmas, read aliases, transaction mode, CONN_MAX_AGE
+SQLITE_PROFILES = (
+    ('rollback journal', {'journal_mode': 'DELETE'}, [], None, 0),
+    ('WAL + split', settings.SQLITE_PRAGMAS, ['read'], 'IMMEDIATE', 600),
+)
+
+
+def sqlite_worker(profile, seconds, write_every, seed, results):
+    """
+    One process of benchmark_sqlite_concurrency: catalog page reads, with a
+    login (read then update last_login) or a registration every
+    `write_every` requests, until `seconds` have passed.
+    """
+    label, pragmas, aliases, transaction_mode, conn_max_age = profile
+    # Read when each connection opens
+    for alias in settings.DATABASES:
+        settings_dict = db_connections[alias].settings_dict
+        settings_dict['CONN_MAX_AGE'] = conn_max_age
+        settings_dict['OPTIONS'] = {**settings_dict['OPTIONS'], 'transaction_mode': transaction_mode}
+
+    rng = random.Random(seed)
+    user_ids = list(User.objects.filter(username__startswith='sqlite-bench-').values_list('id', flat=True))
+    top = Book.objects.order_by('-pk').values_list('pk', flat=True).first()  # type: ignore
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    timings = []
+    deadline = time.perf_counter() + seconds
+    with override_settings(SQLITE_PRAGMAS=pragmas, DATABASE_READ_ALIASES=aliases):
+        db_connections.close_all()
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                if rng.randrange(write_every):
+                    list(catalog_books(rng.randrange(top))[:BOOKS_PER_PAGE])
+                    counts['reads'] += 1
+                elif rng.randrange(2):
+                    with transaction.atomic():
+                        user = User.objects.get(pk=rng.choice(user_ids))
+                        user.last_login = timezone.now()
+                        user.save(update_fields=['last_login'])
+                    counts['writes'] += 1
+                else:
+                    User.objects.create(username=f"sqlite-bench-{os.getpid()}-{counts['writes']}")
+                    counts['writes'] += 1
+            except OperationalError:
+                counts['errors'] += 1
+            timings.append((time.perf_counter() - started) * 1000)
+            # What request_finished does: keep or close connections per CONN_MAX_AGE
+            close_old_connections()
+    results.put((counts, timings))
+
+
+def benchmark_sqlite_concurrency(workers=4, seconds=10, write_every=10, books=20_000, users=200):
+    """Throughput of `workers` processes sharing the SQLite file, before and after the tuning"""
+    print(f"\n=== BENCHMARK: SQLite, {workers} worker processes, 1 write in {write_every} requests ===")
+    seed_books(books, authors=100)
+    User.objects.bulk_create([User(username=f"sqlite-bench-{i}") for i in range(users)])
+    book_ids = list(Book.objects.values_list('id', flat=True))  # type: ignore
+    context = multiprocessing.get_context('fork')
+
+    results = []
+    try:
+        print(f"{'profile':>17} {'req/s':>7} {'reads/s':>8} {'writes/s':>9} {'p99 ms':>8} {'errors':>7}")
+        for profile in SQLITE_PROFILES:
+            # journal_mode is stored in the file, so switch it before the workers
+            # start; leaving WAL needs the only open connection
+            db_connections.close_all()
+            with connection.cursor() as cursor:
+                cursor.execute(f"PRAGMA journal_mode = {profile[1].get('journal_mode', 'DELETE')}")
+            # Forked processes must not share the parent's connections
+            db_connections.close_all()
+            queue = context.Queue()
+            processes = [
+                context.Process(target=sqlite_worker, args=(profile, seconds, write_every, seed, queue))
+                for seed in range(workers)
+            ]
+            for process in processes:
+                process.start()
+            outcomes = [queue.get() for _ in processes]
+            for process in processes:
+                process.join()
+
+            totals = {key: sum(counts[key] for counts, _ in outcomes) for key in ('reads', 'writes', 'errors')}
+            timings = [timing for _, worker_timings in outcomes for timing in worker_timings]
+            stats = {
+                'requests_per_sec': round(len(timings) / seconds),
+                'reads_per_sec': round(totals['reads'] / seconds),
+                'writes_per_sec': round(totals['writes'] / seconds),
+                'p99_ms': round(statistics.quantiles(timings, n=100)[98], 1),
+                'errors': totals['errors'],
+            }
+            results.append({'profile': profile[0], **stats})
+            print(
+                f"{profile[0]:>17} {stats['requests_per_sec']:>7} {stats['reads_per_sec']:>8} "
+                f"{stats['writes_per_sec']:>9} {stats['p99_ms']:>8} {stats['errors']:>7}"
+            )
+    finally:
+        Book.objects.filter(pk__in=book_ids).delete()  # type: ignore
+        Author.objects.filter(book__isnull=True).delete()  # type: ignore
+        User.objects.filter(username__startswith='sqlite-bench-').delete()
+    return results
+
+
+def replica_reader(seconds, seed):
+    """
+    Worker process of benchmark_replicas: read catalog pages for `seconds`
+    and print the reads served by each alias as JSON.
+    """
+    rng = random.Random(seed)
+    top = Book.objects.order_by('-pk').values_list('pk', flat=True).first()  # type: ignore
+    served = {}
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        books = catalog_books(rng.randrange(top))
+        # Run the page on the alias the router picks, to count it
+        alias = books.db
+        list(books.using(alias)[:BOOKS_PER_PAGE])
+        served[alias] = served.get(alias, 0) + 1
+        close_old_connections()
+    print(json.dumps(served))
+
+
+def benchmark_replicas(replica_counts=(0, 1, 2, 4), workers=4, seconds=10, books=20_000):
+    """Catalog read throughput of `workers` processes as replicas are added (SQLITE_REPLICAS)"""
+    print(f"\n=== BENCHMARK: catalog reads, {workers} worker processes, by replica count ===")
+    # The workers are separate processes, so the data is committed and removed afterwards
+    seed_books(books, authors=100)
+    book_ids = list(Book.objects.values_list('id', flat=True))  # type: ignore
+    db_connections.close_all()
+
+    results = []
+    try:
+        print(f"{'replicas':>9} {'reads/s':>8}  served by")
+        for count in replica_counts:
+            environment = {**os.environ, 'SQLITE_REPLICAS': str(count)}
+            if count:
+                subprocess.run(
+                    [sys.executable, 'manage.py', 'sync_replicas'],
+                    cwd=settings.BASE_DIR, env=environment, check=True,
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                )
+            processes = [
+                subprocess.Popen(
+                    [
+                        sys.executable, 'manage.py', 'shell', '-c',
+                        f"from relationship_app.benchmarks import replica_reader; replica_reader({seconds}, {seed})",
+                    ],
+                    cwd=settings.BASE_DIR, env=environment, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                )
+                for seed in range(workers)
+            ]
+            served = {}
+            for process in processes:
+                output, _ = process.communicate()
+                for alias, reads in json.loads(output.splitlines()[-1]).items():
+                    served[alias] = served.get(alias, 0) + reads
+            reads_per_sec = round(sum(served.values()) / seconds)
+            results.append({'replicas': count, 'reads_per_sec': reads_per_sec, 'served': served})
+            print(f"{count:>9} {reads_per_sec:>8}  {', '.join(f'{alias} {reads}' for alias, reads in sorted(served.items()))}")
+    finally:
+        Book.objects.filter(pk__in=book_ids).delete()  # type: ignore
+        Author.objects.filter(book__isnull=True).delete()  # type: ignore
+    return results
+
+
+# The loaders Django's app-directories setup reads templates with, without caching
+UNCACHED_TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+SESSION_CONFIGURATIONS = (
+    ('db', 'django.contrib.sessions.backends.db', 'django.contrib.auth.middleware.AuthenticationMiddleware'),
+    ('cached', 'relationship_app.sessions', 'relationship_app.sessions.CachedUserAuthenticationMiddleware'),
+)
+
+
+def benchmark_sessions(books=1000):
+    """Queries and latency per authenticated request with database sessions and with the cached engine and user"""
+    print("\n=== BENCHMARK: sessions and request.user ===")
+    print(f"{'sessions':>9} {'view':>16} {'queries':>8} {'p50 ms':>8} {'p99 ms':>8}")
+
+    results = []
+    for label, engine, auth_middleware in SESSION_CONFIGURATIONS:
+        middleware = [
+            auth_middleware if name == 'relationship_app.sessions.CachedUserAuthenticationMiddleware' else name
+            for name in settings.MIDDLEWARE
+        ]
+        # Measure the session and user lookups, not the fragment cache
+        with override_settings(SESSION_ENGINE=engine, MIDDLEWARE=middleware, PAGE_CACHE_TIMEOUT=0), rolled_back():
+            seed_books(books, authors=50)
+            library = Library.objects.create(name="Library")  # type: ignore
+            library.books.set(Book.objects.all()[:BOOKS_PER_PAGE])  # type: ignore
+            pages = (
+                ('list_books', 'Member', reverse('list_books')),
+                ('library_detail', 'Member', reverse('library_detail', args=[library.pk])),
+                ('member_view', 'Member', reverse('member_view')),
+                ('admin_view', 'Admin', reverse('admin_view')),
+            )
+            for view, role, url in pages:
+                # The client loads the middleware on its first request, under these settings
+                client = logged_in_client(f"benchmark-{view}", role=role)
+                client.get(url)
+                stats = measure(client, url)
+                results.append({'sessions': label, 'view': view, **stats})
+                print(f"{label:>9} {view:>16} {stats['queries']:>8} {stats['p50_ms']:>8} {stats['p99_ms']:>8}")
+    return results
+
+
+def templates_with_loaders(loaders):
+    """Return TEMPLATES with the template loaders replaced by `loaders`"""
+    templates = copy.deepcopy(settings.TEMPLATES)
+    templates[0]['APP_DIRS'] = False
+    templates[0]['OPTIONS']['loaders'] = loaders
+    return templates
+
+
+def benchmark_templates(books=200, libraries=10):
+    """Latency and response size of every relationship_app page, with and without the cached loader"""
+    print("\n=== BENCHMARK: template rendering ===")
+    results = []
+    with rolled_back():
+        seed_books(books, authors=50)
+        Library.objects.bulk_create([Library(name=f"Library {i}") for i in range(libraries)])  # type: ignore
+        library = Library.objects.first()  # type: ignore
+        library.books.set(Book.objects.all()[:BOOKS_PER_PAGE])  # type: ignore
+
+        anonymous = Client(SERVER_NAME='localhost')
+        roles = {role: logged_in_client(f"benchmark-{role}", role=role) for role in ('Admin', 'Librarian', 'Member')}
+        # logout is left out: LOGOUT_REDIRECT_URL answers it with a redirect
+        pages = (
+            ('list_books', roles['Member'], reverse('list_books')),
+            ('library_detail', roles['Member'], reverse('library_detail', args=[library.pk])),
+            ('login', anonymous, reverse('login')),
+            ('register', anonymous, reverse('register')),
+            ('admin_view', roles['Admin'], reverse('admin_view')),
+            ('librarian_view', roles['Librarian'], reverse('librarian_view')),
+            ('member_view', roles['Member'], reverse('member_view')),
+        )
+        loaders = (
+            ('uncached', UNCACHED_TEMPLATE_LOADERS),
+            ('cached', [('django.template.loaders.cached.Loader', UNCACHED_TEMPLATE_LOADERS)]),
+        )
+
+        print(f"{'view':>16} {'loader':>9} {'queries':>8} {'p50 ms':>8} {'p99 ms':>8} {'bytes':>7}")
+        for view, client, url in pages:
+            for label, template_loaders in loaders:
+                # Measure rendering, not the fragment cache
+                with override_settings(TEMPLATES=templates_with_loaders(template_loaders), PAGE_CACHE_TIMEOUT=0):
+                    size = len(client.get(url).content)
+                    stats = measure(client, url)
+                results.append({'view': view, 'loader': label, 'bytes': size, **stats})
+                print(
+                    f"{view:>16} {label:>9} {stats['queries']:>8} "
+                    f"{stats['p50_ms']:>8} {stats['p99_ms']:>8} {size:>7}"
+                )
+
+    stylesheet = os.path.getsize(finders.find('relationship_app/css/app.css'))
+    print(f"\nshared stylesheet: {stylesheet} bytes, fetched once per client")
+    for loader in engines['django'].engine.template_loaders:
+        loader.reset()
+    compiled, failed, seconds = warm_templates()
+    print(f"warm-up: {len(compiled)} templates compiled in {seconds * 1000:.1f} ms")
+    return results
+
+
+def seed_shelf_books(total):
+    """Bulk insert `total` bookshelf books"""
+    for start in range(0, total, SEED_BATCH_SIZE):
+        ShelfBook.objects.bulk_create([  # type: ignore
+            ShelfBook(title=f"Book {i}", author=f"Author {i % 500}", publication_year=1900 + i % 120)
+            for i in range(start, min(start + SEED_BATCH_SIZE, total))
+        ])
+
+
+def benchmark_export(sizes=(10_000, 100_000, 1_000_000)):
+    """Stream the bookshelf catalog as CSV, JSONL and gzipped CSV; memory should not grow with rows"""
+    print("\n=== BENCHMARK: streaming exports ===")
+    print(f"{'rows':>10} {'format':>9} {'queries':>8} {'MB out':>8} {'rows/s':>9} {'peak MB':>8}")
+    results = []
+    for size in sizes:
+        with rolled_back():
+            seed_shelf_books(size)
+            for label, fmt, compress in (('csv', 'csv', False), ('jsonl', 'jsonl', False), ('csv.gz', 'csv', True)):
+                def stream():
+                    export = CatalogExport('shelf_books', fmt)
+                    written = 0
+                    for block in compress_sequence(export) if compress else export:
+                        written += len(block)
+                    return export, written
+
+                started = time.perf_counter()
+                with CaptureQueriesContext(connection) as queries:
+                    export, written = stream()
+                elapsed = time.perf_counter() - started
+                # Traced separately: tracemalloc slows allocation-heavy encoding severalfold
+                tracemalloc.start()
+                stream()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                result = {
+                    'rows': export.rows,
+                    'format': label,
+                    'queries': len(queries),
+                    'mb_out': round(written / 2 ** 20, 1),
+                    'rows_per_s': round(export.rows / elapsed),
+                    'peak_mb': round(peak / 2 ** 20, 1),
+                }
+                results.append(result)
+                print(
+                    f"{result['rows']:>10} {label:>9} {result['queries']:>8} {result['mb_out']:>8} "
+                    f"{result['rows_per_s']:>9} {result['peak_mb']:>8}"
+                )
+    return results
+
+
+def run_all_benchmarks():
+    """Run all benchmarks"""
+    print("relationship_app benchmarks")
+    print("=" * 50)
+
+    benchmark_list_books()
+    benchmark_page_cache()
+    benchmark_role_views()
+    benchmark_role_dashboards()
+    benchmark_book_counts()
+    benchmark_export()
+    benchmark_templates()
+    benchmark_login()
+    benchmark_login_offload()
+    benchmark_wsgi_vs_asgi()
+    benchmark_sqlite_concurrency()
+    benchmark_replicas()
+    benchmark_sessions()
+    benchmark_admin_counts()
+    benchmark_admin_dashboard()
+    benchmark_profile_photo_thumbnails()
+    benchmark_profile_photo_uploads()
+    benchmark_profile_photo_storage()
+    benchmark_media_serving()
+
+    print("\n" + "=" * 50)
+    print("All benchmarks completed!")
+
+# Run all benchmarks when script is executed
+if __name__ == "__main__":
+    run_all_benchmarks()
@@ -0,0 +1,94 @@
+# relationship_app/catalog_loader.py
+"""
+Batched catalog ingestion for relationship_app.
+
+Rows are dicts with a `title`, an `author` name and an optional list of
+`libraries` the book belongs to. Each chunk of rows is written with a handful
+of bulk INSERTs (authors, libraries, books, library memberships) and two
+book count UPDATEs inside its own transaction, so a failed load can resume
+after the last committed chunk. A CatalogLoadCheckpoint passed to load() is
+advanced in that same transaction.
+"""
+
+from collections import Counter
+from itertools import islice
+
+from django.db import transaction
+
+from .dashboard import invalidate_dashboard
+from .models import Author, Book, Library
+from .page_cache import invalidate_libraries
+
+# Rows written per transaction unless the caller asks otherwise
+DEFAULT_BATCH_SIZE = 5000
+
+
+class CatalogLoader:
+    """
+    Load books, authors and library memberships in chunks.
+
+    Authors and libraries are de-duplicated by name through in-memory
+    name -> id maps that are seeded from the database, so re-running a load
+    against a populated catalog does not create duplicates.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.author_ids = dict(Author.objects.values_list('name', 'id'))  # type: ignore
+        self.library_ids = dict(Library.objects.values_list('name', 'id'))  # type: ignore
+
+    def load(self, rows, checkpoint=None):
+        """
+        Write `rows` chunk by chunk, yielding the number of rows committed
+        after each chunk and recording them on `checkpoint` when given.
+        """
+        rows = iter(rows)
+        while chunk := list(islice(rows, self.batch_size)):
+            with transaction.atomic():
+                self._write_chunk(chunk)
+                if checkpoint is not None:
+                    checkpoint.advance(len(chunk))
+            yield len(chunk)
+
+    def create_libraries(self, names):
+        """Create the libraries in `names` that do not exist yet, holding no books"""
+        with transaction.atomic():
+            self._create_missing(Library, self.library_ids, set(names))
+        invalidate_dashboard()
+
+    def _write_chunk(self, chunk):
+        self._create_missing(Author, self.author_ids, {row['author'] for row in chunk})
+        self._create_missing(
+            Library, self.library_ids,
+            {name for row in chunk for name in row.get('libraries', ())},
+        )
+
+        books = Book.objects.bulk_create(  # type: ignore
+            [Book(title=row['title'], author_id=self.author_ids[row['author']]) for row in chunk]
+        )
+
+        Membership = Library.books.through
+        memberships = Membership.objects.bulk_create(
+            [
+                Membership(library_id=self.library_ids[name], book_id=book.pk)
+                for book, row in zip(books, chunk)
+                for name in set(row.get('libraries', ()))
+            ],
+            batch_size=self.batch_size,
+        )
+
+        # bulk_create sends no signals, so the book counts are adjusted and the
+        # cached pages and dashboard statistics retired here
+        Author.objects.adjust_book_counts(Counter(book.author_id for book in books))  # type: ignore
+        Library.objects.adjust_book_counts(Counter(membership.library_id for membership in memberships))  # type: ignore
+        invalidate_libraries(
+            {self.library_ids[name] for row in chunk for name in row.get('libraries', ())}, catalog=True,
+        )
+        invalidate_dashboard()
+
+    def _create_missing(self, model, ids_by_name, names):
+        """Bulk insert the `names` not yet in `ids_by_name` and record their ids"""
+        missing = sorted(names - ids_by_name.keys())
+        if missing:
+            created = model.objects.bulk_create([model(name=name) for name in missing])
+            ids_by_name.update((obj.name, obj.pk) for obj in created)
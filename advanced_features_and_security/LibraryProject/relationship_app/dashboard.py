@@ -0,0 +1,111 @@
+# relationship_app/dashboard.py
+"""
+Statistics for the admin dashboard.
+
+The totals and the role breakdown are read in one query: a UNION ALL of
+grouped counts, one (kind, label, count) row per statistic. The
+DASHBOARD_TOP_LIBRARIES largest libraries (by the maintained
+Library.book_count) are read in a second query, from the index on
+(-book_count, name); SQLite does not allow ORDER BY or LIMIT inside a
+compound query's members. The result is kept in the fragment cache under the
+'dashboard' scope (see page_cache), which the receivers in models.py bump
+whenever users, profiles, books, libraries or library memberships change, so
+the dashboard costs the same with ten users or libraries or a million.
+"""
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Count, F, Value
+
+from . import page_cache
+
+DASHBOARD_SCOPE = 'dashboard'
+DEFAULT_DASHBOARD_CACHE_TIMEOUT = 300
+DEFAULT_DASHBOARD_TOP_LIBRARIES = 10
+
+
+def dashboard_cache_timeout():
+    return getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', DEFAULT_DASHBOARD_CACHE_TIMEOUT)
+
+
+def invalidate_dashboard():
+    page_cache.invalidate([DASHBOARD_SCOPE])
+
+
+def counted(queryset, kind, label, count):
+    """
+    Return `queryset` as (kind, label, count) rows, grouped by `label` unless
+    it is a constant, in which case it is a single row.
+    """
+    return (
+        queryset.order_by()
+        .annotate(kind=Value(kind), label=label)
+        .values('kind', 'label')
+        .annotate(count=count)
+        .values_list('kind', 'label', 'count')
+    )
+
+
+def stats_rows():
+    """Return the query the dashboard totals and role counts are read from"""
+    # Imported here: models.py imports this module for its receivers
+    from .models import Book, Library, UserProfile
+
+    return counted(User.objects.all(), 'total', Value('users'), Count('pk')).union(
+        counted(Book.objects.all(), 'total', Value('books'), Count('pk')),  # type: ignore
+        counted(Library.objects.all(), 'total', Value('libraries'), Count('pk')),  # type: ignore
+        counted(UserProfile.objects.all(), 'role', F('role'), Count('pk')),  # type: ignore
+        all=True,
+    )
+
+
+def top_libraries():
+    """Return the query of the DASHBOARD_TOP_LIBRARIES libraries holding the most books"""
+    from .models import Library
+
+    top = getattr(settings, 'DASHBOARD_TOP_LIBRARIES', DEFAULT_DASHBOARD_TOP_LIBRARIES)
+    return Library.objects.order_by('-book_count', 'name').values_list('pk', 'name', 'book_count')[:top]  # type: ignore
+
+
+def shape_stats(rows, libraries):
+    """Shape the rows of stats_rows() and top_libraries() for the dashboard"""
+    from .models import UserProfile
+
+    stats = {
+        'totals': {},
+        'roles': {role: 0 for role, _ in UserProfile.ROLE_CHOICES},
+        'libraries': [{'id': pk, 'name': name, 'books': count} for pk, name, count in libraries],
+    }
+    for kind, label, count in rows:
+        if kind == 'total':
+            stats['totals'][label] = count
+        else:
+            stats['roles'][label] = count
+    return stats
+
+
+def compute_stats():
+    """Run the statistics queries and shape their rows for the dashboard"""
+    return shape_stats(stats_rows(), top_libraries())
+
+
+def dashboard_stats():
+    """Return the dashboard statistics, from the cache while no write has retired them"""
+    cache = page_cache.fragment_cache()
+    key = f"dashboard:stats:{page_cache.cache_version([DASHBOARD_SCOPE])}"
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_stats()
+        cache.set(key, stats, dashboard_cache_timeout())
+    return stats
+
+
+async def adashboard_stats():
+    """Async dashboard_stats, reading the statistics queries with the async ORM on a miss"""
+    cache = page_cache.fragment_cache()
+    key = f"dashboard:stats:{await page_cache.acache_version([DASHBOARD_SCOPE])}"
+    stats = await cache.aget(key)
+    if stats is None:
+        stats = shape_stats([row async for row in stats_rows()], [row async for row in top_libraries()])
+        await cache.aset(key, stats, dashboard_cache_timeout())
+    return stats
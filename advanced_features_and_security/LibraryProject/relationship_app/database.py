@@ -0,0 +1,173 @@
+# relationship_app/database.py
+"""
+SQLite tuning and the read/write split.
+
+configure_sqlite runs on every new SQLite connection (connection_created)
+and applies SQLITE_PRAGMAS:
+
+- journal_mode=WAL, so readers never block the writer or each other;
+- synchronous=NORMAL, which is durable against crashes under WAL and
+  fsyncs at checkpoints rather than on every commit;
+- busy_timeout, so a writer waits for the lock instead of failing with
+  "database is locked";
+- a larger page cache and a memory map, so hot pages are read without a
+  system call.
+
+Connections to the aliases in DATABASE_READ_ALIASES and DATABASE_REPLICAS
+are also made query_only, so a write routed there by mistake fails loudly.
+
+ReadWriteRouter sends every write to 'default'. Reads go to one of the
+DATABASE_READ_ALIASES, further connections to the primary's own file, except
+for the catalog (DATABASE_REPLICATED_MODELS), which is read from one of the
+DATABASE_REPLICAS: copies that may lag behind the primary, like the ones
+`manage.py sync_replicas` keeps. Inside a transaction on 'default' reads stay
+on 'default': its uncommitted writes are only visible on its own connection.
+
+After writing to the catalog, a context is pinned to the primary for
+REPLICA_PIN_SECONDS, which should exceed the replicas' lag, so it reads its
+own writes. PrimaryPinMiddleware carries the pin from request to request in
+a cookie. Other clients may read the previous rows until the replicas catch
+up, and a page rendered from them stays in the fragment cache until its
+scope is next bumped.
+"""
+
+import contextvars
+import math
+import random
+import sqlite3
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.deprecation import MiddlewareMixin
+
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # milliseconds
+    'cache_size': -64000,  # negative: KiB
+    'mmap_size': 256 * 2 ** 20,
+    'temp_store': 'MEMORY',
+}
+
+
+DEFAULT_REPLICATED_MODELS = (
+    'relationship_app.author',
+    'relationship_app.book',
+    'relationship_app.library',
+    'relationship_app.library_books',
+    'relationship_app.librarian',
+)
+DEFAULT_REPLICA_PIN_SECONDS = 5
+PIN_COOKIE = 'primary_pin'
+
+# Pages copied per backup step; readers and writers get the lock between steps
+BACKUP_PAGES_PER_STEP = 1024
+
+# Time until which reads in this context go to the primary
+_pinned_until = contextvars.ContextVar('pinned_until', default=0.0)
+
+
+def configured(setting):
+    """Return the aliases listed in `setting` that exist in DATABASES"""
+    return [alias for alias in getattr(settings, setting, ()) if alias in settings.DATABASES]
+
+
+def read_aliases():
+    return configured('DATABASE_READ_ALIASES')
+
+
+def replicas():
+    return configured('DATABASE_REPLICAS')
+
+
+def replicated(model):
+    """Whether reads of `model` may be served by a replica"""
+    return model._meta.label_lower in getattr(settings, 'DATABASE_REPLICATED_MODELS', DEFAULT_REPLICATED_MODELS)
+
+
+def pin_to_primary():
+    """Read the catalog from the primary for the next REPLICA_PIN_SECONDS"""
+    _pinned_until.set(time.time() + getattr(settings, 'REPLICA_PIN_SECONDS', DEFAULT_REPLICA_PIN_SECONDS))
+
+
+def pinned():
+    return time.time() < _pinned_until.get()
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """connection_created receiver applying SQLITE_PRAGMAS to new SQLite connections"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(getattr(settings, 'SQLITE_PRAGMAS', DEFAULT_SQLITE_PRAGMAS))
+    # After journal_mode, since switching to WAL writes to the file
+    if connection.alias in read_aliases() or connection.alias in replicas():
+        pragmas['query_only'] = 'ON'
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def copy_sqlite(source, targets):
+    """
+    Copy the SQLite database at `source` over each of `targets` with the
+    online backup API. Connections open on a target keep working and see
+    the new contents once the copy is done.
+    """
+    source_connection = sqlite3.connect(source)
+    try:
+        for target in targets:
+            target_connection = sqlite3.connect(target)
+            try:
+                source_connection.backup(target_connection, pages=BACKUP_PAGES_PER_STEP)
+            finally:
+                target_connection.close()
+    finally:
+        source_connection.close()
+
+
+class ReadWriteRouter:
+    """Route catalog reads to DATABASE_REPLICAS, other reads to DATABASE_READ_ALIASES, and writes to 'default'"""
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        aliases = replicas() if replicated(model) and not pinned() else []
+        aliases = aliases or read_aliases()
+        return random.choice(aliases) if aliases else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if replicated(model) and replicas():
+            pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class PrimaryPinMiddleware(MiddlewareMixin):
+    """Keep a client pinned to the primary across requests after it writes to the catalog"""
+
+    def process_request(self, request):
+        try:
+            request.pinned_until = float(request.COOKIES.get(PIN_COOKIE, 0))
+        except ValueError:
+            request.pinned_until = 0.0
+        # Also clears what an earlier request left on this thread
+        _pinned_until.set(request.pinned_until)
+
+    def process_response(self, request, response):
+        until = _pinned_until.get()
+        remaining = until - time.time()
+        if until > getattr(request, 'pinned_until', 0.0) and remaining > 0:
+            response.set_cookie(
+                PIN_COOKIE, f'{until:.3f}', max_age=math.ceil(remaining), httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,189 @@
+# relationship_app/exports.py
+"""
+Streaming CSV and JSON Lines export of the catalog.
+
+Every dataset is read in primary key order, one keyset window of
+`chunk_size` rows at a time (`pk > last`, iterated with
+QuerySet.iterator(), so nothing is cached), and each window is encoded and
+handed on before the next is read. Memory stays flat however many rows are
+exported, and no query or transaction stays open between windows.
+
+Every row starts with its primary key, so an interrupted export resumes
+with ?after=<last id received> (or --after); ?until=<id> ends it early, so
+a table can be split into ranges exported in parallel. Clients sending
+Accept-Encoding: gzip get the stream compressed on the fly.
+
+Under ASGI the response is fed by the async iterator, which reads each
+window in a thread; Django reads a sync one to the end before sending
+anything.
+"""
+
+import csv
+import json
+import logging
+import re
+import time
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import user_passes_test
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+from django.views.decorators.http import require_safe
+
+from bookshelf.models import Book as ShelfBook
+
+from .models import Author, Book, Library
+from .views import is_admin, parse_cursor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 5000
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/jsonl; charset=utf-8',
+}
+
+ACCEPTS_GZIP_RE = re.compile(r'\bgzip\b')
+
+# json.dumps() with non-default options builds a new encoder for every row
+encode_json = json.JSONEncoder(ensure_ascii=False).encode
+
+
+# Exported datasets: name -> (model, fields), every field list starting with the pk
+DATASETS = {
+    'books': (Book, ('id', 'title', 'author_id', 'author__name')),
+    'authors': (Author, ('id', 'name', 'book_count')),
+    'libraries': (Library, ('id', 'name', 'book_count')),
+    'memberships': (Library.books.through, ('id', 'library_id', 'book_id')),
+    'shelf_books': (ShelfBook, ('id', 'title', 'author', 'publication_year')),
+}
+
+
+def column_name(field):
+    """Name a field in the CSV header and JSON keys; a joined `author__name` is `author`"""
+    return field[:-len('__name')] if field.endswith('__name') else field
+
+
+class Echo:
+    """File-like object whose write() returns what it was given, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+class CatalogExport:
+    """
+    The rows of one dataset between two primary keys, encoded as CSV or
+    JSONL. Iterating yields bytes, one block per keyset window; `rows` and
+    `last_pk` tell how far the export got.
+    """
+
+    def __init__(self, dataset, fmt='csv', after=None, until=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        if dataset not in DATASETS:
+            raise KeyError(dataset)
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}, not {fmt!r}")
+        self.model, self.fields = DATASETS[dataset]
+        self.columns = [column_name(field) for field in self.fields]
+        self.dataset = dataset
+        self.fmt = fmt
+        self.after = after
+        self.until = until
+        self.chunk_size = chunk_size
+        self.rows = 0
+        self.last_pk = after
+
+    def fetch(self):
+        """Read the next `chunk_size` rows after `last_pk`, as value tuples"""
+        rows = self.model._default_manager.order_by('pk').values_list(*self.fields)
+        if self.last_pk is not None:
+            rows = rows.filter(pk__gt=self.last_pk)
+        if self.until is not None:
+            rows = rows.filter(pk__lte=self.until)
+        return list(rows[:self.chunk_size].iterator(chunk_size=self.chunk_size))
+
+    def header(self):
+        # Resumed exports continue the same file, so only the first range has a header
+        if self.fmt == 'csv' and self.after is None:
+            return csv.writer(Echo()).writerow(self.columns).encode()
+        return b''
+
+    def encode(self, chunk):
+        """Encode a window of rows and move the export past it"""
+        self.rows += len(chunk)
+        self.last_pk = chunk[-1][0]
+        if self.fmt == 'csv':
+            writer = csv.writer(Echo())
+            return ''.join(writer.writerow(row) for row in chunk).encode()
+        return ''.join(
+            encode_json(dict(zip(self.columns, row))) + '\n' for row in chunk
+        ).encode()
+
+    def log(self, started):
+        elapsed = time.perf_counter() - started
+        logger.info(
+            "Exported %d %s rows up to pk %s in %.1fs (%.0f rows/s)",
+            self.rows, self.dataset, self.last_pk, elapsed, self.rows / elapsed if elapsed else 0,
+        )
+
+    def __iter__(self):
+        started = time.perf_counter()
+        yield self.header()
+        while True:
+            chunk = self.fetch()
+            if chunk:
+                yield self.encode(chunk)
+            if len(chunk) < self.chunk_size:
+                break
+        self.log(started)
+
+    async def __aiter__(self):
+        started = time.perf_counter()
+        yield self.header()
+        while True:
+            # values_list().aiterator() would run its query on the event loop
+            chunk = await sync_to_async(self.fetch)()
+            if chunk:
+                yield self.encode(chunk)
+            if len(chunk) < self.chunk_size:
+                break
+        self.log(started)
+
+
+async def acompress_sequence(sequence):
+    """Async django.utils.text.compress_sequence"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for item in sequence:
+        data = compressor.compress(item)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@require_safe
+@user_passes_test(is_admin)
+def export_catalog(request, dataset, fmt):
+    """Stream a dataset as CSV or JSONL, gzipped when the client accepts it"""
+    if dataset not in DATASETS or fmt not in FORMATS:
+        raise Http404("Unknown export")
+    try:
+        after, until = parse_cursor(request), parse_cursor(request, 'until')
+    except ValueError:
+        return HttpResponseBadRequest("Invalid 'after' or 'until'")
+
+    content = CatalogExport(dataset, fmt, after, until)
+    gzipped = bool(ACCEPTS_GZIP_RE.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+    # Under ASGI a sync iterator would be read whole before the first byte is sent
+    if isinstance(request, ASGIRequest):
+        content = acompress_sequence(content) if gzipped else aiter(content)
+    elif gzipped:
+        content = compress_sequence(content)
+    response = StreamingHttpResponse(content, content_type=FORMATS[fmt])
+    if gzipped:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+    return response
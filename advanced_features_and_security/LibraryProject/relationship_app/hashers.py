@@ -0,0 +1,93 @@
+# relationship_app/hashers.py
+"""
+Password hashing policy and off-thread hashing for logins.
+
+PASSWORD_HASHERS lists TunedScryptPasswordHasher or TunedArgon2PasswordHasher
+first, whose cost parameters come from settings instead of being fixed by the
+Django release. Any stored hash made by another listed hasher, or with other
+parameters, is replaced with the preferred one the next time its owner logs
+in (check_password rehashes it), so legacy PBKDF2 hashes migrate without a
+reset.
+
+scrypt ships with Python's hashlib. Argon2 needs the optional argon2-cffi
+package and is only loaded when a hash is made or checked with it.
+
+Hashing is CPU bound. Under ASGI, sync views run on one shared thread, so a
+login in progress holds up every other sync view. With
+PASSWORD_HASHING_OFFLOAD on, the views wrapped by offload_hashing run in a
+bounded pool of PASSWORD_HASHING_WORKERS threads instead, so a burst of
+logins queues in the pool rather than behind the event loop.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, ScryptPasswordHasher
+from django.db import close_old_connections
+
+DEFAULT_SCRYPT_WORK_FACTOR = 2 ** 14
+DEFAULT_SCRYPT_BLOCK_SIZE = 8
+DEFAULT_SCRYPT_PARALLELISM = 1
+DEFAULT_ARGON2_TIME_COST = 2
+DEFAULT_ARGON2_MEMORY_COST = 19456  # KiB
+DEFAULT_ARGON2_PARALLELISM = 1
+DEFAULT_HASHING_WORKERS = 4
+
+_executor = None
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    """scrypt with PASSWORD_SCRYPT_WORK_FACTOR, _BLOCK_SIZE and _PARALLELISM"""
+
+    def __init__(self):
+        self.work_factor = getattr(settings, 'PASSWORD_SCRYPT_WORK_FACTOR', DEFAULT_SCRYPT_WORK_FACTOR)
+        self.block_size = getattr(settings, 'PASSWORD_SCRYPT_BLOCK_SIZE', DEFAULT_SCRYPT_BLOCK_SIZE)
+        self.parallelism = getattr(settings, 'PASSWORD_SCRYPT_PARALLELISM', DEFAULT_SCRYPT_PARALLELISM)
+        # scrypt needs 128 * N * r bytes; hashlib refuses more than 32 MiB unless told
+        self.maxmem = 2 * 128 * self.work_factor * self.block_size
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """Argon2id with PASSWORD_ARGON2_TIME_COST, _MEMORY_COST (KiB) and _PARALLELISM"""
+
+    def __init__(self):
+        self.time_cost = getattr(settings, 'PASSWORD_ARGON2_TIME_COST', DEFAULT_ARGON2_TIME_COST)
+        self.memory_cost = getattr(settings, 'PASSWORD_ARGON2_MEMORY_COST', DEFAULT_ARGON2_MEMORY_COST)
+        self.parallelism = getattr(settings, 'PASSWORD_ARGON2_PARALLELISM', DEFAULT_ARGON2_PARALLELISM)
+
+
+def get_executor():
+    """Return the shared hashing pool, creating it on first use"""
+    global _executor
+    if _executor is None:
+        workers = getattr(settings, 'PASSWORD_HASHING_WORKERS', DEFAULT_HASHING_WORKERS)
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+    return _executor
+
+
+def _run(view, request, *args, **kwargs):
+    # Pool threads keep their own connections; retire them as a request cycle would
+    close_old_connections()
+    try:
+        return view(request, *args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def offload_hashing(view):
+    """
+    Return `view`, or with PASSWORD_HASHING_OFFLOAD on, an async view running
+    it in the hashing pool. Only worth enabling when served over ASGI: under
+    WSGI every request already has a thread of its own.
+    """
+    if not getattr(settings, 'PASSWORD_HASHING_OFFLOAD', False):
+        return view
+
+    @functools.wraps(view)
+    async def offloaded(request, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_executor(), functools.partial(_run, view, request, *args, **kwargs))
+
+    return offloaded
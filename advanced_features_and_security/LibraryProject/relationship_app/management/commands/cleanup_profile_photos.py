@@ -0,0 +1,70 @@
+# relationship_app/management/commands/cleanup_profile_photos.py
+import posixpath
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from relationship_app.models import CustomUser
+from relationship_app.thumbnails import delete_thumbnails
+
+# Files younger than this may belong to an upload whose row is not committed yet
+DEFAULT_GRACE_SECONDS = 3600
+
+
+def walk_photos(storage, directory):
+    """Yield the name of every stored photo under `directory`, skipping thumbnails"""
+    directories, files = storage.listdir(directory)
+    for filename in files:
+        yield posixpath.join(directory, filename)
+    for subdirectory in directories:
+        if subdirectory != 'thumbs':
+            yield from walk_photos(storage, posixpath.join(directory, subdirectory))
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete stored profile photos (and their thumbnails) that no user references. "
+        "Photos are released as users are deleted or change photos; this sweeps up "
+        "files left behind by queryset.update(), raw SQL or interrupted uploads."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=DEFAULT_GRACE_SECONDS,
+            help=f"Keep files modified within this many seconds (default: {DEFAULT_GRACE_SECONDS})",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Only report what would be deleted",
+        )
+
+    def handle(self, *args, **options):
+        field = CustomUser._meta.get_field('profile_photo')
+        storage = field.storage
+        directory = field.upload_to.rstrip('/')
+        if not storage.exists(directory):
+            self.stdout.write("No profile photos stored")
+            return
+
+        referenced = set(
+            CustomUser.objects.exclude(profile_photo='').exclude(profile_photo__isnull=True)  # type: ignore
+            .values_list('profile_photo', flat=True).distinct()
+        )
+        cutoff = timezone.now() - timedelta(seconds=options['grace'])
+
+        kept = removed = freed = 0
+        for name in walk_photos(storage, directory):
+            if name in referenced or storage.get_modified_time(name) > cutoff:
+                kept += 1
+                continue
+            removed += 1
+            freed += storage.size(name)
+            if not options['dry_run']:
+                delete_thumbnails(storage, name)
+                storage.delete(name)
+
+        action = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{action} {removed} orphaned photos ({freed / 1024 / 1024:.1f} MB); kept {kept}"
+        ))
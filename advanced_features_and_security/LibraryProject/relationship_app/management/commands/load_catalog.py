@@ -0,0 +1,96 @@
+# relationship_app/management/commands/load_catalog.py
+import csv
+import json
+import resource
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from relationship_app.catalog_loader import DEFAULT_BATCH_SIZE, CatalogLoader
+from relationship_app.models import CatalogLoadCheckpoint
+
+# Separator between library names in the CSV `libraries` column
+LIBRARY_SEPARATOR = '|'
+
+
+def read_csv(path):
+    """Yield catalog rows from a CSV file with title, author and libraries columns"""
+    with open(path, newline='', encoding='utf-8') as handle:
+        for record in csv.DictReader(handle):
+            libraries = record.get('libraries') or ''
+            yield {
+                'title': record['title'],
+                'author': record['author'],
+                'libraries': [name for name in libraries.split(LIBRARY_SEPARATOR) if name],
+            }
+
+
+def read_jsonl(path):
+    """Yield catalog rows from a JSON Lines file, one book object per line"""
+    with open(path, encoding='utf-8') as handle:
+        for line in handle:
+            if line.strip():
+                yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk load books, authors and library memberships from a CSV or JSONL file. "
+        "Progress is checkpointed in the database with every committed chunk so an "
+        "interrupted load can be resumed by running the same command again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSONL catalog file")
+        parser.add_argument(
+            '--format', choices=('csv', 'jsonl'),
+            help="Input format (default: guessed from the file extension)",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help=f"Rows per transaction (default: {DEFAULT_BATCH_SIZE})",
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help="Name the committed rows are recorded under (default: the file's absolute path)",
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help="Ignore any existing checkpoint and load from the first row",
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f"{path} does not exist")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        fmt = options['format'] or ('csv' if path.suffix.lower() == '.csv' else 'jsonl')
+        rows = read_csv(path) if fmt == 'csv' else read_jsonl(path)
+
+        source = options['checkpoint'] or str(path.resolve())
+        checkpoint, _ = CatalogLoadCheckpoint.objects.get_or_create(source=source)  # type: ignore
+        if options['restart'] and checkpoint.rows:
+            checkpoint.advance(-checkpoint.rows)
+        committed = checkpoint.rows
+        if committed:
+            self.stdout.write(f"Resuming after {committed} committed rows")
+            rows = islice(rows, committed, None)
+
+        loader = CatalogLoader(batch_size=options['batch_size'])
+        started = time.perf_counter()
+        loaded = 0
+        for count in loader.load(rows, checkpoint):
+            loaded += count
+            self.stdout.write(f"  {committed + loaded} rows committed", ending='\r')
+
+        elapsed = time.perf_counter() - started
+        peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {loaded} rows in {elapsed:.1f}s "
+            f"({loaded / elapsed if elapsed else 0:.0f} rows/s, peak RSS {peak_rss_mb:.0f} MB)"
+        ))
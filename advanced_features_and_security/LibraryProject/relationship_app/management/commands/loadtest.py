@@ -0,0 +1,92 @@
+# relationship_app/management/commands/loadtest.py
+import json
+import platform
+import subprocess
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.urls import reverse
+
+from relationship_app.benchmarks import REQUESTS_PER_SAMPLE, logged_in_client, measure, rolled_back
+from relationship_app.models import Author, Book, Library, Librarian, UserProfile
+
+
+def current_commit():
+    """Return the checked out git commit, or None outside a git checkout"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the relationship_app endpoints through the Django test client against "
+        "the current database and write throughput, latency percentiles and SQL "
+        "query counts per endpoint as a JSON report. Users created for the run "
+        "are rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=REQUESTS_PER_SAMPLE,
+            help=f"Timed requests per endpoint (default: {REQUESTS_PER_SAMPLE})",
+        )
+        parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+
+    def handle(self, *args, **options):
+        requests = options['requests']
+        endpoints = {}
+
+        with rolled_back():
+            first_book = Book.objects.order_by('pk').values_list('pk', flat=True).first()  # type: ignore
+            book_count = Book.objects.count()  # type: ignore
+            largest_library = (
+                Library.objects.annotate(size=Count('books'))  # type: ignore
+                .order_by('-size').values_list('pk', flat=True).first()
+            )
+
+            reader = logged_in_client(username='loadtest-reader')
+            endpoints['books'] = measure(reader, reverse('list_books'), requests)
+            if first_book is not None:
+                deep = f"{reverse('list_books')}?after={first_book + book_count // 2}"
+                endpoints['books_deep_page'] = measure(reader, deep, requests)
+            if largest_library is not None:
+                url = reverse('library_detail', args=[largest_library])
+                endpoints['library_detail'] = measure(reader, url, requests)
+
+            for view, role in (('admin_view', 'Admin'), ('librarian_view', 'Librarian'), ('member_view', 'Member')):
+                client = logged_in_client(username=f"loadtest-{role.lower()}", role=role)
+                endpoints[view] = measure(client, reverse(view), requests)
+
+            credentials = {'username': 'loadtest-reader', 'password': 'benchmark-pass'}
+            endpoints['login'] = measure(reader, reverse('login'), requests, method='post', data=credentials, status=302)
+
+            dataset = {
+                'authors': Author.objects.count(),  # type: ignore
+                'books': book_count,
+                'libraries': Library.objects.count(),  # type: ignore
+                'memberships': Library.books.through.objects.count(),
+                'librarians': Librarian.objects.count(),  # type: ignore
+                'users': User.objects.count(),
+                'profiles': UserProfile.objects.count(),  # type: ignore
+            }
+
+        report = {
+            'commit': current_commit(),
+            'python': platform.python_version(),
+            'requests_per_endpoint': requests,
+            'dataset': dataset,
+            'endpoints': endpoints,
+        }
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                handle.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
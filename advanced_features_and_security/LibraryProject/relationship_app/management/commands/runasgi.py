@@ -0,0 +1,45 @@
+# relationship_app/management/commands/runasgi.py
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+ASGI_APPLICATION = 'LibraryProject.asgi:application'
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve LibraryProject.asgi with uvicorn worker processes and relationship_app's "
+        "async views (ASYNC_VIEWS). Requires `pip install uvicorn`. Under gunicorn the "
+        "equivalent is `gunicorn LibraryProject.asgi:application -k uvicorn.workers.UvicornWorker`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help="Interface to bind (default: 127.0.0.1)")
+        parser.add_argument('--port', type=int, default=8000, help="Port to bind (default: 8000)")
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help="Worker processes, each with its own event loop (default: one per CPU)",
+        )
+        parser.add_argument('--access-log', action='store_true', help="Log every request")
+        parser.add_argument(
+            '--sync-views', action='store_true',
+            help="Serve the sync views through ASGI instead, for comparison",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            import uvicorn
+        except ImportError:
+            raise CommandError("runasgi needs uvicorn: pip install uvicorn")
+
+        # Read by the settings of every worker process
+        os.environ['DJANGO_ASYNC_VIEWS'] = '0' if options['sync_views'] else '1'
+        uvicorn.run(
+            ASGI_APPLICATION,
+            host=options['host'],
+            port=options['port'],
+            workers=options['workers'],
+            access_log=options['access_log'],
+            # Django does not implement the lifespan protocol
+            lifespan='off',
+        )
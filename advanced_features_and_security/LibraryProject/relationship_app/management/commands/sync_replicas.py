@@ -0,0 +1,41 @@
+# relationship_app/management/commands/sync_replicas.py
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from relationship_app.database import copy_sqlite, replicas
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database into every DATABASE_REPLICAS file with SQLite's "
+        "online backup, a local stand-in for replication. Replicas stay readable while they "
+        "are refreshed. With --interval it runs until interrupted, so the replicas lag the "
+        "primary by up to that many seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help="Seconds between refreshes (default: refresh once and exit)",
+        )
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES[DEFAULT_DB_ALIAS]
+        aliases = replicas()
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError("sync_replicas copies SQLite databases only")
+        if not aliases:
+            raise CommandError("No DATABASE_REPLICAS configured (set SQLITE_REPLICAS=<n>)")
+
+        while True:
+            started = time.perf_counter()
+            copy_sqlite(primary['NAME'], [settings.DATABASES[alias]['NAME'] for alias in aliases])
+            self.stdout.write(
+                f"Refreshed {', '.join(aliases)} in {(time.perf_counter() - started) * 1000:.0f} ms"
+            )
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
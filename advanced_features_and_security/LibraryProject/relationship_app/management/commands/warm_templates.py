@@ -0,0 +1,28 @@
+# relationship_app/management/commands/warm_templates.py
+from django.core.management.base import BaseCommand, CommandError
+
+from relationship_app.template_warmup import warm_templates
+
+
+class Command(BaseCommand):
+    help = (
+        "Compile every project template into the cached template loader and report "
+        "templates that fail to compile. The WSGI and ASGI applications do this "
+        "at startup when TEMPLATE_WARMUP is on."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help="Also compile templates shipped by installed packages, such as the admin",
+        )
+
+    def handle(self, *args, **options):
+        compiled, failed, seconds = warm_templates(include_all=options['all'])
+        for name, exc in failed.items():
+            self.stderr.write(f"{name}: {exc}")
+        if failed:
+            raise CommandError(f"{len(failed)} templates failed to compile")
+        self.stdout.write(self.style.SUCCESS(
+            f"Compiled {len(compiled)} templates in {seconds * 1000:.1f} ms"
+        ))
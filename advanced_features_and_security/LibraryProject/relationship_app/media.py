@@ -0,0 +1,192 @@
+# relationship_app/media.py
+"""
+Serving MEDIA_ROOT without tying up workers.
+
+MEDIA_SERVE_MODE picks who streams the bytes:
+
+- 'x-accel-redirect': nginx. The response carries only headers and an
+  X-Accel-Redirect to MEDIA_ACCEL_REDIRECT_PREFIX, which must be an
+  `internal` location aliased to MEDIA_ROOT.
+- 'x-sendfile': Apache mod_xsendfile or lighttpd, given the file's path.
+- 'python' (default): a FileResponse. WSGI servers that provide
+  wsgi.file_wrapper (gunicorn, uWSGI) hand it to os.sendfile.
+
+In every mode ETag/Last-Modified validators are checked first, so
+revalidations are answered with a 304 without touching the file. The
+python mode also answers single byte-range requests.
+
+serve_static answers STATIC_URL from STATIC_ROOT the same way, always in
+python mode, for deployments without a front-end server in front of
+/static/. Names hashed by ManifestStaticFilesStorage are sent immutable.
+"""
+
+import mimetypes
+import os
+import posixpath
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from .storage import media_cache_control, static_cache_control
+
+DEFAULT_SERVE_MODE = 'python'
+DEFAULT_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+SERVE_MODES = ('python', 'x-accel-redirect', 'x-sendfile')
+
+# Bytes read per iteration when streaming a bounded range
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+def file_etag(stat):
+    """Return a strong ETag built from the file's modification time and size"""
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """
+    Return the (start, end) byte positions requested by a single-range
+    `header`, None when the header should be ignored, or ValueError when
+    the range cannot be satisfied.
+    """
+    unit, _, ranges = (header or '').partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in ranges:
+        return None
+    first, dash, last = ranges.strip().partition('-')
+    if not dash:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start, end = max(size - int(last), 0), size - 1
+    except ValueError:
+        return None
+    if start < 0 or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def if_range_matches(request, etag, mtime):
+    """Return whether the Range header still applies to the current file"""
+    condition = request.META.get('HTTP_IF_RANGE')
+    if not condition:
+        return True
+    if condition.startswith('"'):
+        return condition == etag
+    since = parse_http_date_safe(condition)
+    return since is not None and int(mtime) <= since
+
+
+def iter_range(handle, length):
+    """Yield `length` bytes from `handle`, then close it"""
+    try:
+        while length > 0:
+            chunk = handle.read(min(RANGE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        handle.close()
+
+
+def offload_response(mode, path, fullpath, content_type):
+    """Return an empty response telling the front-end server to send the file"""
+    response = HttpResponse(content_type=content_type)
+    if mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', DEFAULT_ACCEL_REDIRECT_PREFIX)
+        response['X-Accel-Redirect'] = posixpath.join(prefix, quote(path))
+    else:
+        response['X-Sendfile'] = fullpath
+    return response
+
+
+def file_response(request, fullpath, stat, etag, content_type):
+    """Stream the file, or the single range the request asks for"""
+    size = stat.st_size
+    requested = request.META.get('HTTP_RANGE')
+    byte_range = None
+    if requested and if_range_matches(request, etag, stat.st_mtime):
+        try:
+            byte_range = parse_range(requested, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        response['Content-Length'] = size
+    elif byte_range is None:
+        response = FileResponse(open(fullpath, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        handle = open(fullpath, 'rb')
+        handle.seek(start)
+        if end == size - 1:
+            # Ranges running to the end keep a real file, so sendfile still applies
+            response = FileResponse(handle, content_type=content_type)
+        else:
+            response = StreamingHttpResponse(iter_range(handle, end - start + 1), content_type=content_type)
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def serve_file(request, root, path, mode, cache_control):
+    """
+    Serve `path` below `root` in the given serve mode, with the Cache-Control
+    value `cache_control(path)` returns.
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = safe_join(root, path)
+        stat = os.stat(fullpath)
+    except (OSError, ValueError):
+        raise Http404("File not found")
+    if not os.path.isfile(fullpath):
+        raise Http404("File not found")
+
+    etag = file_etag(stat)
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        content_type, encoding = mimetypes.guess_type(fullpath)
+        content_type = content_type or 'application/octet-stream'
+        if mode == 'python':
+            response = file_response(request, fullpath, stat, etag, content_type)
+        else:
+            response = offload_response(mode, path, fullpath, content_type)
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    value = cache_control(path)
+    if value:
+        response['Cache-Control'] = value
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve a file below MEDIA_ROOT with validators, ranges and optional offload"""
+    mode = getattr(settings, 'MEDIA_SERVE_MODE', DEFAULT_SERVE_MODE)
+    if mode not in SERVE_MODES:
+        raise ValueError(f"MEDIA_SERVE_MODE must be one of {', '.join(SERVE_MODES)}, not {mode!r}")
+    return serve_file(request, settings.MEDIA_ROOT, path, mode, media_cache_control)
+
+
+@require_safe
+def serve_static(request, path):
+    """Serve a file collected into STATIC_ROOT, caching content-hashed names for a year"""
+    if not settings.STATIC_ROOT:
+        raise Http404("STATIC_ROOT is not set")
+    return serve_file(request, settings.STATIC_ROOT, path, 'python', static_cache_control)
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.15 on 2026-10-18 20:05
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_books(apps, schema_editor):
+    """Count the books every existing author wrote and every library holds"""
+    Author = apps.get_model('relationship_app', 'Author')
+    Book = apps.get_model('relationship_app', 'Book')
+    Library = apps.get_model('relationship_app', 'Library')
+    Membership = Library.books.through
+    for model, rows in (
+        (Author, Book.objects.filter(author_id=OuterRef('pk')).values('author_id')),
+        (Library, Membership.objects.filter(library_id=OuterRef('pk')).values('library_id')),
+    ):
+        counts = rows.order_by().annotate(total=Count('pk')).values('total')
+        model.objects.update(book_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relationship_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='book_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='library',
+            name='book_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_books, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-18 21:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relationship_app', '0002_book_counts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='library',
+            index=models.Index(fields=['-book_count', 'name'], name='library_book_count_name_idx'),
+        ),
+    ]
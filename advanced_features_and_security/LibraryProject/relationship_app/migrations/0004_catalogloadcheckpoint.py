@@ -0,0 +1,21 @@
+# Generated by Django 5.1.15 on 2026-10-18 22:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relationship_app', '0003_library_book_count_name_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogLoadCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255, unique=True)),
+                ('rows', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
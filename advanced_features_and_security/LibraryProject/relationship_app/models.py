@@ -1,12 +1,25 @@
 # relationship_app/models.py
+from abc import ABCMeta, abstractmethod
+from itertools import islice
+
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import AbstractUser, BaseUserManager
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
 from django.utils import timezone
 
+from .dashboard import invalidate_dashboard
+from .page_cache import invalidate_libraries
+from .roles import invalidate_user_role
+from .storage import DEFAULT_RELEASE_GRACE_SECONDS, profile_photo_storage
+from .thumbnails import delete_thumbnails, has_thumbnails, schedule_thumbnails
+from .user_cache import forget_user
+
 
 class CustomUserManager(BaseUserManager):
     """
@@ -58,8 +71,10 @@ class CustomUser(AbstractUser):
     
     profile_photo = models.ImageField(
         upload_to='profile_photos/', 
+        storage=profile_photo_storage,
         null=True, 
         blank=True,
+        db_index=True,
         help_text="Upload your profile photo"
     )
     
@@ -108,9 +123,79 @@ class CustomUser(AbstractUser):
         Return the user's first name.
         """
         return self.first_name
-class Author(models.Model):
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored photo so a save can tell whether it was replaced
+        instance._stored_photo = instance.__dict__.get('profile_photo')
+        return instance
+class BookCountManager(models.Manager, metaclass=ABCMeta):
+    """Manager maintaining a model's denormalized `book_count` column"""
+
+    @abstractmethod
+    def counted_rows(self):
+        """Return the rows (books or memberships) counted for the outer row, as a values() queryset"""
+
+    def adjust_book_counts(self, deltas):
+        """Add `deltas[pk]` to the book count of every row in `deltas`, in one UPDATE"""
+        by_delta = {}
+        for pk, delta in deltas.items():
+            if delta:
+                by_delta.setdefault(delta, []).append(pk)
+        if by_delta:
+            change = Case(*[When(pk__in=pks, then=Value(delta)) for delta, pks in by_delta.items()], default=Value(0))
+            self.filter(pk__in=[pk for pks in by_delta.values() for pk in pks]).update(
+                book_count=Greatest(F('book_count') + change, 0),
+            )
+
+    def adjust_book_count(self, pks, delta):
+        """Add `delta` to the book count of the rows in `pks` (ids or a values_list queryset)"""
+        if delta:
+            # Clamped, so a count that drifted low cannot make deletes fail
+            self.filter(pk__in=pks).update(book_count=Greatest(F('book_count') + delta, 0))
+
+    def recount_books(self, **filters):
+        """
+        Recompute the book count of the rows matching `filters` from the
+        counted rows and return how many were wrong.
+        """
+        actual = Coalesce(Subquery(self.counted_rows().order_by().annotate(total=Count('pk')).values('total')), 0)
+        return self.filter(**filters).exclude(book_count=actual).update(book_count=actual)
+
+class AuthorManager(BookCountManager):
+    def counted_rows(self):
+        return Book.objects.filter(author_id=OuterRef('pk')).values('author_id')  # type: ignore
+
+class LibraryManager(BookCountManager):
+    def counted_rows(self):
+        return Library.books.through.objects.filter(library_id=OuterRef('pk')).values('library_id')  # type: ignore
+
+class BookCounted(models.Model):
+    """
+    Abstract model with a `book_count` kept current by the receivers below,
+    so listing or sorting by size never counts books.
+    """
+    book_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        # The counter is only written by the receivers and recount_books; saving
+        # an instance loaded before books were added must not overwrite it
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'book_count'
+            ]
+        super().save(*args, **kwargs)
+
+class Author(BookCounted):
     name = models.CharField(max_length=100)
 
+    objects = AuthorManager()
+
     def __str__(self) -> str:
         return str(self.name)
 
@@ -122,12 +207,27 @@ class Book(models.Model):
     def __str__(self):
         return f"{self.title} by {self.author.name}"
 
-class Library(models.Model):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored author so a save can move the book between counts
+        instance._stored_author_id = instance.__dict__.get('author_id')
+        return instance
+
+class Library(BookCounted):
     name = models.CharField(max_length=100)
     # ManyToManyField relationship: A library can have many books,
     # and a book can be in many libraries
     books = models.ManyToManyField(Book)
 
+    objects = LibraryManager()
+
+    class Meta:
+        indexes = [
+            # The admin dashboard's largest libraries
+            models.Index(fields=['-book_count', 'name'], name='library_book_count_name_idx'),
+        ]
+
     def __str__(self) -> str:
         return str(self.name)
 
@@ -139,6 +239,131 @@ class Librarian(models.Model):
     def __str__(self):
         return f"{self.name} - {self.library.name}"
 
+class CatalogLoadCheckpoint(models.Model):
+    """
+    Rows of a catalog file committed by load_catalog. It is advanced in the
+    transaction of every chunk, so it never disagrees with what was loaded.
+    """
+    source = models.CharField(max_length=255, unique=True)
+    rows = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.source}: {self.rows} rows"
+
+    def advance(self, rows):
+        """Record `rows` more committed rows; call inside the transaction writing them"""
+        type(self).objects.filter(pk=self.pk).update(rows=F('rows') + rows)  # type: ignore
+        self.rows += rows
+
+# Cached catalog and library pages (see page_cache). Each change retires
+# the catalog pages and/or the pages of exactly the libraries showing it.
+def libraries_holding(**book_filter):
+    return Library.books.through.objects.filter(**book_filter).values_list('library_id', flat=True)  # type: ignore
+
+@receiver(post_save, sender=Book)
+def invalidate_book_pages(sender, instance, created, raw=False, **kwargs):
+    """A new or edited book changes the catalog and the libraries holding it"""
+    if not raw:
+        invalidate_libraries([] if created else libraries_holding(book_id=instance.pk), catalog=True)
+
+@receiver(pre_delete, sender=Book)
+def invalidate_deleted_book_pages(sender, instance, **kwargs):
+    """Memberships are gone by post_delete, so the libraries are looked up first"""
+    invalidate_libraries(libraries_holding(book_id=instance.pk), catalog=True)
+
+@receiver(post_save, sender=Author)
+def invalidate_author_pages(sender, instance, created, raw=False, **kwargs):
+    """Author names are shown next to every one of their books"""
+    if not created and not raw:
+        invalidate_libraries(libraries_holding(book__author_id=instance.pk), catalog=True)
+
+@receiver([post_save, post_delete], sender=Library)
+def invalidate_library_page(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_libraries([instance.pk])
+
+@receiver(m2m_changed, sender=Library.books.through)
+def invalidate_membership_pages(sender, instance, action, reverse, pk_set, **kwargs):
+    """Library.books changes only affect the libraries involved, never the catalog"""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_libraries([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        invalidate_libraries(pk_set)
+    elif action == 'pre_clear':
+        invalidate_libraries(libraries_holding(book_id=instance.pk))
+
+# Denormalized book counts (BookCounted). bulk_create() and queryset.update()
+# bypass these; adjust the counts directly or run `manage.py recount_books`.
+@receiver(post_save, sender=Book)
+def count_saved_book(sender, instance, created, raw=False, **kwargs):
+    """Count a new book for its author, or move an edited one to its new author"""
+    if raw:
+        return
+    stored = None if created else getattr(instance, '_stored_author_id', None)
+    if stored != instance.author_id:
+        deltas = {instance.author_id: 1}
+        if stored:
+            deltas[stored] = -1
+        Author.objects.adjust_book_counts(deltas)  # type: ignore
+    instance._stored_author_id = instance.author_id
+
+@receiver(pre_delete, sender=Book)
+def uncount_deleted_book(sender, instance, **kwargs):
+    """Memberships are deleted without m2m_changed, so their libraries are adjusted here"""
+    Author.objects.adjust_book_count([instance.author_id], -1)  # type: ignore
+    Library.objects.adjust_book_count(libraries_holding(book_id=instance.pk), -1)  # type: ignore
+
+@receiver(m2m_changed, sender=Library.books.through)
+def count_memberships(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep Library.book_count in step with Library.books, from either side"""
+    Membership = sender
+    if action == 'post_add':
+        # pk_set holds only the memberships actually inserted
+        if reverse:
+            Library.objects.adjust_book_count(pk_set, 1)  # type: ignore
+        else:
+            Library.objects.adjust_book_count([instance.pk], len(pk_set))  # type: ignore
+    elif action == 'pre_remove':
+        # pk_set may name books or libraries that are not linked
+        if reverse:
+            Library.objects.adjust_book_count(libraries_holding(book_id=instance.pk, library_id__in=pk_set), -1)  # type: ignore
+        else:
+            removed = Membership.objects.filter(library_id=instance.pk, book_id__in=pk_set).count()
+            Library.objects.adjust_book_count([instance.pk], -removed)  # type: ignore
+    elif action == 'pre_clear':
+        if reverse:
+            Library.objects.adjust_book_count(libraries_holding(book_id=instance.pk), -1)  # type: ignore
+        else:
+            Library.objects.filter(pk=instance.pk).update(book_count=0)  # type: ignore
+
+class UserProfileManager(models.Manager):
+    """
+    Manager for UserProfile with a bulk path for users that were inserted
+    without post_save signals (e.g. through bulk_create imports).
+    """
+
+    def create_missing(self, batch_size=1000):
+        """
+        Create a default profile for every user that does not have one yet
+        and return how many were created. Profiles created concurrently, which
+        bulk_create skips, are not counted.
+        """
+        user_ids = (
+            User.objects.filter(userprofile__isnull=True)
+            .values_list('id', flat=True)
+            .iterator(chunk_size=batch_size)
+        )
+        created = 0
+        while batch := list(islice(user_ids, batch_size)):
+            with transaction.atomic():
+                existing = self.filter(user_id__in=batch).count()
+                self.bulk_create([self.model(user_id=user_id) for user_id in batch], ignore_conflicts=True)
+                created += self.filter(user_id__in=batch).count() - existing
+        if created:
+            invalidate_dashboard()
+        return created
+
 # New UserProfile model
 class UserProfile(models.Model):
     ROLE_CHOICES = [
@@ -149,21 +374,87 @@ class UserProfile(models.Model):
     
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='Member')
+
+    objects = UserProfileManager()
     
     def __str__(self) -> str:
         return f"{self.user.username} - {self.role}"# type: ignore
 
-# Signal to automatically create UserProfile when User is created
+# Signal to automatically create UserProfile when User is created.
+# Updates to an existing user (including the last_login write on every login)
+# never touch the profile.
 @receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
+def create_user_profile(sender, instance, created, raw=False, **kwargs):
     """Create a UserProfile when a new User is created"""
-    if created:
+    if created and not raw:
         UserProfile.objects.create(user=instance)  # type: ignore
 
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    """Save the UserProfile when User is saved"""
-    if hasattr(instance, 'userprofile'):
-        instance.userprofile.save()
-    else:
-        UserProfile.objects.create(user=instance)  # type: ignore
\ No newline at end of file
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_cached_role(sender, instance, **kwargs):
+    """Evict the cached role whenever a UserProfile changes"""
+    invalidate_user_role(instance.user_id)
+    forget_user(instance.user_id)
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Evict the user, who is cached with their profile, from this process's user cache"""
+    forget_user(instance.pk)
+
+# Admin dashboard statistics (see dashboard). Only writes that change a count
+# or a library name retire them; the last_login save on every login does not.
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=Book)
+def invalidate_dashboard_totals(sender, created=True, raw=False, **kwargs):
+    """Users and books only change the totals when added (post_delete passes no `created`)"""
+    if created and not raw:
+        invalidate_dashboard()
+
+@receiver([post_save, post_delete], sender=UserProfile)
+@receiver([post_save, post_delete], sender=Library)
+def invalidate_dashboard_rows(sender, raw=False, **kwargs):
+    """Profiles move users between roles; libraries are listed by name"""
+    if not raw:
+        invalidate_dashboard()
+
+@receiver(m2m_changed, sender=Library.books.through)
+def invalidate_dashboard_library_counts(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_dashboard()
+
+def release_profile_photo(storage, name):
+    """
+    Delete the photo `name` and its thumbnails after the current transaction
+    commits, unless some user still references it. Photos are shared between
+    users with identical uploads, so the users holding the name are its
+    reference count. Photos saved within PROFILE_PHOTO_RELEASE_GRACE_SECONDS
+    may be held by a row not committed yet; they are left to
+    cleanup_profile_photos.
+    """
+    def release():
+        if CustomUser.objects.filter(profile_photo=name).exists():  # type: ignore
+            return
+        grace = getattr(settings, 'PROFILE_PHOTO_RELEASE_GRACE_SECONDS', DEFAULT_RELEASE_GRACE_SECONDS)
+        if storage.release(name, grace):
+            delete_thumbnails(storage, name)
+    transaction.on_commit(release)
+
+@receiver(post_save, sender=CustomUser)
+def refresh_profile_photo_thumbnails(sender, instance, raw=False, **kwargs):
+    """Render thumbnails for a new profile photo and release the one it replaced"""
+    if raw or 'profile_photo' not in instance.__dict__:
+        return
+    photo = instance.profile_photo
+    current, stored = photo.name or '', getattr(instance, '_stored_photo', None) or ''
+    if current == stored:
+        return
+    if stored:
+        release_profile_photo(photo.storage, stored)
+    if current and not has_thumbnails(photo.storage, current):
+        schedule_thumbnails(photo)
+    instance._stored_photo = current
+
+@receiver(post_delete, sender=CustomUser)
+def release_deleted_profile_photo(sender, instance, **kwargs):
+    """Release the photo of a deleted user"""
+    if 'profile_photo' in instance.__dict__ and instance.profile_photo:
+        release_profile_photo(instance.profile_photo.storage, instance.profile_photo.name)
@@ -0,0 +1,148 @@
+# relationship_app/page_cache.py
+"""
+Invalidation and metrics for the cached catalog and library page fragments.
+
+The book lists on /books/ and /library/<pk>/ are rendered inside {% cache %}
+blocks keyed on generation counters ("scopes"): 'catalog' for the catalog
+pages and 'library:<pk>' for each library page. Changing a book, an author
+or a library's book list bumps exactly the scopes showing it, so stale
+fragments are never looked up again and simply expire.
+
+Counters are kept in the same cache as the fragments (the
+'template_fragments' alias when configured), so every process sharing the
+fragments also sees the bumps. That cache may evict a counter like any other
+entry; a missing counter is started again from the current time in
+nanoseconds rather than from 0, so it never returns to a version whose
+fragments may still be cached.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+FRAGMENT_CACHE_ALIAS = 'template_fragments'
+DEFAULT_PAGE_CACHE_TIMEOUT = 600
+CATALOG_SCOPE = 'catalog'
+
+
+def fragment_cache():
+    """Return the cache {% cache %} stores fragments in"""
+    alias = FRAGMENT_CACHE_ALIAS if FRAGMENT_CACHE_ALIAS in settings.CACHES else 'default'
+    return caches[alias]
+
+
+def page_cache_timeout():
+    return getattr(settings, 'PAGE_CACHE_TIMEOUT', DEFAULT_PAGE_CACHE_TIMEOUT)
+
+
+def library_scope(pk):
+    return f"library:{pk}"
+
+
+def generation_key(scope):
+    return f"page_cache:generation:{scope}"
+
+
+def start_generations(cache, keys):
+    """Start the counters at `keys` from a value no evicted counter ever held"""
+    for key in keys:
+        cache.add(key, time.time_ns(), None)
+    # Another process may have started or bumped them first
+    return cache.get_many(keys)
+
+
+async def astart_generations(cache, keys):
+    for key in keys:
+        await cache.aadd(key, time.time_ns(), None)
+    return await cache.aget_many(keys)
+
+
+def cache_version(scopes):
+    """Return a string identifying the current generation of every scope"""
+    cache = fragment_cache()
+    keys = [generation_key(scope) for scope in scopes]
+    values = cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        values.update(start_generations(cache, missing))
+    return '.'.join(str(values.get(key, 0)) for key in keys)
+
+
+async def acache_version(scopes):
+    """Async cache_version, for async views"""
+    cache = fragment_cache()
+    keys = [generation_key(scope) for scope in scopes]
+    values = await cache.aget_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        values.update(await astart_generations(cache, missing))
+    return '.'.join(str(values.get(key, 0)) for key in keys)
+
+
+def bump(scopes):
+    cache = fragment_cache()
+    for scope in scopes:
+        key = generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            start_generations(cache, [key])
+
+
+def invalidate(scopes):
+    """
+    Retire every fragment rendered from `scopes`. The counters are bumped
+    now and again once the transaction commits, so a page rendered from
+    pre-commit data in between is not served afterwards.
+    """
+    scopes = list(scopes)
+    if scopes:
+        bump(scopes)
+        transaction.on_commit(lambda: bump(scopes))
+
+
+def invalidate_libraries(library_ids, catalog=False):
+    """Invalidate the pages of the given libraries, and the catalog pages if `catalog`"""
+    scopes = [library_scope(pk) for pk in set(library_ids)]
+    if catalog:
+        scopes.append(CATALOG_SCOPE)
+    invalidate(scopes)
+
+
+class FragmentStats:
+    """Thread-safe hit, miss and latency counters for the cached pages"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.hits = self.misses = 0
+            self.hit_seconds = self.miss_seconds = 0.0
+
+    def record(self, hit, seconds):
+        with self.lock:
+            if hit:
+                self.hits += 1
+                self.hit_seconds += seconds
+            else:
+                self.misses += 1
+                self.miss_seconds += seconds
+
+    def snapshot(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else None,
+                'hit_ms': round(self.hit_seconds / self.hits * 1000, 2) if self.hits else None,
+                'miss_ms': round(self.miss_seconds / self.misses * 1000, 2) if self.misses else None,
+            }
+
+
+stats = FragmentStats()
@@ -5,35 +5,31 @@ Run this script using: python manage.py shell < relationship_app/query_samples.p
 Or copy and paste in Django shell: python manage.py shell
 """
 
+from relationship_app.catalog_loader import CatalogLoader
 from relationship_app.models import Author, Book, Library, Librarian
 
 def create_sample_data():
     """Create sample data for testing queries"""
     print("Creating sample data...")
 
-    # Create authors
-    author1 = Author.objects.create(name="J.K. Rowling")# type: ignore
-    author2 = Author.objects.create(name="George Orwell")# type: ignore
-    author3 = Author.objects.create(name="Harper Lee")# type: ignore
-
-    # Create books
-    book1 = Book.objects.create(title="Harry Potter and the Philosopher's Stone", author=author1)# type: ignore
-    book2 = Book.objects.create(title="Harry Potter and the Chamber of Secrets", author=author1)# type: ignore
-    book3 = Book.objects.create(title="1984", author=author2)# type: ignore
-    book4 = Book.objects.create(title="Animal Farm", author=author2)# type: ignore
-    book5 = Book.objects.create(title="To Kill a Mockingbird", author=author3)# type: ignore
-
-    # Create libraries
-    library1 = Library.objects.create(name="Central Public Library")# type: ignore
-    library2 = Library.objects.create(name="University Library")# type: ignore
-
-    # Add books to libraries (ManyToMany relationship)
-    library1.books.add(book1, book2, book3, book5)
-    library2.books.add(book3, book4, book5)
+    # Authors, books and library memberships are written in bulk
+    central, university = "Central Public Library", "University Library"
+    rows = [
+        {'title': "Harry Potter and the Philosopher's Stone", 'author': "J.K. Rowling", 'libraries': [central]},
+        {'title': "Harry Potter and the Chamber of Secrets", 'author': "J.K. Rowling", 'libraries': [central]},
+        {'title': "1984", 'author': "George Orwell", 'libraries': [central, university]},
+        {'title': "Animal Farm", 'author': "George Orwell", 'libraries': [university]},
+        {'title': "To Kill a Mockingbird", 'author': "Harper Lee", 'libraries': [central, university]},
+    ]
+    loader = CatalogLoader()
+    for _ in loader.load(rows):
+        pass
 
     # Create librarians
-    librarian1 = Librarian.objects.create(name="Alice Johnson", library=library1)# type: ignore
-    librarian2 = Librarian.objects.create(name="Bob Smith", library=library2)# type: ignore
+    Librarian.objects.bulk_create([# type: ignore
+        Librarian(name="Alice Johnson", library_id=loader.library_ids[central]),
+        Librarian(name="Bob Smith", library_id=loader.library_ids[university]),
+    ])
 
     print("Sample data created successfully!")
 
@@ -48,7 +44,7 @@ def query_books_by_author():
         # Query books by this author using ForeignKey relationship
         books = Book.objects.filter(author=author)# type: ignore
 
-        print(f"Books by {author_name}:")
+        print(f"Books by {author_name} ({author.book_count}):")
         for book in books:
             print(f"  - {book.title}")
 
@@ -75,11 +71,21 @@ def query_books_in_library():
         for book in books:
             print(f"  - {book.title} by {book.author.name}")
 
-        print(f"\nTotal books: {books.count()}")
+        # The maintained counter answers without a COUNT over the memberships
+        print(f"\nTotal books: {library.book_count}")
 
     except Library.DoesNotExist:# type: ignore
         print(f"Library '{library_name}' not found")
 
+def query_largest_libraries():
+    """List libraries and authors by size, read from their book_count columns"""
+    print("\n=== QUERY 4: Libraries and authors by number of books ===")
+
+    for library in Library.objects.order_by('-book_count', 'name'):# type: ignore
+        print(f"  - {library.name}: {library.book_count} books")
+    for author in Author.objects.order_by('-book_count', 'name')[:3]:# type: ignore
+        print(f"  - {author.name}: {author.book_count} books")
+
 def query_librarian_for_library():
     """Retrieve the librarian for a library (OneToOne relationship)"""
     print("\n=== QUERY 3: Librarian for a specific library ===")
@@ -113,6 +119,7 @@ def run_all_queries():
     query_books_by_author()
     query_books_in_library()
     query_librarian_for_library()
+    query_largest_libraries()
 
     print("\n" + "=" * 50)
     print("All queries completed!")
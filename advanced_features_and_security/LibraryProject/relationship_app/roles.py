@@ -0,0 +1,94 @@
+# relationship_app/roles.py
+"""
+Role resolution for the role-based views.
+
+A user's role is looked up at most once per request and remembered on the
+user object. When ROLE_CACHE_TIMEOUT is set, roles are also kept in the
+'shared' cache alias keyed by user id; UserProfile saves and deletes evict
+them there, for every process using that cache. Without a 'shared' alias
+the 'default' cache is used, which may be local to each process: a changed
+role is then only seen by the other processes once their entry expires.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ObjectDoesNotExist
+
+# Attribute the resolved role is stored under on request.user
+ROLE_ATTRIBUTE = '_relationship_app_role'
+
+ROLE_CACHE_ALIAS = 'shared'
+
+
+def role_cache():
+    """Return the cache roles are kept in"""
+    alias = ROLE_CACHE_ALIAS if ROLE_CACHE_ALIAS in settings.CACHES else 'default'
+    return caches[alias]
+
+
+def role_cache_key(user_id):
+    """Return the shared cache key holding the role of `user_id`"""
+    return f"relationship_app:role:{user_id}"
+
+
+def get_user_role(user):
+    """Return the role of `user`, or None for anonymous users and users without a profile"""
+    if not user.is_authenticated:
+        return None
+
+    try:
+        return getattr(user, ROLE_ATTRIBUTE)
+    except AttributeError:
+        pass
+
+    timeout = getattr(settings, 'ROLE_CACHE_TIMEOUT', 0)
+    role = role_cache().get(role_cache_key(user.pk)) if timeout else None
+    if role is None:
+        try:
+            role = user.userprofile.role
+        except ObjectDoesNotExist:
+            role = None
+        if timeout and role is not None:
+            role_cache().set(role_cache_key(user.pk), role, timeout)
+
+    setattr(user, ROLE_ATTRIBUTE, role)
+    return role
+
+
+async def aget_user_role(user):
+    """
+    Async get_user_role. The profile loaded with the user by
+    RoleAwareModelBackend is used when present; otherwise only the role is
+    read, with the async ORM.
+    """
+    # Imported here: models.py imports this module for its receivers
+    from .models import UserProfile
+
+    if not user.is_authenticated:
+        return None
+
+    try:
+        return getattr(user, ROLE_ATTRIBUTE)
+    except AttributeError:
+        pass
+
+    timeout = getattr(settings, 'ROLE_CACHE_TIMEOUT', 0)
+    role = await role_cache().aget(role_cache_key(user.pk)) if timeout else None
+    if role is None:
+        if type(user).userprofile.is_cached(user):
+            role = user.userprofile.role
+        else:
+            role = await (
+                UserProfile.objects.filter(user_id=user.pk)  # type: ignore
+                .values_list('role', flat=True).afirst()
+            )
+        if timeout and role is not None:
+            await role_cache().aset(role_cache_key(user.pk), role, timeout)
+
+    setattr(user, ROLE_ATTRIBUTE, role)
+    return role
+
+
+def invalidate_user_role(user_id):
+    """Drop the shared cache entry for `user_id`"""
+    role_cache().delete(role_cache_key(user_id))
@@ -0,0 +1,136 @@
+# relationship_app/sessions.py
+"""
+Session engine and user lookup for authenticated requests.
+
+SESSION_ENGINE = 'relationship_app.sessions' stores sessions in the database
+and writes them through to SESSION_CACHE_ALIAS (Django's cached_db), so a
+request loads its session from the cache instead of the django_session
+table. On top of cached_db, a session is only written back when its data
+actually changed since it was loaded (unless SESSION_SAVE_EVERY_REQUEST asks
+for every session to be saved, to slide its expiry), and `manage.py clearsessions` deletes
+expired sessions SESSION_CLEANUP_BATCH_SIZE rows at a time, so it never
+holds the database's write lock for long.
+
+CachedUserAuthenticationMiddleware replaces AuthenticationMiddleware and
+keeps the users it loads in the per-process user cache (see user_cache),
+keyed by session key and session auth hash. Logging out or in changes the
+session key, which retires the entry at once.
+"""
+
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+
+from .user_cache import user_cache
+
+DEFAULT_CLEANUP_BATCH_SIZE = 1000
+
+
+class SessionStore(CachedDBStore):
+    """cached_db sessions that skip saving unchanged data and expire in batches"""
+
+    def remember_loaded(self, data):
+        self._loaded_data = self.serializer().dumps(data)
+        return data
+
+    def unchanged(self, must_create):
+        # SESSION_SAVE_EVERY_REQUEST saves unchanged sessions to push their expiry forward
+        return (
+            not must_create
+            and not settings.SESSION_SAVE_EVERY_REQUEST
+            and self.session_key is not None
+            and getattr(self, '_loaded_data', None) == self.serializer().dumps(self._get_session(no_load=True))
+        )
+
+    def load(self):
+        return self.remember_loaded(super().load())
+
+    async def aload(self):
+        return self.remember_loaded(await super().aload())
+
+    def save(self, must_create=False):
+        # Setting a key to the value it had marks the session modified too
+        if self.unchanged(must_create):
+            return
+        super().save(must_create)
+        self.remember_loaded(self._get_session(no_load=True))
+
+    async def asave(self, must_create=False):
+        if self.unchanged(must_create):
+            return
+        await super().asave(must_create)
+        self.remember_loaded(self._get_session(no_load=True))
+
+    @classmethod
+    def clear_expired(cls):
+        """Delete expired sessions in batches, each in its own short transaction"""
+        batch_size = getattr(settings, 'SESSION_CLEANUP_BATCH_SIZE', DEFAULT_CLEANUP_BATCH_SIZE)
+        sessions = cls.get_model_class().objects
+        while True:
+            keys = list(
+                sessions.filter(expire_date__lt=timezone.now()).values_list('pk', flat=True)[:batch_size]
+            )
+            if not keys:
+                return
+            # Their cache entries already expired: cached_db sets them to expire with the session
+            sessions.filter(pk__in=keys).delete()
+
+    @classmethod
+    async def aclear_expired(cls):
+        await sync_to_async(cls.clear_expired)()
+
+
+def user_cache_key(session, session_hash):
+    """Key users by session and auth hash: a new login or password means a new entry"""
+    if session.session_key is None or session_hash is None:
+        return None
+    return f"{session.session_key}:{session_hash}"
+
+
+def get_user(request):
+    """auth.get_user, served from the user cache while the entry is fresh"""
+    key = user_cache_key(request.session, request.session.get(auth.HASH_SESSION_KEY))
+    user = user_cache().get(key) if key else None
+    if user is None:
+        user = auth.get_user(request)
+        if key and user.is_authenticated:
+            user_cache().set(key, user)
+    return user
+
+
+async def aget_user(request):
+    """Async get_user"""
+    key = user_cache_key(request.session, await request.session.aget(auth.HASH_SESSION_KEY))
+    user = user_cache().get(key) if key else None
+    if user is None:
+        user = await auth.aget_user(request)
+        if key and user.is_authenticated:
+            user_cache().set(key, user)
+    return user
+
+
+def get_cached_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = get_user(request)
+    return request._cached_user
+
+
+async def aget_cached_user(request):
+    if not hasattr(request, '_acached_user'):
+        request._acached_user = await aget_user(request)
+    return request._acached_user
+
+
+class CachedUserAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware resolving request.user through the user cache"""
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_cached_user(request))
+        request.auser = partial(aget_cached_user, request)
@@ -0,0 +1,135 @@
+# relationship_app/storage.py
+"""
+Content-addressed file storage for profile photos.
+
+Every file is stored under the sha256 of its content, sharded two levels
+deep: profile_photos/<h[:2]>/<h[2:4]>/<h>.<ext>. Saving content that is
+already stored writes nothing and returns the existing name, so repeated
+avatars share one file. Names never change meaning once written, which lets
+the media view mark them immutable (media_cache_control).
+
+Files carry no reference count of their own: a file is referenced by every
+CustomUser row holding its name (see release_profile_photo in models.py and
+the cleanup_profile_photos command). A row naming a file may not be
+committed yet when the file is released, so saving content that is already
+stored touches the file, and release() keeps files saved within a grace
+period.
+"""
+
+import hashlib
+import os
+import posixpath
+import re
+import secrets
+import time
+
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage, storages
+from django.core.files.utils import validate_file_name
+from django.utils.deconstruct import deconstructible
+
+PROFILE_PHOTO_STORAGE_ALIAS = 'profile_photos'
+
+# Seconds a saved photo is kept even when no committed row references it
+DEFAULT_RELEASE_GRACE_SECONDS = 300
+
+# Sent with every content-addressed file; the URL changes whenever the content does
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# <h[:2]>/<h[2:4]>/<h>.<ext> and the thumbs/<h>_<size>.<ext> derived from it
+HASHED_NAME_RE = re.compile(r'(?:^|/)[0-9a-f]{2}/[0-9a-f]{2}/(?:thumbs/)?[0-9a-f]{64}(?:_\d+)?\.\w+$')
+
+# <name>.<md5[:12]>.<ext>, as written by ManifestStaticFilesStorage
+STATIC_HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+
+
+def content_hash(content):
+    """Return the sha256 of `content`, reusing the hash computed while it was uploaded"""
+    precomputed = getattr(content, 'content_hash', None)
+    if precomputed:
+        return precomputed
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+@deconstructible(path='relationship_app.storage.ContentAddressedStorage')
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that names files by their content and stores each content once"""
+
+    def hashed_name(self, name, content):
+        """Return the sharded, content-derived name for saving `content` as `name`"""
+        directory, filename = posixpath.split(name)
+        digest = content_hash(content)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest[:2], digest[2:4], f"{digest}{extension}")
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        validate_file_name(name, allow_relative_path=True)
+        if not self.touch(name):
+            name = self._save(name, content)
+        return name
+
+    def touch(self, name):
+        """Mark the stored `name` as just saved; return False if it is not stored"""
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def release(self, name, grace=DEFAULT_RELEASE_GRACE_SECONDS):
+        """
+        Delete `name` unless it was saved within the last `grace` seconds, and
+        return whether it was deleted. The file is moved aside first: a
+        concurrent save() of the same content either touched it before, and
+        it is put back, or finds it gone and writes it again.
+        """
+        path = self.path(name)
+        released = f"{path}.{secrets.token_hex(8)}.released"
+        try:
+            os.replace(path, released)
+        except FileNotFoundError:
+            return False
+        if os.stat(released).st_mtime > time.time() - grace:
+            os.replace(released, path)
+            return False
+        os.remove(released)
+        return True
+
+    def save_exact(self, name, content):
+        """Store `content` under `name` as given, replacing any existing file"""
+        validate_file_name(name, allow_relative_path=True)
+        return self._save(name, content)
+
+    def _save(self, name, content):
+        # Write beside the target and rename over it, so concurrent saves of
+        # the same content never expose a partially written file
+        partial = super()._save(f"{name}.{secrets.token_hex(8)}.part", content)
+        os.replace(self.path(partial), self.path(name))
+        return name
+
+
+def media_cache_control(name):
+    """Return the Cache-Control value for the media file `name`, or None for the default"""
+    if HASHED_NAME_RE.search(name):
+        return IMMUTABLE_CACHE_CONTROL
+    return None
+
+
+def static_cache_control(name):
+    """Return the Cache-Control value for the static file `name`, or None for the default"""
+    if STATIC_HASHED_NAME_RE.search(name):
+        return IMMUTABLE_CACHE_CONTROL
+    return None
+
+
+def profile_photo_storage():
+    """Storage of CustomUser.profile_photo, configured as STORAGES['profile_photos']"""
+    return storages[PROFILE_PHOTO_STORAGE_ALIAS]
@@ -0,0 +1,133 @@
+# relationship_app/synthetic.py
+"""
+Deterministic synthetic data for relationship_app.
+
+The same seed and volumes always produce the same catalog. Author popularity
+and library sizes follow a Zipf distribution, so a few authors and libraries
+hold most of the books, as in real catalogs. Every requested library is
+created, even one no book picks. Running the generator again adds books but
+reuses the libraries, librarians and users it already created.
+"""
+
+import random
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .catalog_loader import DEFAULT_BATCH_SIZE, CatalogLoader
+from .dashboard import invalidate_dashboard
+from .models import Librarian, Library, UserProfile
+
+# Password every generated user can log in with
+SYNTHETIC_PASSWORD = 'synthetic-pass'
+
+# Share of generated users per role; the rest are members
+ROLE_SHARES = (('Admin', 0.01), ('Librarian', 0.05))
+
+TITLE_WORDS = (
+    'Shadow', 'River', 'Garden', 'Empire', 'Winter', 'Secret', 'Silent', 'Stone',
+    'Glass', 'Ocean', 'Crown', 'Letters', 'Forest', 'Night', 'Fire', 'Island',
+)
+
+
+def zipf_weights(count, exponent):
+    """Return cumulative Zipf weights for ranks 1..count"""
+    return list(accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+class DatasetGenerator:
+    """Generate authors, books, libraries, librarians and users from a seed"""
+
+    def __init__(self, seed=0, authors=1000, books=10000, libraries=50, users=1000,
+                 memberships_per_book=2, skew=1.1, batch_size=DEFAULT_BATCH_SIZE):
+        self.rng = random.Random(seed)
+        self.authors = authors
+        self.books = books
+        self.libraries = libraries
+        self.users = users
+        self.memberships_per_book = memberships_per_book
+        self.skew = skew
+        self.batch_size = batch_size
+
+    def generate(self):
+        """Write the whole dataset and return the number of rows per model"""
+        loader = CatalogLoader(batch_size=self.batch_size)
+        loader.create_libraries(self.library_names())
+        for _ in loader.load(self.book_rows()):
+            pass
+
+        return {
+            'authors': len(loader.author_ids),
+            'books': self.books,
+            'libraries': len(loader.library_ids),
+            'librarians': self.create_librarians(),
+            'users': self.create_users(),
+        }
+
+    def library_names(self):
+        return [f"Library {i:04d}" for i in range(self.libraries)]
+
+    def book_rows(self):
+        """Yield catalog rows with Zipf-skewed authors and library memberships"""
+        author_weights = zipf_weights(self.authors, self.skew)
+        library_weights = zipf_weights(self.libraries, self.skew)
+        authors = [f"Author {i:06d}" for i in range(self.authors)]
+        libraries = self.library_names()
+
+        for i in range(self.books):
+            words = self.rng.sample(TITLE_WORDS, 3)
+            yield {
+                'title': f"The {' '.join(words)} {i}",
+                'author': self.rng.choices(authors, cum_weights=author_weights)[0],
+                'libraries': self.rng.choices(
+                    libraries, cum_weights=library_weights,
+                    k=self.rng.randint(0, self.memberships_per_book * 2),
+                ) if libraries else [],
+            }
+
+    def create_librarians(self):
+        """Give every library without a librarian one and return how many were created"""
+        libraries = Library.objects.filter(librarian__isnull=True).values_list('id', flat=True)  # type: ignore
+        librarians = Librarian.objects.bulk_create(  # type: ignore
+            [Librarian(name=f"Librarian {library_id}", library_id=library_id) for library_id in libraries],
+            batch_size=self.batch_size,
+        )
+        return len(librarians)
+
+    @transaction.atomic
+    def create_users(self):
+        """
+        Bulk create the users that do not exist yet, with profiles, all
+        sharing SYNTHETIC_PASSWORD, and return how many were created
+        """
+        usernames = [f"user{i:07d}" for i in range(self.users)]
+        existing = set(
+            User.objects.filter(username__range=(usernames[0], usernames[-1])).values_list('username', flat=True)
+        ) if usernames else set()
+
+        # Every user draws a role, created or not, so reruns assign the same ones
+        roles = {}
+        for username in usernames:
+            roll, role = self.rng.random(), 'Member'
+            for name, share in ROLE_SHARES:
+                if roll < share:
+                    role = name
+                    break
+                roll -= share
+            roles[username] = role
+
+        password = make_password(SYNTHETIC_PASSWORD)
+        users = User.objects.bulk_create(
+            [User(username=username, password=password) for username in usernames if username not in existing],
+            batch_size=self.batch_size,
+        )
+
+        # bulk_create sends no post_save, so profiles are created here with their roles
+        UserProfile.objects.bulk_create(  # type: ignore
+            [UserProfile(user_id=user.pk, role=roles[user.username]) for user in users],
+            batch_size=self.batch_size,
+        )
+        invalidate_dashboard()
+        return len(users)
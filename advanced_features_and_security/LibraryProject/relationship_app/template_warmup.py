@@ -0,0 +1,87 @@
+# relationship_app/template_warmup.py
+"""
+Precompiling templates when a process starts.
+
+TEMPLATES wraps its loaders in the cached loader, so each template is read
+and parsed once per process, on first use; without a warm-up the first
+request for every page in every new worker pays for it. warm_templates()
+compiles them all up front. The WSGI and ASGI entry points call it when
+TEMPLATE_WARMUP is on, so only serving processes pay for it (under
+gunicorn --preload once, in the master before workers are forked) and
+management commands don't. The warm_templates command runs it on demand,
+e.g. in CI to check every template compiles.
+"""
+
+import logging
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.template import TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_SUFFIXES = ('.html', '.txt', '.xml')
+
+
+def loader_dirs(loaders):
+    """Yield the directories `loaders` read from, looking inside cached loaders"""
+    for loader in loaders:
+        if hasattr(loader, 'loaders'):
+            yield from loader_dirs(loader.loaders)
+        elif hasattr(loader, 'get_dirs'):
+            yield from loader.get_dirs()
+
+
+def template_names(directory):
+    """Yield the name of every template below `directory`, relative to it"""
+    for root, _, files in os.walk(directory):
+        for filename in sorted(files):
+            if filename.endswith(TEMPLATE_SUFFIXES):
+                yield Path(root, filename).relative_to(directory).as_posix()
+
+
+def in_project(directory):
+    base_dir = getattr(settings, 'BASE_DIR', None)
+    return base_dir is not None and Path(directory).resolve().is_relative_to(Path(base_dir).resolve())
+
+
+def warm_templates(include_all=False):
+    """
+    Compile every template of every Django template engine into its cache.
+    Only the project's own templates are compiled unless `include_all`, which
+    adds those shipped by installed packages (e.g. the admin). Returns the
+    compiled names, the names that failed to compile and the seconds taken.
+    """
+    started = time.perf_counter()
+    compiled, failed = [], {}
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        seen = set()
+        for directory in loader_dirs(backend.engine.template_loaders):
+            if not os.path.isdir(directory) or not (include_all or in_project(directory)):
+                continue
+            for name in template_names(directory):
+                if name in seen:
+                    continue
+                seen.add(name)
+                try:
+                    backend.get_template(name)
+                except TemplateSyntaxError as exc:
+                    failed[name] = exc
+                else:
+                    compiled.append(name)
+    return compiled, failed, time.perf_counter() - started
+
+
+def warm_templates_on_startup():
+    """Warm the template cache if TEMPLATE_WARMUP is on, logging templates that fail"""
+    if not getattr(settings, 'TEMPLATE_WARMUP', False):
+        return
+    compiled, failed, seconds = warm_templates()
+    for name, exc in failed.items():
+        logger.error("Template %s does not compile: %s", name, exc)
+    logger.info("Compiled %d templates in %.1f ms", len(compiled), seconds * 1000)
@@ -0,0 +1,15 @@
+# relationship_app/templatetags/thumbnails.py
+from django import template
+
+from relationship_app.thumbnails import thumbnail_url as _thumbnail_url
+
+register = template.Library()
+
+
+@register.filter
+def thumbnail_url(field_file, size):
+    """
+    Return the URL of a profile photo thumbnail.
+    Usage: {% load thumbnails %}<img src="{{ user.profile_photo|thumbnail_url:256 }}">
+    """
+    return _thumbnail_url(field_file, int(size))
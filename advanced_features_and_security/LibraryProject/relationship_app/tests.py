@@ -1,3 +1,1634 @@
-from django.test import TestCase
+import contextvars
+import csv
+import gzip
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.apps import apps
+from django.conf import settings
+from django.contrib.admin import site
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.template import engines
+from django.templatetags.static import static
+from django.db import OperationalError, connection
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.utils import timezone
+from PIL import Image
+
+from bookshelf.models import Book as ShelfBook
+
+from . import async_views, urls as relationship_app_urls, user_cache as user_cache_module
+from .admin import CustomUserAdmin
+from .admin_counts import CachedCountPaginator, count_cache, generation_key as count_generation_key
+from .catalog_loader import CatalogLoader
+from .dashboard import dashboard_stats
+from .database import PIN_COOKIE, PrimaryPinMiddleware, ReadWriteRouter, copy_sqlite
+from .exports import CatalogExport
+from .hashers import offload_hashing
+from .models import Author, Book, CatalogLoadCheckpoint, CustomUser, Library, UserProfile
+from .page_cache import CATALOG_SCOPE, fragment_cache, generation_key, stats as page_cache_stats
+from .roles import get_user_role, role_cache, role_cache_key
+from .sessions import SessionStore
+from .storage import IMMUTABLE_CACHE_CONTROL, ContentAddressedStorage
+from .synthetic import DatasetGenerator
+from .template_warmup import warm_templates
+from .thumbnails import THUMBNAIL_EXTENSION, thumbnail_name
+from .uploads import ProfilePhotoUploadHandler
+from .user_cache import UserCache, user_cache
+from .views import BOOKS_PER_PAGE, LIBRARIES_PER_PAGE, RECENT_BOOKS_PER_LIBRARY, USERS_PER_PAGE
+
+
+@contextmanager
+def serving_as(users):
+    """Serve the enclosed requests as a worker process whose user cache is `users`"""
+    previous, user_cache_module._user_cache = user_cache_module._user_cache, users
+    try:
+        yield
+    finally:
+        user_cache_module._user_cache = previous
+
+
+@contextmanager
+def uncached_sessions():
+    """Load every session and user from the database, bypassing both caches"""
+    caches_setting = {
+        **settings.CACHES,
+        settings.SESSION_CACHE_ALIAS: {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    }
+    with override_settings(CACHES=caches_setting), serving_as(UserCache(size=0, ttl=0)):
+        yield
+
+
+class ListBooksTests(TestCase):
+    """Keyset pagination of the /books/ catalog"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='reader-pass')
+        author = Author.objects.create(name='George Orwell')  # type: ignore
+        Book.objects.bulk_create(  # type: ignore
+            [Book(title=f"Book {i}", author=author) for i in range(BOOKS_PER_PAGE * 2 + 5)]
+        )
+
+    def setUp(self):
+        fragment_cache().clear()
+        self.client.force_login(self.user)
+
+    def test_first_page_is_limited_and_links_to_next(self):
+        response = self.client.get(reverse('list_books'))
+        books = response.context['page'].books
+        self.assertEqual(len(books), BOOKS_PER_PAGE)
+        self.assertEqual(response.context['page'].next_cursor, books[-1].pk)
+
+    def test_cursor_walks_the_whole_catalog_once(self):
+        seen, after = [], None
+        while True:
+            query = {} if after is None else {'after': after}
+            response = self.client.get(reverse('list_books'), query)
+            seen.extend(book.pk for book in response.context['page'].books)
+            after = response.context['page'].next_cursor
+            if after is None:
+                break
+        self.assertEqual(seen, list(Book.objects.order_by('pk').values_list('pk', flat=True)))  # type: ignore
+
+    @uncached_sessions()
+    def test_query_count_does_not_depend_on_page_depth(self):
+        last_pk = Book.objects.order_by('-pk').values_list('pk', flat=True).first()  # type: ignore
+        with self.assertNumQueries(3):  # session, user, one joined book query
+            self.client.get(reverse('list_books'))
+        with self.assertNumQueries(3):
+            self.client.get(reverse('list_books'), {'after': last_pk - 10})
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('list_books'), {'after': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+
+class LibraryDetailTests(TestCase):
+    """The library page runs a constant number of queries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='reader-pass')
+        cls.author = Author.objects.create(name='Harper Lee')  # type: ignore
+
+    def setUp(self):
+        fragment_cache().clear()
+        self.client.force_login(self.user)
+
+    def make_library(self, size):
+        library = Library.objects.create(name=f"Library of {size}")  # type: ignore
+        books = Book.objects.bulk_create(  # type: ignore
+            [Book(title=f"Book {i}", author=self.author) for i in range(size)]
+        )
+        library.books.add(*books)
+        return library
+
+    @uncached_sessions()
+    def test_query_count_is_independent_of_library_size(self):
+        for size in (0, 3, BOOKS_PER_PAGE * 4):
+            library = self.make_library(size)
+            # session, user, library, one query joining through table, books and authors
+            with self.subTest(size=size), self.assertNumQueries(4):
+                response = self.client.get(reverse('library_detail', args=[library.pk]))
+            self.assertEqual(len(response.context['page'].books), min(size, BOOKS_PER_PAGE))
+
+    def test_cursor_pages_through_library_books_only(self):
+        library = self.make_library(BOOKS_PER_PAGE + 2)
+        self.make_library(5)
+        url = reverse('library_detail', args=[library.pk])
+
+        first = self.client.get(url).context['page']
+        second = self.client.get(url, {'after': first.next_cursor}).context['page']
+
+        self.assertEqual(len(second.books), 2)
+        self.assertIsNone(second.next_cursor)
+        self.assertEqual(
+            [book.pk for book in first.books + second.books],
+            list(library.books.order_by('pk').values_list('pk', flat=True)),
+        )
+
+    def test_missing_library_is_404(self):
+        response = self.client.get(reverse('library_detail', args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+
+class BookCountTests(TestCase):
+    """Author.book_count and Library.book_count follow every ORM write"""
+
+    def setUp(self):
+        self.austen = Author.objects.create(name='Jane Austen')  # type: ignore
+        self.joyce = Author.objects.create(name='James Joyce')  # type: ignore
+        self.central = Library.objects.create(name='Central')  # type: ignore
+        self.branch = Library.objects.create(name='Branch')  # type: ignore
+        self.emma = Book.objects.create(title='Emma', author=self.austen)  # type: ignore
+        self.persuasion = Book.objects.create(title='Persuasion', author=self.austen)  # type: ignore
+
+    def counts(self):
+        return (
+            dict(Author.objects.values_list('name', 'book_count')),  # type: ignore
+            dict(Library.objects.values_list('name', 'book_count')),  # type: ignore
+        )
+
+    def assertCounts(self, authors, libraries):
+        self.assertEqual(self.counts(), (authors, libraries))
+
+    def test_books_are_counted_for_their_author(self):
+        self.assertCounts({'Jane Austen': 2, 'James Joyce': 0}, {'Central': 0, 'Branch': 0})
+        book = Book.objects.get(pk=self.emma.pk)  # type: ignore
+        book.author = self.joyce
+        book.save()
+        book.save()
+        self.assertCounts({'Jane Austen': 1, 'James Joyce': 1}, {'Central': 0, 'Branch': 0})
+
+    def test_memberships_are_counted_from_either_side(self):
+        self.central.books.add(self.emma, self.persuasion)
+        self.central.books.add(self.emma)
+        self.persuasion.library_set.add(self.branch)
+        self.assertCounts({'Jane Austen': 2, 'James Joyce': 0}, {'Central': 2, 'Branch': 1})
+
+        self.central.books.remove(self.emma, Book.objects.create(title='Ulysses', author=self.joyce))  # type: ignore
+        self.persuasion.library_set.remove(self.central, self.branch)
+        self.assertCounts({'Jane Austen': 2, 'James Joyce': 1}, {'Central': 0, 'Branch': 0})
+
+        self.central.books.set([self.emma, self.persuasion])
+        self.persuasion.library_set.set([self.central, self.branch])
+        self.assertCounts({'Jane Austen': 2, 'James Joyce': 1}, {'Central': 2, 'Branch': 1})
+
+        self.persuasion.library_set.clear()
+        self.assertCounts({'Jane Austen': 2, 'James Joyce': 1}, {'Central': 1, 'Branch': 0})
+        self.central.books.clear()
+        self.assertCounts({'Jane Austen': 2, 'James Joyce': 1}, {'Central': 0, 'Branch': 0})
+
+    def test_deleting_books_uncounts_them(self):
+        self.central.books.add(self.emma, self.persuasion)
+        self.branch.books.add(self.emma)
+        self.emma.delete()
+        self.assertCounts({'Jane Austen': 1, 'James Joyce': 0}, {'Central': 1, 'Branch': 0})
+        self.austen.delete()
+        self.assertCounts({'James Joyce': 0}, {'Central': 0, 'Branch': 0})
+
+    def test_saving_a_stale_instance_keeps_the_count(self):
+        stale = Library.objects.get(pk=self.central.pk)  # type: ignore
+        self.central.books.add(self.emma)
+        stale.name = 'Central Library'
+        stale.save()
+        self.assertEqual(Library.objects.get(pk=self.central.pk).book_count, 1)  # type: ignore
+
+    def test_recount_books_repairs_drift(self):
+        self.central.books.add(self.emma)
+        Author.objects.update(book_count=7)  # type: ignore
+        Library.books.through.objects.bulk_create([
+            Library.books.through(library_id=self.branch.pk, book_id=self.persuasion.pk),
+        ])
+        out = StringIO()
+        call_command('recount_books', batch_size=1, stdout=out)
+        self.assertIn('Author.book_count: corrected 2 rows', out.getvalue())
+        self.assertIn('Library.book_count: corrected 1 rows', out.getvalue())
+        self.assertCounts({'Jane Austen': 2, 'James Joyce': 0}, {'Central': 1, 'Branch': 1})
+
+    def test_library_page_reads_the_count(self):
+        self.central.books.add(self.emma, self.persuasion)
+        self.client.force_login(User.objects.create_user(username='reader', password='reader-pass'))
+        response = self.client.get(reverse('library_detail', args=[self.central.pk]))
+        self.assertContains(response, 'Books in Library (2):')
+
+
+class PageCacheTests(TestCase):
+    """Book lists are cached per page and retired by exactly the changes they show"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='reader-pass')
+        cls.author = Author.objects.create(name='Harper Lee')  # type: ignore
+        cls.book = Book.objects.create(title='To Kill a Mockingbird', author=cls.author)  # type: ignore
+        cls.other = Book.objects.create(title='Go Set a Watchman', author=cls.author)  # type: ignore
+        cls.holding = Library.objects.create(name='Holding')  # type: ignore
+        cls.holding.books.add(cls.book)
+        cls.unrelated = Library.objects.create(name='Unrelated')  # type: ignore
+        cls.unrelated.books.add(cls.other)
+
+    def setUp(self):
+        fragment_cache().clear()
+        self.client.force_login(self.user)
+        self.pages = {
+            'catalog': reverse('list_books'),
+            'holding': reverse('library_detail', args=[self.holding.pk]),
+            'unrelated': reverse('library_detail', args=[self.unrelated.pk]),
+        }
+        for url in self.pages.values():
+            self.client.get(url)
+
+    def cache_state(self):
+        return {name: self.client.get(url)['X-Page-Cache'] for name, url in self.pages.items()}
+
+    @uncached_sessions()
+    def test_repeat_visits_skip_the_book_queries(self):
+        with self.assertNumQueries(2):  # session, user
+            response = self.client.get(self.pages['catalog'])
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'To Kill a Mockingbird')
+        with self.assertNumQueries(3):  # session, user, library
+            self.client.get(self.pages['holding'])
+
+    def test_user_block_is_rendered_per_request(self):
+        other = User.objects.create_user(username='another', password='reader-pass')
+        self.client.force_login(other)
+        response = self.client.get(self.pages['catalog'])
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Welcome, another!')
+
+    def test_book_edit_retires_catalog_and_holding_library(self):
+        self.book.title = 'Mockingbird'
+        self.book.save()
+        self.assertEqual(self.cache_state(), {'catalog': 'miss', 'holding': 'miss', 'unrelated': 'hit'})
+        self.assertContains(self.client.get(self.pages['holding']), 'Mockingbird by Harper Lee')
+
+    def test_author_rename_retires_pages_showing_their_books(self):
+        self.author.name = 'Nelle Harper Lee'
+        self.author.save()
+        self.assertEqual(self.cache_state(), {'catalog': 'miss', 'holding': 'miss', 'unrelated': 'miss'})
+
+    def test_membership_changes_retire_only_the_library(self):
+        self.holding.books.add(self.other)
+        self.assertEqual(self.cache_state(), {'catalog': 'hit', 'holding': 'miss', 'unrelated': 'hit'})
+
+        self.other.library_set.remove(self.unrelated)
+        self.assertEqual(self.cache_state(), {'catalog': 'hit', 'holding': 'hit', 'unrelated': 'miss'})
+        self.assertContains(self.client.get(self.pages['unrelated']), 'No books available')
+
+    def test_book_delete_retires_catalog_and_holding_library(self):
+        self.book.delete()
+        self.assertEqual(self.cache_state(), {'catalog': 'miss', 'holding': 'miss', 'unrelated': 'hit'})
+
+    def test_bulk_loads_retire_the_pages_they_touch(self):
+        list(CatalogLoader().load([{'title': 'New', 'author': 'Someone', 'libraries': ['Holding']}]))
+        self.assertEqual(self.cache_state(), {'catalog': 'miss', 'holding': 'miss', 'unrelated': 'hit'})
+
+    def test_evicted_counters_do_not_revive_stale_pages(self):
+        self.book.title = 'Mockingbird'
+        self.book.save()
+        self.client.get(self.pages['catalog'])
+        # The fragment cache culls counters like any other entry
+        fragment_cache().delete(generation_key(CATALOG_SCOPE))
+        response = self.client.get(self.pages['catalog'])
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Mockingbird by Harper Lee')
+
+    def test_tests_never_touch_the_cache_directory(self):
+        # Clearing the caches above must not wipe a running server's files
+        for alias in settings.CACHES:
+            self.assertIsInstance(caches[alias], LocMemCache, alias)
+
+    def test_hits_and_misses_are_counted(self):
+        page_cache_stats.reset()
+        self.client.get(self.pages['catalog'])
+        self.book.save()
+        self.client.get(self.pages['catalog'])
+        snapshot = page_cache_stats.snapshot()
+        self.assertEqual((snapshot['hits'], snapshot['misses'], snapshot['hit_rate']), (1, 1, 0.5))
+
+
+class RoleViewTests(TestCase):
+    """Role checks resolve the profile with the user in a single query"""
+
+    def setUp(self):
+        fragment_cache().clear()
+
+    def make_user(self, role):
+        user = User.objects.create_user(username=role.lower(), password='role-pass')
+        user.userprofile.role = role
+        user.userprofile.save()
+        return user
+
+    @uncached_sessions()
+    def test_role_views_run_one_user_query(self):
+        for view, role, queries in (
+            ('admin_view', 'Admin', 5),  # session, user + profile, users page, statistics, largest libraries
+            ('librarian_view', 'Librarian', 4),  # session, user + profile, books, libraries (none yet)
+            ('member_view', 'Member', 4),
+        ):
+            self.client.force_login(self.make_user(role))
+            with self.subTest(view=view), self.assertNumQueries(queries):
+                response = self.client.get(reverse(view))
+            self.assertEqual(response.status_code, 200)
+
+    def test_other_roles_are_redirected(self):
+        self.client.force_login(self.make_user('Member'))
+        response = self.client.get(reverse('admin_view'))
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(ROLE_CACHE_TIMEOUT=60)
+    def test_cached_role_is_invalidated_on_profile_save(self):
+        user = self.make_user('Member')
+        self.assertEqual(get_user_role(User.objects.get(pk=user.pk)), 'Member')
+
+        user.userprofile.role = 'Librarian'
+        user.userprofile.save()
+        self.assertEqual(get_user_role(User.objects.get(pk=user.pk)), 'Librarian')
+
+    @override_settings(ROLE_CACHE_TIMEOUT=60)
+    def test_roles_are_cached_where_every_worker_sees_the_eviction(self):
+        user = self.make_user('Admin')
+        get_user_role(User.objects.get(pk=user.pk))
+        self.assertEqual(caches['shared'].get(role_cache_key(user.pk)), 'Admin')
+        self.assertIsNone(caches['default'].get(role_cache_key(user.pk)))
+
+        user.userprofile.role = 'Member'
+        user.userprofile.save()
+        self.assertIsNone(caches['shared'].get(role_cache_key(user.pk)))
+
+
+@override_settings(
+    PASSWORD_HASHERS=[
+        'relationship_app.hashers.TunedScryptPasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    ],
+    PASSWORD_SCRYPT_WORK_FACTOR=2 ** 10,
+)
+class PasswordHashingTests(TestCase):
+    """Passwords are hashed with the configured policy and upgraded on login"""
+
+    credentials = {'username': 'reader', 'password': 'reader-pass'}
+
+    def log_in(self):
+        response = self.client.post(reverse('login'), self.credentials)
+        self.assertEqual(response.status_code, 302)
+        return User.objects.get(username='reader').password
+
+    def test_new_passwords_use_the_tuned_hasher(self):
+        user = User.objects.create_user(**self.credentials)
+        self.assertTrue(user.password.startswith('scrypt$1024$'))
+
+    def test_login_upgrades_a_legacy_hash(self):
+        user = User.objects.create_user(username='reader')
+        user.password = make_password(self.credentials['password'], hasher='pbkdf2_sha256')
+        user.save()
+        self.assertTrue(self.log_in().startswith('scrypt$1024$'))
+        self.client.logout()
+        self.assertTrue(self.log_in().startswith('scrypt$1024$'))
+
+    def test_login_rehashes_when_the_cost_changes(self):
+        User.objects.create_user(**self.credentials)
+        with self.settings(PASSWORD_SCRYPT_WORK_FACTOR=2 ** 11, PASSWORD_HASHERS=[
+            'relationship_app.hashers.TunedScryptPasswordHasher',
+        ]):
+            self.assertTrue(self.log_in().startswith('scrypt$2048$'))
+
+    def test_offloaded_views_run_in_the_hashing_pool(self):
+        def view(request):
+            return HttpResponse(threading.current_thread().name)
+
+        self.assertIs(offload_hashing(view), view)
+        with self.settings(PASSWORD_HASHING_OFFLOAD=True):
+            offloaded = offload_hashing(view)
+        response = async_to_sync(offloaded)(RequestFactory().get('/'))
+        self.assertTrue(response.content.startswith(b'password-hashing'))
+
+
+class DashboardTests(TestCase):
+    """Admin dashboard statistics come from one cached query; the user table is paginated"""
+
+    def setUp(self):
+        fragment_cache().clear()
+        self.admin = User.objects.create_user(username='admin', password='admin-pass')
+        self.admin.userprofile.role = 'Admin'
+        self.admin.userprofile.save()
+
+    def make_users(self, count, prefix='user'):
+        for i in range(count):
+            User.objects.create_user(username=f"{prefix}{i}")
+
+    def test_statistics_are_two_queries_then_cached(self):
+        author = Author.objects.create(name="Author")
+        library = Library.objects.create(name="Central")
+        Library.objects.create(name="Empty")
+        library.books.add(*[Book.objects.create(title=f"Book {i}", author=author) for i in range(3)])
+        self.make_users(2)
+
+        with self.assertNumQueries(2):  # totals and roles, largest libraries
+            stats = dashboard_stats()
+        self.assertEqual(stats['totals'], {'users': 3, 'books': 3, 'libraries': 2})
+        self.assertEqual(stats['roles'], {'Admin': 1, 'Librarian': 0, 'Member': 2})
+        self.assertEqual([(row['name'], row['books']) for row in stats['libraries']], [('Central', 3), ('Empty', 0)])
+        with self.assertNumQueries(0):
+            dashboard_stats()
+
+    @override_settings(DASHBOARD_TOP_LIBRARIES=2)
+    def test_only_the_largest_libraries_are_read(self):
+        author = Author.objects.create(name="Author")
+        for size in range(5):
+            library = Library.objects.create(name=f"Library {size}")
+            library.books.add(*[Book.objects.create(title=f"Book {i}", author=author) for i in range(size)])
+        with CaptureQueriesContext(connection) as queries:
+            stats = dashboard_stats()
+        self.assertEqual([(row['name'], row['books']) for row in stats['libraries']], [('Library 4', 4), ('Library 3', 3)])
+        [library_query] = [q['sql'] for q in queries if 'ORDER BY' in q['sql']]
+        self.assertTrue(library_query.endswith('LIMIT 2'))
+
+    def test_writes_retire_the_statistics_but_logins_do_not(self):
+        dashboard_stats()
+        self.client.force_login(self.admin)
+        with self.assertNumQueries(0):
+            dashboard_stats()
+
+        for write in (
+            lambda: User.objects.create_user(username='new'),
+            lambda: Library.objects.create(name="Branch"),
+            lambda: Library.objects.get(name="Branch").books.add(
+                Book.objects.create(title="Book", author=Author.objects.create(name="Author"))
+            ),
+        ):
+            write()
+            with self.assertNumQueries(2):
+                dashboard_stats()
+
+        profile = UserProfile.objects.get(user__username='new')  # type: ignore
+        profile.role = 'Librarian'
+        profile.save()
+        self.assertEqual(dashboard_stats()['roles']['Librarian'], 1)
+
+    def test_user_table_is_paginated_by_cursor(self):
+        self.make_users(USERS_PER_PAGE + 5)
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin_view'))
+        self.assertEqual(len(response.context['users']), USERS_PER_PAGE)
+        self.assertContains(response, f"?after={response.context['next_cursor']}")
+
+        response = self.client.get(reverse('admin_view'), {'after': response.context['next_cursor']})
+        self.assertEqual(len(response.context['users']), 6)
+        self.assertIsNone(response.context['next_cursor'])
+        self.assertEqual(self.client.get(reverse('admin_view'), {'after': 'x'}).status_code, 400)
+
+    @uncached_sessions()
+    def test_query_count_does_not_depend_on_user_count(self):
+        self.client.force_login(self.admin)
+        counts = []
+        for batch in (1, 60):
+            self.make_users(batch, prefix=f"batch{batch}-")
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse('admin_view'))
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class RoleDashboardTests(TestCase):
+    """Librarian and member dashboards summarise libraries in a fixed number of queries"""
+
+    views = (('librarian_view', 'Librarian'), ('member_view', 'Member'))
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {}
+        for view, role in cls.views:
+            user = User.objects.create_user(username=role.lower(), password='role-pass')
+            user.userprofile.role = role
+            user.userprofile.save()
+            cls.users[view] = user
+
+    def seed(self, books, libraries=3, authors=7):
+        """Add `books` books spread over `authors` new authors and `libraries` new libraries"""
+        authors = Author.objects.bulk_create([Author(name=f"Author {i}") for i in range(authors)])  # type: ignore
+        created = Book.objects.bulk_create(  # type: ignore
+            [Book(title=f"Book {i}", author=authors[i % len(authors)]) for i in range(books)]
+        )
+        libraries = Library.objects.bulk_create(  # type: ignore
+            [Library(name=f"Library {i}") for i in range(libraries)]
+        )
+        Membership = Library.books.through
+        Membership.objects.bulk_create([
+            Membership(library_id=library.pk, book_id=book.pk)
+            for offset, library in enumerate(libraries)
+            for book in created[offset::len(libraries)]
+        ])
+        Library.objects.recount_books()  # type: ignore
+        return libraries
+
+    @uncached_sessions()
+    def test_query_count_does_not_depend_on_catalog_size(self):
+        libraries = []
+        for size in (10, 10_000):
+            libraries += self.seed(size - Book.objects.count())  # type: ignore
+            for view, _ in self.views:
+                self.client.force_login(self.users[view])
+                # session, user + profile, books page, libraries page, recent books
+                with self.subTest(size=size, view=view), self.assertNumQueries(5):
+                    response = self.client.get(reverse(view))
+                self.assertEqual(len(response.context['books']), min(size, BOOKS_PER_PAGE))
+                # ... and the drill-down adds the selected library
+                with self.subTest(size=size, view=view, library=True), self.assertNumQueries(6):
+                    self.client.get(reverse(view), {'library': libraries[-1].pk, 'after': 1})
+
+    def test_libraries_are_summarised_with_their_newest_books(self):
+        first, second, empty = self.seed(10, libraries=2) + [Library.objects.create(name="Empty")]  # type: ignore
+        self.client.force_login(self.users['librarian_view'])
+        libraries = self.client.get(reverse('librarian_view')).context['libraries']
+
+        self.assertEqual([library.pk for library in libraries], [first.pk, second.pk, empty.pk])
+        self.assertEqual([(library.book_count, library.author_count) for library in libraries], [(5, 5), (5, 5), (0, 0)])
+        newest = list(first.books.order_by('-pk').values_list('pk', flat=True)[:RECENT_BOOKS_PER_LIBRARY])
+        self.assertEqual([book.pk for book in libraries[0].recent_books], newest)
+        self.assertEqual(libraries[2].recent_books, [])
+
+    def test_libraries_and_drill_down_are_paginated(self):
+        libraries = self.seed(BOOKS_PER_PAGE * 2, libraries=LIBRARIES_PER_PAGE + 1)
+        self.client.force_login(self.users['member_view'])
+        response = self.client.get(reverse('member_view'))
+        self.assertEqual(len(response.context['libraries']), LIBRARIES_PER_PAGE)
+        response = self.client.get(reverse('member_view'), {'libraries_after': response.context['next_libraries_cursor']})
+        self.assertEqual([library.pk for library in response.context['libraries']], [libraries[-1].pk])
+
+        library = libraries[0]
+        response = self.client.get(reverse('member_view'), {'library': library.pk})
+        self.assertEqual(response.context['selected_library'], library)
+        self.assertEqual(
+            [book.pk for book in response.context['books']],
+            list(library.books.order_by('pk').values_list('pk', flat=True)),
+        )
+
+    def test_bad_parameters(self):
+        self.client.force_login(self.users['member_view'])
+        self.assertEqual(self.client.get(reverse('member_view'), {'library': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('member_view'), {'library': 999999}).status_code, 404)
+
+
+# The relationship_app URLs with ASYNC_VIEWS on
+ASYNC_PAGES = {
+    'list_books': async_views.list_books,
+    'library_detail': async_views.library_detail,
+    'admin_view': async_views.admin_view,
+    'librarian_view': async_views.librarian_view,
+    'member_view': async_views.member_view,
+}
+
+
+class AsyncURLConf:
+    urlpatterns = [
+        path(str(pattern.pattern), ASYNC_PAGES[pattern.name], name=pattern.name)
+        if pattern.name in ASYNC_PAGES else pattern
+        for pattern in relationship_app_urls.urlpatterns
+    ]
+
+
+class AsyncViewTests(TestCase):
+    """The async views render what the sync views do, in the same number of queries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {}
+        for role in ('Admin', 'Librarian', 'Member'):
+            user = User.objects.create_user(username=role.lower(), password='role-pass')
+            user.userprofile.role = role
+            user.userprofile.save()
+            cls.users[role] = user
+        author = Author.objects.create(name='Jane Austen')  # type: ignore
+        cls.library = Library.objects.create(name='Central')  # type: ignore
+        cls.library.books.add(*[
+            Book.objects.create(title=f"Book {i}", author=author) for i in range(BOOKS_PER_PAGE + 5)  # type: ignore
+        ])
+
+    def setUp(self):
+        fragment_cache().clear()
+        cache.clear()
+
+    def pages(self):
+        return (
+            ('Member', reverse('list_books')),
+            ('Member', reverse('list_books') + f"?after={Book.objects.order_by('pk')[3].pk}"),  # type: ignore
+            ('Member', reverse('library_detail', args=[self.library.pk])),
+            ('Admin', reverse('admin_view')),
+            ('Librarian', reverse('librarian_view')),
+            ('Member', reverse('member_view') + f"?library={self.library.pk}"),
+        )
+
+    def test_async_pages_match_sync_pages(self):
+        for role, url in self.pages():
+            self.client.force_login(self.users[role])
+            self.async_client.force_login(self.users[role])
+            with self.subTest(url=url):
+                fragment_cache().clear()
+                sync_miss = self.client.get(url)
+                fragment_cache().clear()
+                with override_settings(ROOT_URLCONF=AsyncURLConf):
+                    async_miss = async_to_sync(self.async_client.get)(url)
+                    # A cached fragment is printed by the view, not looked up by the template
+                    async_hit = async_to_sync(self.async_client.get)(url)
+                self.assertEqual(async_miss.status_code, 200)
+                self.assertEqual(async_miss.content, sync_miss.content)
+                self.assertEqual(async_hit.content, sync_miss.content)
+
+    @override_settings(ROOT_URLCONF=AsyncURLConf)
+    @uncached_sessions()
+    def test_query_counts_match_sync_views(self):
+        get = async_to_sync(self.async_client.get)
+        for role, url, queries in (
+            ('Member', reverse('list_books'), 3),  # session, user, books
+            ('Member', reverse('library_detail', args=[self.library.pk]), 4),  # ... library, books
+            ('Librarian', reverse('librarian_view'), 5),  # session, user + profile, books, libraries, recent
+        ):
+            self.async_client.force_login(self.users[role])
+            with self.subTest(url=url), self.assertNumQueries(queries):
+                response = get(url)
+            self.assertEqual(response.status_code, 200)
+        self.async_client.force_login(self.users['Member'])
+        with self.assertNumQueries(2):
+            response = get(reverse('list_books'))
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+
+    @override_settings(ROOT_URLCONF=AsyncURLConf)
+    async def test_access_checks(self):
+        response = await self.async_client.get(reverse('list_books'))
+        self.assertEqual(response.status_code, 302)
+        await self.async_client.aforce_login(self.users['Member'])
+        response = await self.async_client.get(reverse('admin_view'))
+        self.assertEqual(response.status_code, 302)
+        response = await self.async_client.get(reverse('library_detail', args=[999]))
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.get(reverse('member_view'), {'after': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+
+class DatabaseTuningTests(TestCase):
+    """SQLite connections get the tuning pragmas, and read connections cannot write"""
+    databases = {'default', 'read'}
+
+    def pragma(self, connection, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_to_new_connections(self):
+        self.assertEqual(self.pragma(connection, 'synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma(connection, 'busy_timeout'), 5000)
+        self.assertEqual(self.pragma(connection, 'cache_size'), -64000)
+        self.assertEqual(self.pragma(connection, 'query_only'), 0)
+
+    def test_read_connections_use_wal_and_are_query_only(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_dict = {**connection.settings_dict, 'NAME': os.path.join(directory, 'db.sqlite3')}
+        writer = SQLiteDatabaseWrapper(settings_dict, alias='default')
+        reader = SQLiteDatabaseWrapper(settings_dict, alias='read')
+        self.addCleanup(writer.close)
+        self.addCleanup(reader.close)
+        with writer.cursor() as cursor:
+            cursor.execute('CREATE TABLE t (id integer)')
+        self.assertEqual(self.pragma(reader, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(reader, 'query_only'), 1)
+        with self.assertRaises(OperationalError), reader.cursor() as cursor:
+            cursor.execute('INSERT INTO t VALUES (1)')
+
+    def test_reads_stay_on_default_inside_transactions(self):
+        router = ReadWriteRouter()
+        self.assertEqual(router.db_for_read(Book), 'default')  # TestCase holds a transaction
+        self.assertEqual(router.db_for_write(Book), 'default')
+
+
+class ReadWriteRouterTests(SimpleTestCase):
+    """Outside transactions reads go to the read aliases, and catalog reads to replicas until a catalog write"""
+
+    def test_routing(self):
+        router = ReadWriteRouter()
+        self.assertEqual(router.db_for_read(Book), 'read')
+        self.assertEqual(router.db_for_read(Book, instance=Book(title='x')), 'read')
+        book = Book(title='x')
+        book._state.db = 'default'
+        self.assertEqual(router.db_for_read(Author, instance=book), 'default')
+        self.assertTrue(router.allow_migrate('default', 'relationship_app'))
+        self.assertFalse(router.allow_migrate('read', 'relationship_app'))
+        with override_settings(DATABASE_READ_ALIASES=['replica']):  # not in DATABASES
+            self.assertEqual(router.db_for_read(Book), 'default')
+
+    @override_settings(DATABASE_READ_ALIASES=[], DATABASE_REPLICAS=['read'])
+    def test_catalog_writes_pin_reads_to_the_primary(self):
+        def route():
+            router = ReadWriteRouter()
+            routes = [router.db_for_read(Book), router.db_for_read(User)]
+            router.db_for_write(User)  # not replicated: no pin
+            routes.append(router.db_for_read(Library.books.through))
+            router.db_for_write(Book)
+            routes.append(router.db_for_read(Book))
+            with override_settings(REPLICA_PIN_SECONDS=0):
+                router.db_for_write(Author)
+            routes.append(router.db_for_read(Book))
+            return routes
+
+        # Run in a copy of the context, so the pin stays in this test
+        self.assertEqual(contextvars.copy_context().run(route), ['read', 'default', 'read', 'default', 'read'])
+
+    @override_settings(DATABASE_READ_ALIASES=[], DATABASE_REPLICAS=['read'])
+    def test_middleware_carries_the_pin_in_a_cookie(self):
+        router = ReadWriteRouter()
+        factory = RequestFactory()
+        reads = []
+
+        def write_book(request):
+            router.db_for_write(Book)
+            return HttpResponse()
+
+        def read_book(request):
+            reads.append(router.db_for_read(Book))
+            return HttpResponse()
+
+        def request_with(view, cookie=None):
+            request = factory.get('/')
+            if cookie is not None:
+                request.COOKIES[PIN_COOKIE] = cookie
+            return contextvars.copy_context().run(PrimaryPinMiddleware(view), request)
+
+        cookie = request_with(write_book).cookies[PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], 5)
+        self.assertTrue(cookie['httponly'])
+        self.assertNotIn(PIN_COOKIE, request_with(read_book, cookie.value).cookies)  # not renewed by reads
+        request_with(read_book)
+        request_with(read_book, 'garbage')
+        self.assertEqual(reads, ['default', 'read', 'read'])
+
+    def test_copy_sqlite_refreshes_open_replicas(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        primary, replica = os.path.join(directory, 'db.sqlite3'), os.path.join(directory, 'replica.sqlite3')
+        writer = sqlite3.connect(primary)
+        self.addCleanup(writer.close)
+        writer.execute('CREATE TABLE t (id integer)')
+        writer.commit()
+        copy_sqlite(primary, [replica])
+        reader = sqlite3.connect(replica)
+        self.addCleanup(reader.close)
+        self.assertEqual(reader.execute('SELECT count(*) FROM t').fetchone()[0], 0)
+        writer.execute('INSERT INTO t VALUES (1)')
+        writer.commit()
+        self.assertEqual(reader.execute('SELECT count(*) FROM t').fetchone()[0], 0)  # lagging
+        copy_sqlite(primary, [replica])
+        self.assertEqual(reader.execute('SELECT count(*) FROM t').fetchone()[0], 1)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_sync_replicas_needs_replicas(self):
+        with self.assertRaisesMessage(CommandError, "No DATABASE_REPLICAS configured"):
+            call_command('sync_replicas')
+
+
+class SessionTests(TestCase):
+    """Sessions are read from the cache and saved only when changed; users are cached per session"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='reader-pass')
+
+    def setUp(self):
+        fragment_cache().clear()
+        user_cache().clear()
+
+    def test_unchanged_sessions_are_not_saved(self):
+        session = SessionStore()
+        session['cart'] = [1, 2]
+        session.save()
+        session = SessionStore(session.session_key)
+        with self.assertNumQueries(0):
+            session['cart'] = [1, 2]  # loaded from the cache
+            session.save()
+        session['cart'].append(3)
+        session.save()
+        self.assertEqual(SessionStore().decode(Session.objects.get().session_data), {'cart': [1, 2, 3]})
+
+    @override_settings(SESSION_SAVE_EVERY_REQUEST=True)
+    def test_every_request_saves_push_the_expiry_forward(self):
+        session = SessionStore()
+        session['cart'] = [1, 2]
+        session.save()
+        Session.objects.update(expire_date=timezone.now() + timedelta(minutes=1))
+        session = SessionStore(session.session_key)
+        session['cart'] = [1, 2]
+        session.save()
+        self.assertGreater(Session.objects.get().expire_date, timezone.now() + timedelta(days=1))
+
+    @override_settings(SESSION_CLEANUP_BATCH_SIZE=2)
+    def test_clearsessions_deletes_expired_sessions_in_batches(self):
+        now = timezone.now()
+        Session.objects.bulk_create([
+            Session(session_key=f"key{i}", session_data='', expire_date=now + timedelta(days=-1 if i < 5 else 1))
+            for i in range(7)
+        ])
+        with CaptureQueriesContext(connection) as queries:
+            call_command('clearsessions')
+        self.assertEqual(sorted(Session.objects.values_list('pk', flat=True)), ['key5', 'key6'])
+        self.assertEqual(sum(query['sql'].startswith('DELETE') for query in queries), 3)
+
+    def test_users_are_cached_per_session_until_they_change(self):
+        self.client.force_login(self.user)
+        url = reverse('list_books')
+        with self.assertNumQueries(2):  # the user, joined with its profile; books
+            self.client.get(url)
+        with self.assertNumQueries(0):  # the page is cached too
+            self.client.get(url)
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        self.client.force_login(self.user)  # a new session key
+        with self.assertNumQueries(1):
+            self.client.get(url)
+
+    def test_cached_sessions_and_users_save_two_queries_per_request(self):
+        library = Library.objects.create(name='Branch')  # type: ignore
+        self.client.force_login(self.user)
+        for url in (reverse('list_books'), reverse('library_detail', args=[library.pk]), reverse('member_view')):
+            with self.subTest(url=url):
+                self.client.get(url)  # fills the page, session and user caches
+                with uncached_sessions(), CaptureQueriesContext(connection) as uncached:
+                    self.client.get(url)
+                with CaptureQueriesContext(connection) as cached:
+                    self.client.get(url)
+                self.assertEqual(len(uncached) - len(cached), 2)  # session, user
+
+    @override_settings(ROOT_URLCONF=AsyncURLConf)
+    def test_async_requests_share_the_caches(self):
+        get = async_to_sync(self.async_client.get)
+        self.async_client.force_login(self.user)
+        get(reverse('list_books'))
+        with self.assertNumQueries(0):
+            response = get(reverse('list_books'))
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+
+    def test_user_cache_is_a_bounded_lru_with_expiry(self):
+        users = UserCache(size=2, ttl=60)
+        for key in ('a', 'b'):
+            users.set(key, self.user)
+        users.get('a')
+        users.set('c', self.user)
+        self.assertIsNone(users.get('b'))  # least recently used
+        self.assertEqual(users.get('a'), self.user)
+        self.assertIsNot(users.get('a'), users.get('a'))  # a copy per request
+        users.forget(self.user.pk)
+        self.assertIsNone(users.get('c'))
+        expiring = UserCache(size=2, ttl=0)
+        expiring.set('a', self.user)
+        self.assertIsNone(expiring.get('a'))
+
+
+    @override_settings(ROLE_CACHE_TIMEOUT=300)
+    def test_demotion_in_one_worker_reaches_every_worker(self):
+        admin = User.objects.create_user(username='admin', password='admin-pass')
+        admin.userprofile.role = 'Admin'
+        admin.userprofile.save()
+        self.client.force_login(admin)
+        stale, demoting, fresh = (UserCache(size=10, ttl=60) for _ in range(3))
+
+        with serving_as(stale):  # caches the user, loaded with its profile
+            self.assertEqual(self.client.get(reverse('admin_view')).status_code, 200)
+        with serving_as(demoting):
+            profile = UserProfile.objects.get(user=admin)  # type: ignore
+            profile.role = 'Member'
+            profile.save()
+        for name, worker in (('stale', stale), ('fresh', fresh)):
+            with self.subTest(worker=name), serving_as(worker):
+                self.assertEqual(self.client.get(reverse('admin_view')).status_code, 302)
+        self.assertEqual(role_cache().get(role_cache_key(admin.pk)), 'Member')
+
+class CustomUserModelTests(SimpleTestCase):
+    """The app loads with its own user model installed"""
+
+    def test_setup_with_custom_user_model(self):
+        # The app registry is already loaded here, so set up a fresh interpreter
+        script = (
+            "import os, sys, types, django\n"
+            "module = types.ModuleType('custom_user_settings')\n"
+            "exec(f\"from {os.environ['DJANGO_SETTINGS_MODULE']} import *\", module.__dict__)\n"
+            "module.AUTH_USER_MODEL = 'relationship_app.CustomUser'\n"
+            "sys.modules[module.__name__] = module\n"
+            "os.environ['DJANGO_SETTINGS_MODULE'] = module.__name__\n"
+            "django.setup()\n"
+            "from django.contrib.auth import get_user_model\n"
+            "print(get_user_model()._meta.label)\n"
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), 'relationship_app.CustomUser')
+
+
+class UserProfileLifecycleTests(TestCase):
+    """Profiles are written once, on user creation only"""
+
+    def test_new_user_gets_exactly_one_profile_insert(self):
+        with self.assertNumQueries(2):  # user insert, profile insert
+            user = User.objects.create(username='new')
+        self.assertEqual(user.userprofile.role, 'Member')
+
+    def test_login_update_does_not_write_profile(self):
+        user = User.objects.create_user(username='returning', password='returning-pass')
+        with self.assertNumQueries(1):
+            user.save(update_fields=['last_login'])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(self.client.login(username='returning', password='returning-pass'))
+        self.assertFalse([q for q in queries if 'relationship_app_userprofile' in q['sql']])
+
+    def test_create_missing_backfills_bulk_created_users(self):
+        User.objects.bulk_create([User(username=f"imported-{i}") for i in range(5)])
+        self.assertEqual(UserProfile.objects.create_missing(batch_size=2), 5)  # type: ignore
+        self.assertEqual(UserProfile.objects.create_missing(), 0)  # type: ignore
+        self.assertFalse(User.objects.filter(userprofile__isnull=True).exists())
+
+
+    def test_create_missing_counts_only_profiles_it_created(self):
+        User.objects.bulk_create([User(username=f"imported-{i}") for i in range(3)])
+        first = User.objects.get(username='imported-0')
+        signed_up = []
+
+        def concurrent_profile(execute, sql, params, many, context):
+            # Another process creates a profile after the backfill listed its user
+            if not signed_up and sql.startswith('SELECT COUNT(*)') and 'relationship_app_userprofile' in sql:
+                signed_up.append(first)
+                UserProfile.objects.bulk_create([UserProfile(user=first)])  # type: ignore
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(concurrent_profile):
+            self.assertEqual(UserProfile.objects.create_missing(), 2)  # type: ignore
+        self.assertFalse(User.objects.filter(userprofile__isnull=True).exists())
+
+class CatalogLoaderTests(TestCase):
+    """Bulk catalog ingestion"""
+
+    rows = [
+        {'title': 'Emma', 'author': 'Jane Austen', 'libraries': ['Central']},
+        {'title': 'Persuasion', 'author': 'Jane Austen', 'libraries': ['Central', 'Branch']},
+        {'title': 'Ulysses', 'author': 'James Joyce'},
+    ]
+
+    def test_authors_and_libraries_are_deduplicated(self):
+        Author.objects.create(name='James Joyce')  # type: ignore
+        loader = CatalogLoader(batch_size=2)
+        self.assertEqual(list(loader.load(self.rows)), [2, 1])
+
+        self.assertEqual(Author.objects.count(), 2)  # type: ignore
+        self.assertEqual(Book.objects.count(), 3)  # type: ignore
+        central = Library.objects.get(name='Central')  # type: ignore
+        self.assertQuerySetEqual(central.books.order_by('title'), ['Emma', 'Persuasion'], transform=lambda book: book.title)
+
+    def test_each_chunk_is_a_constant_number_of_queries(self):
+        loader = CatalogLoader(batch_size=len(self.rows))
+        # savepoint, authors, libraries, books, memberships, author and library counts, release
+        with self.assertNumQueries(8):
+            list(loader.load(self.rows))
+        self.assertEqual(
+            sorted(Author.objects.values_list('name', 'book_count')),  # type: ignore
+            [('James Joyce', 1), ('Jane Austen', 2)],
+        )
+        self.assertEqual(
+            sorted(Library.objects.values_list('name', 'book_count')),  # type: ignore
+            [('Branch', 1), ('Central', 2)],
+        )
+
+
+    def test_checkpoint_advances_with_its_chunk(self):
+        checkpoint = CatalogLoadCheckpoint.objects.create(source='catalog.jsonl')  # type: ignore
+        rows = [*self.rows, {'title': 'No author'}]  # fails the second chunk
+        with self.assertRaises(KeyError):
+            list(CatalogLoader(batch_size=2).load(rows, checkpoint))
+        checkpoint.refresh_from_db()
+        self.assertEqual(checkpoint.rows, 2)
+        self.assertEqual(Book.objects.count(), 2)  # type: ignore
+
+    def test_load_catalog_resumes_after_committed_rows(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'catalog.jsonl')
+        with open(path, 'w') as handle:
+            handle.writelines(json.dumps(row) + '\n' for row in self.rows[:2])
+        call_command('load_catalog', path, batch_size=2, stdout=StringIO())
+
+        with open(path, 'a') as handle:
+            handle.write(json.dumps(self.rows[2]) + '\n')
+        call_command('load_catalog', path, batch_size=2, stdout=StringIO())
+        self.assertEqual(Book.objects.count(), 3)  # type: ignore
+        self.assertEqual(Library.objects.get(name='Central').book_count, 2)  # type: ignore
+
+        call_command('load_catalog', path, restart=True, stdout=StringIO())
+        self.assertEqual(Book.objects.count(), 6)  # type: ignore
+
+class ExportTests(TestCase):
+    """Catalog exports stream every row once, resumably, and only to admins"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='admin-pass')
+        cls.admin.userprofile.role = 'Admin'
+        cls.admin.userprofile.save()
+        cls.member = User.objects.create_user(username='member', password='member-pass')
+        author = Author.objects.create(name='Brontë, Charlotte')  # type: ignore
+        cls.books = [Book.objects.create(title=f"Book {i}", author=author) for i in range(7)]  # type: ignore
+
+    def rows(self, content):
+        return list(csv.reader(StringIO(content.decode())))
+
+    def test_csv_and_jsonl(self):
+        export = CatalogExport('books', chunk_size=3)
+        with self.assertNumQueries(3):  # windows of 3, 3 and 1 rows
+            rows = self.rows(b''.join(export))
+        self.assertEqual(rows[0], ['id', 'title', 'author_id', 'author'])
+        self.assertEqual(rows[1], [str(self.books[0].pk), 'Book 0', str(self.books[0].author_id), 'Brontë, Charlotte'])
+        self.assertEqual(len(rows), 8)
+        self.assertEqual((export.rows, export.last_pk), (7, self.books[-1].pk))
+
+        lines = b''.join(CatalogExport('books', 'jsonl', chunk_size=7)).decode().splitlines()
+        self.assertEqual(len(lines), 7)
+        self.assertEqual(json.loads(lines[6])['title'], 'Book 6')
+
+    def test_after_and_until_resume_without_header(self):
+        pks = [book.pk for book in self.books]
+        rows = self.rows(b''.join(CatalogExport('books', after=pks[1], until=pks[4], chunk_size=2)))
+        self.assertEqual([int(row[0]) for row in rows], pks[2:5])
+
+    def test_view_streams_gzip_to_admins_only(self):
+        url = reverse('export_catalog', args=['books', 'csv'])
+        self.client.force_login(self.member)
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(self.admin)
+        response = self.client.get(url, {'after': self.books[4].pk}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="books.csv"')
+        rows = self.rows(gzip.decompress(b''.join(response.streaming_content)))
+        self.assertEqual([row[1] for row in rows], ['Book 5', 'Book 6'])
+
+        self.assertEqual(self.client.get(reverse('export_catalog', args=['users', 'csv'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('export_catalog', args=['books', 'xml'])).status_code, 404)
+        self.assertEqual(self.client.get(url, {'after': 'x'}).status_code, 400)
+
+    async def test_asgi_streams_an_async_iterator(self):
+        await self.async_client.aforce_login(self.admin)
+        url = reverse('export_catalog', args=['books', 'jsonl'])
+        for accept, decode in (('', bytes), ('gzip', gzip.decompress)):
+            response = await self.async_client.get(url, headers={'Accept-Encoding': accept})
+            self.assertTrue(response.is_async)
+            content = decode(b''.join([chunk async for chunk in response.streaming_content]))
+            self.assertEqual(len(content.splitlines()), 7)
+
+    def test_command_writes_gzipped_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        output = os.path.join(directory, 'authors.jsonl.gz')
+        stderr = StringIO()
+        call_command('export_catalog', 'authors', format='jsonl', output=output, stderr=stderr)
+        with gzip.open(output, 'rt', encoding='utf-8') as handle:
+            self.assertEqual(
+                [json.loads(line) for line in handle],
+                [{'id': self.books[0].author_id, 'name': 'Brontë, Charlotte', 'book_count': 7}],
+            )
+        self.assertIn('Exported 1 rows', stderr.getvalue())
+
+
+class DatasetGeneratorTests(TestCase):
+    """Synthetic datasets are reproducible from their seed"""
+
+    def snapshot(self):
+        return (
+            list(Book.objects.order_by('pk').values_list('title', 'author__name')),  # type: ignore
+            list(Library.books.through.objects.order_by('pk').values_list('library__name', 'book__title')),
+            list(UserProfile.objects.order_by('user__username').values_list('user__username', 'role')),  # type: ignore
+        )
+
+    def generate(self, seed):
+        DatasetGenerator(seed=seed, authors=20, books=100, libraries=5, users=30).generate()
+        return self.snapshot()
+
+    def test_same_seed_produces_same_dataset(self):
+        first = self.generate(seed=3)
+        for model in (Library, Book, Author, User):
+            model.objects.all().delete()  # type: ignore
+        self.assertEqual(self.generate(seed=3), first)
+
+    def test_every_library_gets_a_librarian_and_every_user_a_profile(self):
+        DatasetGenerator(seed=1, authors=5, books=20, libraries=4, users=10).generate()
+        self.assertFalse(Library.objects.filter(librarian__isnull=True).exists())  # type: ignore
+        self.assertFalse(User.objects.filter(userprofile__isnull=True).exists())
+
+
+    def test_every_requested_library_is_created(self):
+        DatasetGenerator(seed=1, authors=5, books=0, libraries=4, users=0).generate()
+        self.assertEqual(Library.objects.count(), 4)  # type: ignore
+
+    def test_rerunning_reuses_existing_users_and_libraries(self):
+        generator_args = {'seed': 2, 'authors': 5, 'books': 10, 'libraries': 3, 'users': 10}
+        DatasetGenerator(**generator_args).generate()
+        roles = self.snapshot()[2]
+        counts = DatasetGenerator(**generator_args).generate()
+        self.assertEqual((counts['users'], counts['librarians']), (0, 0))
+        self.assertEqual((User.objects.count(), Library.objects.count()), (10, 3))  # type: ignore
+        self.assertEqual(Book.objects.count(), 20)  # type: ignore
+        self.assertEqual(self.snapshot()[2], roles)
+
+class CachedCountPaginatorTests(TestCase):
+    """Admin changelist counts come from the cache or planner statistics"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin-pass')
+        ShelfBook.objects.bulk_create([  # type: ignore
+            ShelfBook(title=f"Book {i}", author='Author', publication_year=2000 + i % 2) for i in range(20)
+        ])
+
+    def setUp(self):
+        count_cache().clear()
+        self.client.force_login(self.admin)
+
+    def count_queries(self, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:bookshelf_book_changelist'), params or {})
+        counts = [q for q in queries if 'COUNT(' in q['sql'] and 'bookshelf_book"' in q['sql']]
+        return response.context['cl'].result_count, len(counts)
+
+    def test_filtered_changelist_counts_once_then_hits_cache(self):
+        self.assertEqual(self.count_queries({'publication_year': 2000}), (10, 1))
+        self.assertEqual(self.count_queries({'publication_year': 2000}), (10, 0))
+
+    def test_orm_writes_invalidate_cached_counts(self):
+        self.count_queries()
+        ShelfBook.objects.create(title='New', author='Author', publication_year=2000)  # type: ignore
+        self.assertEqual(self.count_queries(), (21, 1))
+
+    @override_settings(ADMIN_EXACT_COUNT_THRESHOLD=10)
+    def test_large_unfiltered_tables_use_the_estimate(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        paginator = CachedCountPaginator(ShelfBook.objects.all(), 5)  # type: ignore
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.count, 20)
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql']])
+
+    def test_small_tables_are_counted_without_reading_statistics(self):
+        self.assertEqual(self.count_queries(), (20, 1))
+        ShelfBook.objects.create(title='New', author='Author', publication_year=2000)  # type: ignore
+        paginator = CachedCountPaginator(ShelfBook.objects.all(), 5)  # type: ignore
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.count, 21)
+        self.assertEqual(len(queries), 1)  # COUNT(*), no sqlite_stat1 or MAX(pk)
+
+    def test_querysets_matching_nothing_count_zero(self):
+        for queryset in (ShelfBook.objects.none(), ShelfBook.objects.filter(pk__in=[])):  # type: ignore
+            with self.subTest(queryset=queryset), self.assertNumQueries(0):
+                self.assertEqual(CachedCountPaginator(queryset, 5).count, 0)
+
+    def test_writes_retire_counts_in_the_shared_cache(self):
+        self.assertIs(count_cache(), caches['shared'])
+        self.count_queries()
+        # Another worker's write, as seen through the shared counter
+        caches['shared'].incr(count_generation_key(ShelfBook))
+        self.assertEqual(self.count_queries(), (20, 1))
+
+    def test_evicted_generations_restart_where_no_count_was_cached(self):
+        self.assertEqual(self.count_queries(), (20, 1))
+        count_cache().delete(count_generation_key(ShelfBook))
+        self.assertEqual(self.count_queries(), (20, 1))
+
+    def test_lists_are_counted_directly(self):
+        self.assertEqual(CachedCountPaginator(list(range(7)), 5).count, 7)
+
+
+def make_photo(name='photo.jpg', size=(800, 600), color='navy'):
+    """Return an uploaded JPEG of the given size"""
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class ProfilePhotoThumbnailTests(TestCase):
+    """Thumbnails are rendered on upload and used by the admin"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, PROFILE_PHOTO_THUMBNAIL_SIZES=(64, 256), PROFILE_PHOTO_THUMBNAILS_ASYNC=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create_user(self, photo):
+        with self.captureOnCommitCallbacks(execute=True):
+            return CustomUser.objects.create(  # type: ignore
+                username='reader', email='reader@example.com', profile_photo=photo,
+            )
+
+    def test_upload_renders_square_thumbnails(self):
+        user = self.create_user(make_photo())
+        storage, name = user.profile_photo.storage, user.profile_photo.name
+        for size in (64, 256):
+            thumb = thumbnail_name(name, size)
+            self.assertTrue(thumb.endswith(f"_{size}.{THUMBNAIL_EXTENSION}"))
+            with storage.open(thumb) as handle:
+                self.assertEqual(Image.open(handle).size, (size, size))
+
+    @override_settings(PROFILE_PHOTO_RELEASE_GRACE_SECONDS=0)
+    def test_replacing_photo_drops_old_thumbnails(self):
+        user = self.create_user(make_photo('first.jpg'))
+        old_thumb = thumbnail_name(user.profile_photo.name, 64)
+
+        user = CustomUser.objects.get(pk=user.pk)  # type: ignore
+        user.profile_photo = make_photo('second.jpg', color='teal')
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+
+        storage = user.profile_photo.storage
+        self.assertFalse(storage.exists(old_thumb))
+        self.assertTrue(storage.exists(thumbnail_name(user.profile_photo.name, 64)))
+
+    def test_admin_changelist_links_thumbnail_not_original(self):
+        user = self.create_user(make_photo())
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin-pass')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin:relationship_app_customuser_changelist'))
+        self.assertContains(response, user.profile_photo.storage.url(thumbnail_name(user.profile_photo.name, 64)))
+        self.assertNotContains(response, f'src="{user.profile_photo.url}"')
+
+
+def stored_photos(media_root):
+    """Return the paths of every original photo stored under `media_root`"""
+    return [
+        os.path.join(directory, name)
+        for directory, _, names in os.walk(media_root) if not directory.endswith('thumbs')
+        for name in names
+    ]
+
+
+class ProfilePhotoUploadTests(TestCase):
+    """Profile photos are checked, hashed and spooled to disk while they stream in"""
+
+    def upload(self, **files):
+        request = RequestFactory().post('/', files)
+        request.FILES  # parse the body
+        self.addCleanup(request.close)
+        return request
+
+    def test_photo_is_spooled_to_disk_under_its_content_hash(self):
+        photo = make_photo()
+        content = photo.read()
+        photo.seek(0)
+        request = self.upload(profile_photo=photo)
+        uploaded = request.FILES['profile_photo']
+        digest = hashlib.sha256(content).hexdigest()
+        self.assertEqual(uploaded.content_hash, digest)
+        self.assertEqual(uploaded.name, f"{digest}.jpg")
+        self.assertEqual(uploaded.size, len(content))
+        self.assertTrue(os.path.exists(uploaded.temporary_file_path()))
+
+    def test_disallowed_extension_is_rejected(self):
+        request = self.upload(profile_photo=make_photo('photo.bmp'))
+        self.assertNotIn('profile_photo', request.FILES)
+        self.assertIn('Unsupported file extension', request.upload_errors['profile_photo'])
+
+    def test_content_must_match_the_extension(self):
+        fake = SimpleUploadedFile('photo.png', make_photo().read(), content_type='image/png')
+        request = self.upload(profile_photo=fake)
+        self.assertNotIn('profile_photo', request.FILES)
+        self.assertIn('does not match', request.upload_errors['profile_photo'])
+
+    @override_settings(PROFILE_PHOTO_MAX_DIMENSION=500)
+    def test_oversized_dimensions_are_rejected_from_the_header(self):
+        request = self.upload(profile_photo=make_photo(size=(800, 600)))
+        self.assertIn('500x500', request.upload_errors['profile_photo'])
+
+    @override_settings(PROFILE_PHOTO_MAX_UPLOAD_SIZE=1024)
+    def test_oversized_files_are_rejected(self):
+        noise = Image.frombytes('RGB', (200, 200), os.urandom(200 * 200 * 3))
+        buffer = BytesIO()
+        noise.save(buffer, 'PNG')
+        request = self.upload(profile_photo=SimpleUploadedFile('noise.png', buffer.getvalue()))
+        self.assertNotIn('profile_photo', request.FILES)
+        self.assertIn('at most', request.upload_errors['profile_photo'])
+
+    def test_other_file_fields_use_default_handlers(self):
+        request = self.upload(attachment=SimpleUploadedFile('notes.txt', b'plain text'))
+        self.assertEqual(request.FILES['attachment'].read(), b'plain text')
+        self.assertFalse(hasattr(request, 'upload_errors'))
+        self.assertIsInstance(request.upload_handlers[0], ProfilePhotoUploadHandler)
+
+    def test_identical_photos_share_one_stored_file(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        content = make_photo().read()
+        with override_settings(MEDIA_ROOT=media_root, PROFILE_PHOTO_THUMBNAILS_ASYNC=False):
+            users = []
+            for i in range(2):
+                photo = self.upload(profile_photo=SimpleUploadedFile('photo.jpg', content)).FILES['profile_photo']
+                users.append(CustomUser.objects.create(  # type: ignore
+                    username=f"reader{i}", email=f"reader{i}@example.com", profile_photo=photo,
+                ))
+        self.assertEqual(users[0].profile_photo.name, users[1].profile_photo.name)
+        self.assertEqual(len(stored_photos(media_root)), 1)
+
+    def test_admin_form_reports_rejected_photo(self):
+        request = self.upload(profile_photo=make_photo('photo.bmp'))
+        user = CustomUser.objects.create(username='reader', email='reader@example.com')  # type: ignore
+        request.user = User.objects.create_superuser('admin', 'admin@example.com', 'admin-pass')
+        model_admin = CustomUserAdmin(CustomUser, site)
+        form = model_admin.get_form(request, user)(data={}, files=request.FILES, instance=user)
+        self.assertFalse(form.is_valid())
+        self.assertIn('Unsupported file extension', form.errors['profile_photo'][0])
+
+
+class ContentAddressedStorageTests(TestCase):
+    """Profile photos are stored once per content and released when unreferenced"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, PROFILE_PHOTO_THUMBNAILS_ASYNC=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create_user(self, username, photo):
+        with self.captureOnCommitCallbacks(execute=True):
+            return CustomUser.objects.create(  # type: ignore
+                username=username, email=f"{username}@example.com", profile_photo=photo,
+            )
+
+    def test_files_are_named_by_sharded_content_hash(self):
+        content = make_photo().read()
+        digest = hashlib.sha256(content).hexdigest()
+        storage = ContentAddressedStorage()
+        name = storage.save('profile_photos/Holiday.JPG', ContentFile(content))
+        self.assertEqual(name, f"profile_photos/{digest[:2]}/{digest[2:4]}/{digest}.jpg")
+        self.assertEqual(storage.save('profile_photos/copy.jpg', ContentFile(content)), name)
+        self.assertEqual(len(stored_photos(self.media_root)), 1)
+
+    @override_settings(PROFILE_PHOTO_RELEASE_GRACE_SECONDS=0)
+    def test_shared_photo_survives_until_last_user_lets_go(self):
+        content = make_photo().read()
+        first = self.create_user('first', SimpleUploadedFile('a.jpg', content))
+        second = self.create_user('second', SimpleUploadedFile('b.jpg', content))
+        storage, name = first.profile_photo.storage, first.profile_photo.name
+        self.assertEqual(second.profile_photo.name, name)
+
+        first = CustomUser.objects.get(pk=first.pk)  # type: ignore
+        first.profile_photo = make_photo('new.jpg', color='teal')
+        with self.captureOnCommitCallbacks(execute=True):
+            first.save()
+        self.assertTrue(storage.exists(name))
+        self.assertTrue(storage.exists(thumbnail_name(name, 64)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.get(pk=second.pk).delete()  # type: ignore
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(storage.exists(thumbnail_name(name, 64)))
+
+    def test_release_keeps_photos_saved_within_the_grace_period(self):
+        content = make_photo().read()
+        user = self.create_user('first', SimpleUploadedFile('a.jpg', content))
+        storage, name = user.profile_photo.storage, user.profile_photo.name
+        an_hour_ago = time.time() - 3600
+        os.utime(storage.path(name), (an_hour_ago, an_hour_ago))
+        # A concurrent upload of the same content, whose row is not committed yet
+        self.assertEqual(storage.save('profile_photos/b.jpg', ContentFile(content)), name)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.delete()
+        self.assertTrue(storage.exists(name))
+
+        os.utime(storage.path(name), (an_hour_ago, an_hour_ago))
+        self.assertTrue(storage.release(name, grace=60))
+        self.assertFalse(storage.exists(name))
+        self.assertEqual(stored_photos(self.media_root), [])
+
+    def test_cleanup_removes_only_old_orphans(self):
+        kept = self.create_user('reader', make_photo())
+        storage = kept.profile_photo.storage
+        orphan = storage.save('profile_photos/orphan.jpg', ContentFile(make_photo(color='red').read()))
+
+        call_command('cleanup_profile_photos', stdout=StringIO())
+        self.assertTrue(storage.exists(orphan))  # still inside the grace period
+
+        call_command('cleanup_profile_photos', grace=-1, stdout=StringIO())
+        self.assertFalse(storage.exists(orphan))
+        self.assertTrue(storage.exists(kept.profile_photo.name))
+
+    def test_hashed_files_are_served_immutable(self):
+        user = self.create_user('reader', make_photo())
+        response = self.client.get(user.profile_photo.url)
+        self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+        response = self.client.get(user.profile_photo.storage.url(thumbnail_name(user.profile_photo.name, 64)))
+        self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+
+        with open(os.path.join(self.media_root, 'notes.txt'), 'w') as handle:
+            handle.write('mutable')
+        self.assertNotIn('Cache-Control', self.client.get('/media/notes.txt'))
+
+
+class MediaServingTests(TestCase):
+    """Media files are served with validators and byte ranges, or offloaded"""
+
+    content = bytes(range(256)) * 40
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, MEDIA_SERVE_MODE='python')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        with open(os.path.join(media_root, 'photo.jpg'), 'wb') as handle:
+            handle.write(self.content)
+        self.url = reverse('media', args=['photo.jpg'])
+
+    def test_full_response_carries_validators(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(response['ETag'] and response['Last-Modified'])
+
+    def test_revalidation_returns_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304,
+        )
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_single_ranges_are_answered_partially(self):
+        size = len(self.content)
+        for header, start, end in (
+            ('bytes=10-19', 10, 19), ('bytes=10000-', 10000, size - 1), ('bytes=-5', size - 5, size - 1),
+        ):
+            with self.subTest(header=header):
+                response = self.client.get(self.url, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], f"bytes {start}-{end}/{size}")
+                self.assertEqual(b''.join(response.streaming_content), self.content[start:end + 1])
+
+    def test_unsatisfiable_and_stale_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=99999-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f"bytes */{len(self.content)}")
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_head_and_unsafe_methods(self):
+        response = self.client.head(self.url)
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response.content, b'')
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+
+    def test_missing_files_and_traversal_are_refused(self):
+        self.assertEqual(self.client.get(reverse('media', args=['missing.jpg'])).status_code, 404)
+        self.assertEqual(self.client.get('/media/').status_code, 404)
+        self.assertEqual(self.client.get('/media/../settings.py').status_code, 400)
+
+    @override_settings(MEDIA_SERVE_MODE='x-accel-redirect', MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_accel_redirect_leaves_the_body_to_nginx(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/photo.jpg')
+        self.assertEqual(response.content, b'')
+        self.assertTrue(response['ETag'])
+
+    @override_settings(MEDIA_SERVE_MODE='x-sendfile')
+    def test_sendfile_points_at_the_file(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response['X-Sendfile'].endswith(os.path.join('', 'photo.jpg')))
+        self.assertEqual(response.content, b'')
+
+
+class TemplateTests(TestCase):
+    """Pages share a base template and stylesheet; templates are compiled once and warmed"""
+
+    def setUp(self):
+        self.loader = engines['django'].engine.template_loaders[0]
+        self.loader.reset()
+
+    def test_pages_link_the_shared_stylesheet_instead_of_inlining_css(self):
+        self.client.force_login(User.objects.create_user('reader', password='pass'))
+        for url in (reverse('login'), reverse('register'), reverse('list_books'), reverse('member_view')):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, static('relationship_app/css/app.css'))
+                self.assertNotContains(response, '<style')
+
+    def test_templates_are_compiled_once_per_process(self):
+        self.client.get(reverse('login'))
+        self.assertIn('relationship_app/login.html', self.loader.get_template_cache)
+        self.assertIn('relationship_app/base.html', self.loader.get_template_cache)
+
+    def test_warm_up_compiles_every_project_template(self):
+        compiled, failed, _ = warm_templates()
+        self.assertEqual(failed, {})
+        self.assertIn('relationship_app/dashboard.html', compiled)
+        self.assertNotIn('admin/base.html', compiled)
+        for name in compiled:
+            self.assertIn(name, self.loader.get_template_cache)
+        self.assertIn('admin/base.html', warm_templates(include_all=True)[0])
+
+    @override_settings(TEMPLATE_WARMUP=True)
+    def test_only_the_server_entry_points_warm_up(self):
+        # The entry points set environment defaults (e.g. DJANGO_ASYNC_VIEWS)
+        environ = dict(os.environ)
+        self.addCleanup(lambda: (os.environ.clear(), os.environ.update(environ)))
+        apps.get_app_config('relationship_app').ready()
+        self.assertEqual(self.loader.get_template_cache, {})
+        for module in ('LibraryProject.wsgi', 'LibraryProject.asgi'):
+            with self.subTest(module=module):
+                self.loader.reset()
+                importlib.reload(importlib.import_module(module))
+                self.assertIn('relationship_app/base.html', self.loader.get_template_cache)
+
+    def test_warm_templates_command(self):
+        out = StringIO()
+        call_command('warm_templates', stdout=out)
+        self.assertIn('Compiled', out.getvalue())
+
+
+class StaticServingTests(TestCase):
+    """Collected static files are linked by content hash and served immutable"""
+
+    def setUp(self):
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root)
+        settings_override = override_settings(
+            STATIC_ROOT=static_root,
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'},
+            },
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_hashed_names_are_served_immutable(self):
+        url = static('relationship_app/css/app.css')
+        self.assertRegex(url, r'app\.[0-9a-f]{12}\.css$')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(response['Content-Type'], 'text/css')
+
+    def test_unhashed_and_missing_names(self):
+        response = self.client.get(reverse('static', args=['relationship_app/css/app.css']))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Cache-Control', response)
+        self.assertEqual(self.client.get(reverse('static', args=['missing.css'])).status_code, 404)
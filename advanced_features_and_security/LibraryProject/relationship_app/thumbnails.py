@@ -0,0 +1,115 @@
+# relationship_app/thumbnails.py
+"""
+Resized derivatives of CustomUser.profile_photo.
+
+When a photo is uploaded, square thumbnails for every size in
+PROFILE_PHOTO_THUMBNAIL_SIZES are rendered by a small background worker pool
+and stored next to the original as profile_photos/thumbs/<name>_<size>.<ext>.
+Pages link to a thumbnail instead of the full upload and fall back to the
+original until the thumbnail exists.
+"""
+
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THUMBNAIL_SIZES = (64, 256)
+DEFAULT_THUMBNAIL_WORKERS = 2
+
+# WebP is much smaller for photos; JPEG is the fallback when Pillow lacks it
+if features.check('webp'):
+    THUMBNAIL_FORMAT, THUMBNAIL_EXTENSION = 'WEBP', 'webp'
+    SAVE_OPTIONS = {'quality': 80, 'method': 4}
+else:
+    THUMBNAIL_FORMAT, THUMBNAIL_EXTENSION = 'JPEG', 'jpg'
+    SAVE_OPTIONS = {'quality': 80, 'optimize': True, 'progressive': True}
+
+_executor = None
+
+
+def thumbnail_sizes():
+    return tuple(getattr(settings, 'PROFILE_PHOTO_THUMBNAIL_SIZES', DEFAULT_THUMBNAIL_SIZES))
+
+
+def thumbnail_name(name, size):
+    """Return the storage name of the `size` px thumbnail of the file `name`"""
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, 'thumbs', f"{stem}_{size}.{THUMBNAIL_EXTENSION}")
+
+
+def generate_thumbnails(storage, name):
+    """Render and store every configured thumbnail of the image `name`"""
+    with storage.open(name, 'rb') as handle:
+        image = ImageOps.exif_transpose(Image.open(handle))
+        image.load()
+    if THUMBNAIL_FORMAT == 'JPEG' or image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB')
+
+    for size in thumbnail_sizes():
+        thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        buffer = BytesIO()
+        thumbnail.save(buffer, THUMBNAIL_FORMAT, **SAVE_OPTIONS)
+        target = thumbnail_name(name, size)
+        if hasattr(storage, 'save_exact'):
+            storage.save_exact(target, ContentFile(buffer.getvalue()))
+        else:
+            storage.delete(target)
+            storage.save(target, ContentFile(buffer.getvalue()))
+
+
+def has_thumbnails(storage, name):
+    """Return whether every configured thumbnail of `name` exists"""
+    return all(storage.exists(thumbnail_name(name, size)) for size in thumbnail_sizes())
+
+
+def delete_thumbnails(storage, name):
+    """Remove every thumbnail derived from the file `name`"""
+    for size in thumbnail_sizes():
+        storage.delete(thumbnail_name(name, size))
+
+
+def _run(storage, name):
+    try:
+        generate_thumbnails(storage, name)
+    except Exception:
+        logger.exception("Could not create thumbnails for %s", name)
+
+
+def get_executor():
+    """Return the shared worker pool, creating it on first use"""
+    global _executor
+    if _executor is None:
+        workers = getattr(settings, 'PROFILE_PHOTO_THUMBNAIL_WORKERS', DEFAULT_THUMBNAIL_WORKERS)
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thumbnails')
+    return _executor
+
+
+def schedule_thumbnails(field_file):
+    """
+    Generate thumbnails for `field_file` once the current transaction
+    commits, in the worker pool unless PROFILE_PHOTO_THUMBNAILS_ASYNC is off.
+    """
+    storage, name = field_file.storage, field_file.name
+    if getattr(settings, 'PROFILE_PHOTO_THUMBNAILS_ASYNC', True):
+        transaction.on_commit(lambda: get_executor().submit(_run, storage, name))
+    else:
+        transaction.on_commit(lambda: _run(storage, name))
+
+
+def thumbnail_url(field_file, size):
+    """Return the URL of the `size` px thumbnail, or of the original while it is missing"""
+    if not field_file:
+        return ''
+    name = thumbnail_name(field_file.name, size)
+    if field_file.storage.exists(name):
+        return field_file.storage.url(name)
+    return field_file.url
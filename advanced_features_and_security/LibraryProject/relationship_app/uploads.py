@@ -0,0 +1,133 @@
+# relationship_app/uploads.py
+"""
+Streaming upload handling for profile photos.
+
+ProfilePhotoUploadHandler takes over file fields named in
+PROFILE_PHOTO_UPLOAD_FIELDS. It spools chunks straight to a temporary file,
+checks the extension against ALLOWED_IMAGE_EXTENSIONS, sniffs the image type
+and dimensions from the first chunk and hashes the content as it streams.
+Bad files are dropped as soon as they are recognised instead of after the
+whole body has been buffered. Rejection reasons are left on
+request.upload_errors for forms to report.
+"""
+
+import hashlib
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopFutureHandlers
+from PIL import Image
+
+DEFAULT_UPLOAD_FIELDS = ('profile_photo',)
+DEFAULT_MAX_DIMENSION = 6000
+
+# Leading bytes of every accepted image type, mapped to the extensions it may carry
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', ('.jpg', '.jpeg')),
+    (b'\x89PNG\r\n\x1a\n', ('.png',)),
+    (b'GIF87a', ('.gif',)),
+    (b'GIF89a', ('.gif',)),
+)
+
+
+def sniff_extensions(header):
+    """Return the extensions matching the magic bytes of `header`, or ()"""
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return ('.webp',)
+    for signature, extensions in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return extensions
+    return ()
+
+
+class ProfilePhotoUploadHandler(FileUploadHandler):
+    """Validate, hash and spool profile photo uploads to disk chunk by chunk"""
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.active = False
+
+    def reject(self, message):
+        """Record why the current file was refused and skip the rest of it"""
+        if self.request is not None:
+            if not hasattr(self.request, 'upload_errors'):
+                self.request.upload_errors = {}
+            self.request.upload_errors[self.field_name] = message
+        self.discard_file()
+        raise SkipFile(message)
+
+    def discard_file(self):
+        if self.active and hasattr(self, 'file'):
+            self.file.close()
+            del self.file
+        self.active = False
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.active = field_name in getattr(settings, 'PROFILE_PHOTO_UPLOAD_FIELDS', DEFAULT_UPLOAD_FIELDS)
+        if not self.active:
+            return
+
+        self.extension = os.path.splitext(file_name)[1].lower()
+        allowed = [extension.lower() for extension in settings.ALLOWED_IMAGE_EXTENSIONS]
+        if self.extension not in allowed:
+            self.reject(f"Unsupported file extension. Allowed: {', '.join(allowed)}.")
+        if content_length is not None and content_length > self.max_size():
+            self.reject(self.too_large_message())
+
+        self.file = TemporaryUploadedFile(file_name, content_type, 0, charset, content_type_extra)
+        self.digest = hashlib.sha256()
+        raise StopFutureHandlers()
+
+    def max_size(self):
+        return getattr(settings, 'PROFILE_PHOTO_MAX_UPLOAD_SIZE', settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+
+    def too_large_message(self):
+        return f"Profile photos may be at most {self.max_size() // (1024 * 1024)} MB."
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+
+        if start == 0:
+            self.check_header(raw_data)
+        if start + len(raw_data) > self.max_size():
+            self.reject(self.too_large_message())
+
+        self.digest.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def check_header(self, header):
+        """Reject files whose first chunk is not an allowed image of acceptable size"""
+        if self.extension not in sniff_extensions(header):
+            self.reject("The file content does not match an allowed image type.")
+        try:
+            width, height = Image.open(BytesIO(header)).size
+        except Exception:
+            # Dimensions may sit past the first chunk (e.g. behind large EXIF blocks)
+            return
+        limit = getattr(settings, 'PROFILE_PHOTO_MAX_DIMENSION', DEFAULT_MAX_DIMENSION)
+        if width > limit or height > limit:
+            self.reject(f"Images may be at most {limit}x{limit} pixels.")
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+
+        # Full decoding is left to the form's ImageField validation.
+        # Identical photos get identical names, so storage can share one copy.
+        uploaded = self.file
+        uploaded.seek(0)
+        uploaded.content_hash = self.digest.hexdigest()
+        uploaded.name = f"{uploaded.content_hash}{self.extension}"
+        uploaded.size = file_size
+        # The file now belongs to request.FILES; don't close it with a later rejection
+        del self.file
+        self.active = False
+        return uploaded
+
+    def upload_interrupted(self):
+        self.discard_file()
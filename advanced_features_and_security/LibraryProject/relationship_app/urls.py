@@ -1,32 +1,48 @@
 # relationship_app/urls.py
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views
+from . import async_views, views
+from .exports import export_catalog
+from .hashers import offload_hashing
+from .media import serve_media, serve_static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
 
-urlpatterns = [
-    path('admin/', admin.site.urls),
-    # Add your app URLs here
-]
+# ASYNC_VIEWS serves the catalog, library and role pages from async_views
+if settings.ASYNC_VIEWS:
+    pages = async_views
+    library_detail = async_views.library_detail
+else:
+    pages = views
+    library_detail = views.LibraryDetailView.as_view()
 
-# Serve media files during development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 urlpatterns = [
     # Existing URLs
-    path('books/', views.list_books, name='list_books'),
-    path('library/<int:pk>/', views.LibraryDetailView.as_view(), name='library_detail'),
+    path('books/', pages.list_books, name='list_books'),
+    path('library/<int:pk>/', library_detail, name='library_detail'),
 
-    # Authentication URLs
-    path('login/', auth_views.LoginView.as_view(template_name='relationship_app/login.html'), name='login'),
+    # Authentication URLs; see PASSWORD_HASHING_OFFLOAD for the views that hash passwords
+    path(
+        'login/',
+        offload_hashing(auth_views.LoginView.as_view(template_name='relationship_app/login.html')),
+        name='login',
+    ),
     path('logout/', auth_views.LogoutView.as_view(template_name='relationship_app/logout.html'), name='logout'),
-    path('register/', views.register, name='register'),
+    path('register/', offload_hashing(views.register), name='register'),
 
     # Role-based URLs
-    path('admin-view/', views.admin_view, name='admin_view'),
-    path('librarian-view/', views.librarian_view, name='librarian_view'),
-    path('member-view/', views.member_view, name='member_view'),
+    path('admin-view/', pages.admin_view, name='admin_view'),
+    path('librarian-view/', pages.librarian_view, name='librarian_view'),
+    path('member-view/', pages.member_view, name='member_view'),
+
+    # Streaming catalog exports, e.g. /export/books.csv?after=<last id received>
+    path('export/<slug:dataset>.<slug:fmt>', export_catalog, name='export_catalog'),
+
+    # Media files; see MEDIA_SERVE_MODE for offloading them to the web server
+    re_path(rf'^{settings.MEDIA_URL.lstrip("/")}(?P<path>.*)$', serve_media, name='media'),
+
+    # Collected static files, for deployments that do not serve STATIC_ROOT from
+    # the web server; runserver serves them from the apps while DEBUG is on
+    re_path(rf'^{settings.STATIC_URL.lstrip("/")}(?P<path>.*)$', serve_static, name='static'),
 ]
@@ -0,0 +1,89 @@
+# relationship_app/user_cache.py
+"""
+Per-process LRU of authenticated users, filled by
+sessions.CachedUserAuthenticationMiddleware.
+
+It holds SESSION_USER_CACHE_SIZE users for SESSION_USER_CACHE_TTL seconds.
+User and UserProfile changes evict a user in the process making them (see
+models.py); other processes may serve the previous user object until its
+entry expires, so keep the TTL short. Related rows loaded with the user,
+such as the UserProfile holding the role, are not kept: roles are read
+through the shared role cache (see roles), which a profile change clears
+for every process, and must never be refilled from a stale copy.
+
+Kept apart from sessions.py, which imports django.contrib.auth.middleware
+and with it the user model: models.py imports forget_user while the app's
+own user model is still being defined.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+DEFAULT_USER_CACHE_SIZE = 1000
+DEFAULT_USER_CACHE_TTL = 10
+
+_user_cache = None
+
+
+class UserCache:
+    """Thread-safe LRU of authenticated users, each kept for `ttl` seconds"""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Return a copy of the cached user, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        # Each request gets its own copy to set per-request attributes on
+        return copy.copy(user)
+
+    def set(self, key, user):
+        user = copy.copy(user)
+        user._state.fields_cache = {}
+        with self.lock:
+            self.entries[key] = (user, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def forget(self, user_id):
+        """Drop every entry of `user_id`"""
+        with self.lock:
+            for key in [key for key, (user, _) in self.entries.items() if user.pk == user_id]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def user_cache():
+    """Return this process's user cache, creating it on first use"""
+    global _user_cache
+    if _user_cache is None:
+        _user_cache = UserCache(
+            getattr(settings, 'SESSION_USER_CACHE_SIZE', DEFAULT_USER_CACHE_SIZE),
+            getattr(settings, 'SESSION_USER_CACHE_TTL', DEFAULT_USER_CACHE_TTL),
+        )
+    return _user_cache
+
+
+def forget_user(user_id):
+    """Evict `user_id` from this process's user cache"""
+    if _user_cache is not None:
+        _user_cache.forget(user_id)
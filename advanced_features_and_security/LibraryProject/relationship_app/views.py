@@ -1,25 +1,267 @@
-from django.shortcuts import render, redirect
-from django.http import HttpResponse
+import time
+from collections import defaultdict
+
+from django.shortcuts import get_object_or_404, render, redirect
+from django.http import HttpResponse, HttpResponseBadRequest
 from django.views.generic import DetailView
 from django.contrib.auth import login
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.core.cache.utils import make_template_fragment_key
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.utils.decorators import method_decorator
+from django.utils.functional import cached_property
+from django.utils.safestring import mark_safe
+from . import page_cache
+from .dashboard import dashboard_stats
 from .models import Book, Library, UserProfile
+from .roles import get_user_role
+
+# Number of books rendered per catalog page
+BOOKS_PER_PAGE = 50
+
+# Number of users listed per admin dashboard page
+USERS_PER_PAGE = 25
+
+# Libraries summarised per librarian/member dashboard page, and the newest
+# books shown for each
+LIBRARIES_PER_PAGE = 20
+RECENT_BOOKS_PER_LIBRARY = 3
+
+def catalog_books(after=None):
+    """
+    Return the books queryset every catalog page is built from.
+
+    Books are ordered by primary key and the author is joined in the same
+    query, so every page costs one indexed range scan no matter how deep it is.
+    """
+    books = (
+        Book.objects.select_related('author')  # type: ignore
+        .only('id', 'title', 'author__name')
+        .order_by('pk')
+    )
+    if after is not None:
+        books = books.filter(pk__gt=after)
+    return books
+
+def parse_cursor(request, name='after'):
+    """Return the ?after= (or ?<name>=) cursor as an int, or None on the first page"""
+    after = request.GET.get(name)
+    return None if after is None else int(after)
+
+def split_page(rows, limit=BOOKS_PER_PAGE):
+    """Split `limit + 1` fetched rows into the page and the next cursor"""
+    rows = list(rows)
+    next_cursor = rows[limit - 1].pk if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+class BookPage:
+    """
+    One keyset page of books rendered inside a {% cache %} block.
+
+    The books are only queried when the template reads them, which happens
+    on a cache miss. `cache_version` ties the fragment to the current
+    generation of the scopes it shows (see page_cache).
+    """
+
+    # Fragment found by aprepare(), rendered in place of the {% cache %} block
+    fragment = None
+
+    def __init__(self, books, after, scopes, limit=BOOKS_PER_PAGE):
+        self.queryset = books
+        self.after = after
+        self.scopes = scopes
+        self.limit = limit
+        self.is_first_page = after is None
+        self.timeout = page_cache.page_cache_timeout()
+
+    @cached_property
+    def cache_version(self):
+        return page_cache.cache_version(self.scopes)
+
+    @cached_property
+    def rows(self):
+        # Fetch one extra row to know whether another page exists
+        return split_page(self.queryset[:self.limit + 1], self.limit)
+
+    @property
+    def books(self):
+        return self.rows[0]
+
+    @property
+    def next_cursor(self):
+        return self.rows[1]
+
+    @property
+    def loaded(self):
+        return 'rows' in self.__dict__
+
+    async def aprepare(self, fragment_name, *vary_on):
+        """
+        Ready the page for an async view, where the template cannot query: a
+        cached fragment is fetched for the template to print as it is, and on
+        a miss the rows are read with the async ORM. `fragment_name` and
+        `vary_on` are those of the template's {% cache %} tag, before the
+        version and cursor.
+        """
+        self.cache_version = await page_cache.acache_version(self.scopes)
+        if self.timeout:
+            key = make_template_fragment_key(fragment_name, [*vary_on, self.cache_version, self.after])
+            fragment = await page_cache.fragment_cache().aget(key)
+            if fragment is not None:
+                self.fragment = mark_safe(fragment)
+                return
+        self.rows = split_page([book async for book in self.queryset[:self.limit + 1]], self.limit)
+
+def summary_libraries(after=None, recent=RECENT_BOOKS_PER_LIBRARY):
+    """Return the libraries after `after`, with their author counts and where their newest books start"""
+    Membership = Library.books.through
+    memberships = Membership.objects.filter(library_id=OuterRef('pk')).order_by().values('library_id')
+    newest = Membership.objects.filter(library_id=OuterRef('pk')).order_by('-book_id').values('book_id')
+    libraries = (
+        Library.objects.only('id', 'name', 'book_count')  # type: ignore
+        .annotate(
+            author_count=Coalesce(
+                Subquery(memberships.annotate(count=Count('book__author', distinct=True)).values('count')), 0,
+            ),
+            recent_from=Subquery(newest[recent - 1:recent]),
+        )
+        .order_by('pk')
+    )
+    if after is not None:
+        libraries = libraries.filter(pk__gt=after)
+    return libraries
+
+def recent_memberships(libraries):
+    """Return the memberships of the newest books of `libraries`, a non-empty page of summary_libraries()"""
+    ranges = Q()
+    for library in libraries:
+        # Libraries with fewer than `recent` books have no start and are read whole
+        ranges |= Q(library_id=library.pk, book_id__gte=library.recent_from or 0)
+    return (
+        Library.books.through.objects.filter(ranges)
+        .select_related('book__author')
+        .only('library_id', 'book__id', 'book__title', 'book__author__name')
+        .order_by('-book_id')
+    )
+
+def attach_recent_books(libraries, memberships):
+    """Set `recent_books` on every library from the fetched `memberships`"""
+    recent_books = defaultdict(list)
+    for membership in memberships:
+        recent_books[membership.library_id].append(membership.book)
+    for library in libraries:
+        library.recent_books = recent_books[library.pk]
+
+def library_summaries(after=None, limit=LIBRARIES_PER_PAGE, recent=RECENT_BOOKS_PER_LIBRARY):
+    """
+    Return one keyset page of libraries annotated with their book and author
+    counts and their `recent` newest books, and the next cursor.
+
+    This is two queries however many libraries and books there are: the
+    page of libraries, which also finds where each library's newest books
+    start, then one index range of memberships per library. Book counts are
+    the maintained Library.book_count; authors are counted per library.
+    """
+    libraries, next_cursor = split_page(summary_libraries(after, recent)[:limit + 1], limit)
+    attach_recent_books(libraries, recent_memberships(libraries) if libraries else ())
+    return libraries, next_cursor
+
+def dashboard_cursors(request):
+    """Return the ?after=, ?libraries_after= and ?library= values of a role dashboard"""
+    return parse_cursor(request), parse_cursor(request, 'libraries_after'), parse_cursor(request, 'library')
+
+def render_role_dashboard(request, template_name):
+    """
+    Render a librarian or member dashboard: one page of library summaries
+    and one keyset page of books, from the whole catalog or, with
+    ?library=<pk>, from that library only.
+    """
+    try:
+        after, libraries_after, library_id = dashboard_cursors(request)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid cursor")
+
+    books = catalog_books(after)
+    selected = None
+    if library_id is not None:
+        selected = get_object_or_404(Library.objects.only('id', 'name'), pk=library_id)  # type: ignore
+        books = books.filter(library=selected)
+    books, next_cursor = split_page(books[:BOOKS_PER_PAGE + 1])
+    libraries, next_libraries_cursor = library_summaries(libraries_after)
+
+    context = {
+        'books': books,
+        'next_cursor': next_cursor,
+        'is_first_page': after is None,
+        'selected_library': selected,
+        'libraries': libraries,
+        'next_libraries_cursor': next_libraries_cursor,
+        'user_role': get_user_role(request.user),
+    }
+    return render(request, template_name, context)
+
+def record_page_cache(response, page, started):
+    """Count the response as a fragment cache hit or miss and label it"""
+    hit = not page.loaded
+    page_cache.stats.record(hit, time.perf_counter() - started)
+    response['X-Page-Cache'] = 'hit' if hit else 'miss'
+    return response
 
 # Existing views
 @login_required
 def list_books(request):
-    """Function-based view to list all books"""
-    books = Book.objects.all()  # type: ignore
-    return render(request, 'relationship_app/list_books.html', {'books': books})
+    """Function-based view to list books, one cursor page at a time"""
+    started = time.perf_counter()
+    try:
+        after = parse_cursor(request)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid 'after' cursor")
+
+    page = BookPage(catalog_books(after), after, [page_cache.CATALOG_SCOPE])
+    response = render(request, 'relationship_app/list_books.html', {'page': page})
+    return record_page_cache(response, page, started)
 
 @method_decorator(login_required, name='dispatch')
 class LibraryDetailView(DetailView):
-    """Class-based view to display library details"""
+    """
+    Class-based view to display library details.
+
+    The library is loaded by primary key with its maintained book count;
+    its books are a cached fragment and, on a miss, one indexed query over
+    the through table, books and authors, however many books it holds.
+    """
     model = Library
     template_name = 'relationship_app/library_detail.html'
     context_object_name = 'library'
+    books_per_page = BOOKS_PER_PAGE
+
+    def get(self, request, *args, **kwargs):
+        self.started = time.perf_counter()
+        try:
+            self.after = parse_cursor(request)
+        except ValueError:
+            return HttpResponseBadRequest("Invalid 'after' cursor")
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        return Library.objects.only('id', 'name', 'book_count')  # type: ignore
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['page'] = BookPage(
+            catalog_books(self.after).filter(library=self.object),
+            self.after,
+            [page_cache.library_scope(self.object.pk)],
+            self.books_per_page,
+        )
+        return context
+
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        response.render()
+        return record_page_cache(response, context['page'], self.started)
 
 def register(request):
     """User registration view"""
@@ -36,55 +278,56 @@ def register(request):
 # Role checking functions
 def is_admin(user):
     """Check if user has Admin role"""
-    return hasattr(user, 'userprofile') and user.userprofile.role == 'Admin'
+    return get_user_role(user) == 'Admin'
 
 def is_librarian(user):
     """Check if user has Librarian role"""
-    return hasattr(user, 'userprofile') and user.userprofile.role == 'Librarian'
+    return get_user_role(user) == 'Librarian'
 
 def is_member(user):
     """Check if user has Member role"""
-    return hasattr(user, 'userprofile') and user.userprofile.role == 'Member'
+    return get_user_role(user) == 'Member'
+
+def user_profiles(after=None):
+    """Return the profiles, with their users, listed on the admin dashboard after `after`"""
+    profiles = (
+        UserProfile.objects.select_related('user')  # type: ignore
+        .only('id', 'role', 'user__username', 'user__email', 'user__date_joined')
+        .order_by('pk')
+    )
+    if after is not None:
+        profiles = profiles.filter(pk__gt=after)
+    return profiles
 
 # Role-based views
 @user_passes_test(is_admin)
 def admin_view(request):
-    """Admin-only view"""
-    # Get all users and their profiles for admin dashboard
-    users = UserProfile.objects.select_related('user').all()  # type: ignore
-    books = Book.objects.all()  # type: ignore
-    libraries = Library.objects.all()  # type: ignore
-    
+    """
+    Admin-only view: cached dashboard statistics and one keyset page of the
+    user table, so the page costs the same however many users there are.
+    """
+    try:
+        after = parse_cursor(request)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid 'after' cursor")
+
+    users, next_cursor = split_page(user_profiles(after)[:USERS_PER_PAGE + 1], USERS_PER_PAGE)
+
     context = {
+        'stats': dashboard_stats(),
         'users': users,
-        'total_books': books.count(),
-        'total_libraries': libraries.count(),
-        'user_role': request.user.userprofile.role,
+        'next_cursor': next_cursor,
+        'is_first_page': after is None,
+        'user_role': get_user_role(request.user),
     }
     return render(request, 'relationship_app/admin_view.html', context)
 
 @user_passes_test(is_librarian)
 def librarian_view(request):
     """Librarian-only view"""
-    books = Book.objects.all()  # type: ignore
-    libraries = Library.objects.all()  # type: ignore
-    
-    context = {
-        'books': books,
-        'libraries': libraries,
-        'user_role': request.user.userprofile.role,
-    }
-    return render(request, 'relationship_app/librarian_view.html', context)
+    return render_role_dashboard(request, 'relationship_app/librarian_view.html')
 
 @user_passes_test(is_member)
 def member_view(request):
     """Member-only view"""
-    books = Book.objects.all()  # type: ignore
-    libraries = Library.objects.all()  # type: ignore
-    
-    context = {
-        'books': books,
-        'libraries': libraries,
-        'user_role': request.user.userprofile.role,
-    }
-    return render(request, 'relationship_app/member_view.html', context)
\ No newline at end of file
+    return render_role_dashboard(request, 'relationship_app/member_view.html')